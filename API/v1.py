@@ -5,27 +5,227 @@ changes should require a new version number to be used.
 
 import Lib.Character as Character
 import Lib.Generator as Generator
+import Lib.Utilities.Serialize as Serialize
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 
+from hashlib import sha1
 from json import loads
 from json.decoder import JSONDecodeError
 
+from ExternalServices import (MAX_BATCH_COUNT, SAVE_CHUNK_SIZE, CHARACTER_POOL_HIGH,
+                              CHARACTER_POOL_LOW, CHARACTER_POOL_WORKERS, COALESCE_WINDOW,
+                              COALESCE_MAX_BATCH)
+from Lib.Batch import get_batch_generator
+from Lib.Coalescer import Coalescer
+from Lib.Pool import CharacterPool
 from Lib.Utilities.Exceptions import NotFoundError, MalformedError
+from Lib.Utilities.Mongo import to_object_id
 
 V1 = Blueprint('v1', __name__)
 
 
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Keys of the responses giving characters, encoded once rather than for every response
+CHARACTER_KEY = Serialize.key('Character')
+CHARACTERS_KEY = Serialize.key('Characters')
+ERROR_KEY = Serialize.key('Error')
+ID_KEY = Serialize.key('ID')
+NULL = Serialize.dumps(None)
+
+# Saved characters can't be changed, so anything that has read one can keep it forever
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _generate_body():
+    """
+    Generates a new character, as the body of a response to `GET /characters`.
+
+    :return: The body, encoded JSON
+    :rtype: bytes
+    """
+    character = Generator.Generator().create_character()
+    return Serialize.join_object([(CHARACTER_KEY, character.get_character_json())])
+
+
+def _generate_bodies(count):
+    """
+    Generates many new characters at once, each as the body of a response to `GET /characters`.
+    More than one character is generated as a batch (see :mod:`Lib.Batch`), sharing the rules
+    and the bonds for each class and package, by the batch generator kept for the current
+    snapshot of the rules.
+
+    :param int count: The number of characters to generate
+    :return: The bodies, encoded JSON
+    :rtype: list
+    """
+    if count == 1:
+        return [_generate_body()]
+    return [Serialize.join_object([(CHARACTER_KEY, Serialize.dumps(character))])
+            for character in get_batch_generator().generate(count)]
+
+
+# Ready-made characters, so single characters don't have to be generated while the client waits
+pool = CharacterPool(_generate_body, CHARACTER_POOL_HIGH, CHARACTER_POOL_LOW,
+                     CHARACTER_POOL_WORKERS)
+
+# Requests for single characters that arrive together are generated together
+coalescer = Coalescer(_generate_bodies, COALESCE_WINDOW, COALESCE_MAX_BATCH)
+
+
+def _stream_characters(generator, count, stream_format):
+    """
+    Generates characters one at a time and gives them back as pieces of the response body, so
+    that only one character is ever held in memory.
+
+    :param Lib.Generator.Generator generator: The generator to use for every character
+    :param int count: The number of characters to generate
+    :param str stream_format: Either `"json"` (a single JSON object whose `"Characters"` key
+        maps to a list of characters) or `"ndjson"` (one character per line)
+    :return: A generator of encoded JSON
+    """
+    if stream_format == 'ndjson':
+        for _ in range(count):
+            yield generator.create_character().get_character_json() + b'\n'
+    else:
+        yield b'{' + CHARACTERS_KEY + b'['
+        for position in range(count):
+            separator = b',' if position else b''
+            yield separator + generator.create_character().get_character_json()
+        yield b']}'
+
+
+def _get_fields():
+    """
+    Reads the comma separated list of character properties from the `fields` query parameter.
+    The same properties always give the same list (see :func:`Lib.Character.normalize_fields`),
+    so it can be used for both the ETag and the body.
+
+    :raises: MalformedError (if a property is unknown)
+    :return: The names of the properties, or None if every property should be given
+    :rtype: list
+    """
+    fields = request.args.get('fields')
+    if fields is None:
+        return None
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if not fields:
+        return None
+    fields = Character.normalize_fields(fields)
+    return None if len(fields) == len(Character.CHARACTER_FIELDS) else fields
+
+
+def _character_etag(character_id, fields=None):
+    """
+    Builds the (strong) ETag of a saved character. Saved characters never change, so the ETag only
+    depends on the character's ID and which of its properties are given, and can be worked out
+    without reading the character from the database.
+
+    :param str character_id: The unique ID of the character
+    :param list fields: The properties of the character to give, as given by :func:`_get_fields`
+    :raises: MalformedError (if the ID isn't a valid ObjectID)
+    :return: The ETag, without quotes
+    :rtype: str
+    """
+    character_id = str(to_object_id(character_id))
+    if fields is None:
+        return character_id
+    fields = ','.join(fields)
+    return '{}-{}'.format(character_id, sha1(fields.encode('utf-8')).hexdigest()[:16])
+
+
+def _load_characters(character_ids):
+    """
+    Loads many characters (see :func:`Lib.Character.load_characters`), with the properties asked
+    for by the `fields` query parameter, and builds the response listing each of them, or why it
+    couldn't be loaded.
+
+    :param list character_ids: The unique IDs of the characters
+    :return: The response
+    """
+    if not character_ids or len(character_ids) > MAX_BATCH_COUNT:
+        error = "Between 1 and {} IDs must be given".format(MAX_BATCH_COUNT)
+        return jsonify({"Error": error, "Characters": None}), 400
+
+    try:
+        fields = _get_fields()
+        characters = Character.load_characters(character_ids, fields)
+    except MalformedError as e:
+        return jsonify({"Error": str(e), "Characters": None}), 400
+
+    results = []
+    for character_id, character in zip(character_ids, characters):
+        if isinstance(character, Character.BaseCharacter):
+            body, error = character.get_character_json(fields), NULL
+        else:
+            body, error = NULL, Serialize.dumps(str(character))
+        results.append(Serialize.join_object([(ID_KEY, Serialize.dumps(str(character_id))),
+                                              (CHARACTER_KEY, body), (ERROR_KEY, error)]))
+    body = Serialize.join_object([(CHARACTERS_KEY, Serialize.join_array(results)),
+                                  (ERROR_KEY, NULL)])
+    return Response(body, mimetype='application/json')
+
+
 @V1.route('/characters', methods=["GET"])
 def get_character():
     """
-    Generates a new character and returns the character as a JSON dictionary.
+    Generates a new character and returns the character as a JSON dictionary. If the **pool** of
+    ready-made characters is enabled, the character is taken from it instead, when it has one.
+    Otherwise, if the **coalescer** is enabled, requests arriving together are generated as one
+    batch. If a count is given, that many characters are generated (all from the same snapshot of
+    the rules) and streamed back as they're generated.
+
+    :query string ids: A comma separated list of the unique IDs of saved characters. If given,
+        those characters are loaded instead of generating new ones (as with
+        `POST /characters/lookup`), and **count** and **format** are ignored.
+    :query string fields: When loading characters by **ids**, a comma separated list of the
+        properties of each character to give (e.g. `Stats,Attributes`). By default, every
+        property is given.
+    :query int count: The number of characters to generate, from 1 up to `MAX_BATCH_COUNT`. If
+        not given, a single character is returned in the `"Character"` key.
+    :query string format: How to stream the characters when a count is given. Either `"json"`
+        (the default) or `"ndjson"`.
 
     :status 200:
         :json: Key: `"Character"`; Value: A character object, as created by the
-            :meth:`Lib.Character.BaseCharacter.get_character` method.
+            :meth:`Lib.Character.BaseCharacter.get_character` method. If a count is given,
+            instead, Key: `"Characters"`; Value: A list of character objects, or (for the
+            `"ndjson"` format) one character object per line.
+    :status 400:
+        :json: Key: `"Error"`; Value: A string explaining why the count or format is invalid.
     """
-    return jsonify({"Character": Generator.Generator().generate()})
+    character_ids = request.args.get('ids')
+    if character_ids is not None:
+        return _load_characters([character_id.strip() for character_id in
+                                 character_ids.split(',') if character_id.strip()])
+
+    count = request.args.get('count')
+    if count is None:
+        body = pool.get()
+        if body is None:
+            body = coalescer.get()
+        return Response(body, mimetype='application/json')
+
+    try:
+        count = int(count)
+    except ValueError:
+        count = 0
+    if not 0 < count <= MAX_BATCH_COUNT:
+        error = "Count must be a whole number from 1 to {}".format(MAX_BATCH_COUNT)
+        return jsonify({"Error": error, "Characters": None}), 400
+
+    stream_format = request.args.get('format', 'json')
+    if stream_format not in STREAM_FORMATS:
+        error = "Format must be one of: {}".format(', '.join(sorted(STREAM_FORMATS)))
+        return jsonify({"Error": error, "Characters": None}), 400
+
+    generator = Generator.Generator()
+    return Response(stream_with_context(_stream_characters(generator, count, stream_format)),
+                    mimetype=STREAM_FORMATS[stream_format])
 
 
 @V1.route('/characters', methods=["POST"])
@@ -68,13 +268,108 @@ def save_character():
         return jsonify({"Error": "Could not load JSON data", "ID": None}), 400
 
     try:
-        character.parse_character(character_data)
+        character.parse_character(character_data, strict=True)
         id = character.save()
         return jsonify({"ID": str(id), "Error": None})
-    except NotFoundError as e:
+    except (NotFoundError, MalformedError) as e:
         return jsonify({"Error": str(e), "ID": None}), 400
 
 
+def _read_characters():
+    """
+    Reads the characters sent with a request: either a JSON list of characters or, if the request
+    has the `"application/x-ndjson"` content type, one character per line. NDJSON is read a line
+    at a time, as the characters are needed.
+
+    :raises: JSONDecodeError, TypeError (if the body isn't a JSON list)
+    :return: An iterable of characters, with None in place of any line that isn't valid JSON
+    """
+    charset = request.charset
+    if request.mimetype != STREAM_FORMATS['ndjson']:
+        characters = loads(request.data.decode(charset))
+        if not isinstance(characters, list):
+            raise TypeError('Expected a list of characters')
+        return characters
+
+    def read_lines():
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield loads(line.decode(charset))
+            except (JSONDecodeError, UnicodeDecodeError):
+                yield None
+    return read_lines()
+
+
+def _save_chunk(characters, positions, results):
+    """
+    Saves a chunk of characters with one bulk insert and records the result for each of them.
+
+    :param list characters: The characters to save
+    :param list positions: The position of each character's result in *results*
+    :param list results: The result for every character in the request
+    :return: None
+    """
+    for position, character_id in zip(positions, Character.save_characters(characters)):
+        if character_id is None:
+            results[position] = {"ID": None, "Error": "Could not save character"}
+        else:
+            results[position] = {"ID": str(character_id), "Error": None}
+
+
+@V1.route('/characters/batch', methods=["POST"])
+def save_characters():
+    """
+    Saves many characters to the database at once. Every character is checked in the same way as
+    by the single character endpoint, and the valid ones are written with one bulk insert for
+    every `SAVE_CHUNK_SIZE` characters. A character that can't be saved doesn't stop the others.
+
+    :jsonparameter list characters: A list of character objects, each with the same properties as
+        for saving a single character. Alternatively, send one character object per line with the
+        `"application/x-ndjson"` content type.
+
+    :status 200:
+        :json: Key: `"Results"`; Value: A list with one object for each character sent, in the
+            same order. Each has the keys `"ID"` (the unique ID of the saved character, or null)
+            and `"Error"` (a string explaining why the character couldn't be saved, or null).
+    :status 400:
+        :json: Key: `"Error"`; Value: A string explaining that the request couldn't be read as a
+            list of characters.
+    """
+    try:
+        characters = _read_characters()
+    except (JSONDecodeError, TypeError):
+        return jsonify({"Error": "Could not load JSON data", "Results": None}), 400
+
+    results = []
+    chunk = []
+    positions = []
+    for character_data in characters:
+        character = Character.BaseCharacter()
+        try:
+            if character_data is None:
+                raise MalformedError('Could not load JSON data')
+            if not isinstance(character_data, dict):
+                raise MalformedError('Character is not a JSON object')
+            character.parse_character(character_data, strict=True)
+        except (NotFoundError, MalformedError) as e:
+            results.append({"ID": None, "Error": str(e)})
+            continue
+
+        positions.append(len(results))
+        results.append(None)
+        chunk.append(character)
+        if len(chunk) >= SAVE_CHUNK_SIZE:
+            _save_chunk(chunk, positions, results)
+            chunk = []
+            positions = []
+    _save_chunk(chunk, positions, results)
+
+    return jsonify({"Results": results, "Error": None})
+
+
 @V1.route('/characters/<character_id>', methods=["GET"])
 def load_character(character_id):
     """
@@ -83,19 +378,66 @@ def load_character(character_id):
     :param str character_id: The unique ID of the character. If it is not a valid ObjectID (e.g.
         not 24 characters long, or cannot otherwise be parsed by the admittedly finicky ObjectID
         class) or if it cannot be found in the database, an error will be returned.
+    :query string fields: A comma separated list of the properties of the character to give (e.g.
+        `Stats,Attributes`). Only those properties are read from the database. By default, every
+        property is given.
+
+    :reqheader If-None-Match: The ETag of a copy of the character the client already has. If it
+        matches, the character isn't read from the database at all.
+    :resheader ETag: A strong validator for the character (and the properties given)
+    :resheader Cache-Control: Saved characters never change, so they can be cached forever
 
     :status 200:
         :json: Key: `"Character"`; Value: A character object, as created by the
             :meth:`Lib.Character.BaseCharacter.get_character` method.
+    :status 304: The client's copy of the character (given by **If-None-Match**) is up to date.
     :status 400:
         :json: Key: `"Error"`; Value: A string describing the specific way that the request could
-            not be processed (which is most likely a problem trying to read the character_id).
+            not be processed (which is most likely a problem trying to read the character_id or
+            an unknown field).
     :status 404:
         :json: Key: `"Error"`; Value: A string explaining that the character could not be found.
     """
-    character = Character.BaseCharacter()
     try:
-        character.load_character_from_db(character_id)
-        return jsonify({"Character": character.get_character(), "Error": None})
+        fields = _get_fields()
+        etag = _character_etag(character_id, fields)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            body = Character.load_character_json(character_id, fields)
+            response = Response(Serialize.join_object([(CHARACTER_KEY, body), (ERROR_KEY, NULL)]),
+                                mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
     except (NotFoundError, MalformedError) as e:
         return jsonify({"Error": str(e), "Character": None}), int(e)
+
+
+@V1.route('/characters/lookup', methods=["POST"])
+def load_characters():
+    """
+    Finds many existing characters at once, with a single database query. The characters are
+    returned in the same order as their IDs, and an ID that is invalid or can't be found doesn't
+    stop the others from being loaded.
+
+    :jsonparameter list IDs: The unique IDs of the characters, from 1 up to `MAX_BATCH_COUNT` of
+        them
+    :query string fields: A comma separated list of the properties of each character to give
+        (e.g. `Stats,Attributes`). By default, every property is given.
+
+    :status 200:
+        :json: Key: `"Characters"`; Value: A list with one object for each ID, with the keys
+            `"ID"`, `"Character"` (a character object, as created by the
+            :meth:`Lib.Character.BaseCharacter.get_character` method, or null) and `"Error"` (a
+            string explaining why the character couldn't be loaded, or null).
+    :status 400:
+        :json: Key: `"Error"`; Value: A string explaining why the list of IDs couldn't be read.
+    """
+    try:
+        character_ids = loads(request.data.decode(request.charset))['IDs']
+        if not isinstance(character_ids, list):
+            raise TypeError('Expected a list of IDs')
+    except (JSONDecodeError, TypeError, KeyError):
+        return jsonify({"Error": "Could not load JSON data", "Characters": None}), 400
+    return _load_characters(character_ids)
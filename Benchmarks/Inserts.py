@@ -0,0 +1,117 @@
+"""
+Times inserting saved characters with :func:`Lib.Utilities.Mongo.insert` and
+:func:`Lib.Utilities.Mongo.insert_many`, against the deep copy of every document they used to
+make. Run with ``python -m Benchmarks.Inserts [--count N] [--repeat N] [--mock]``; with
+``--mock`` the inserts go to mongomock rather than the database in ``ExternalServices.py``.
+
+The characters are generated from the open gaming content, so the database doesn't need seeding.
+"""
+
+import argparse
+import random
+import timeit
+
+from copy import deepcopy
+from glob import glob
+from os import path
+
+import Lib.RuleSet as RuleSet
+import Lib.Utilities.Mongo as Mongo
+import Lib.Utilities.Storage as Storage
+
+from Lib.Generator import Generator
+from Lib.Utilities.Workspace import parse_json
+
+COLLECTION = 'BenchmarkInserts'
+CONTENT = path.join(path.dirname(path.dirname(path.abspath(__file__))), 'OpenGamingJSON')
+
+
+def deepcopy_insert(json_doc, collection):
+    """
+    Inserts the way :func:`Lib.Utilities.Mongo.insert` did before it stopped deep copying.
+
+    :param dict_or_list json_doc: A dictionary or list of dictionaries
+    :param str collection: The collection to insert into
+    :return: The unique ID or IDs given to the inserted item
+    :rtype: string_or_list
+    """
+    json_doc = deepcopy(json_doc)
+    if isinstance(json_doc, dict):
+        return Mongo._database()[collection].insert_one(json_doc).inserted_id
+    elif len(json_doc) == 1:
+        return Mongo._database()[collection].insert_one(json_doc[0]).inserted_id
+    else:
+        return Mongo._database()[collection].insert_many(json_doc).inserted_ids
+
+
+def make_characters(count, seed=0):
+    """
+    Generates characters from the open gaming content, loaded into an SQLite database in memory.
+
+    :param int count: The number of characters
+    :param int seed: The seed for the random number generator
+    :return: The characters, as they would be saved
+    :rtype: list
+    """
+    storage = Storage.SQLiteStorage(':memory:')
+    for file_path in glob(path.join(CONTENT, '*.json')):
+        json_obj, collection_name = parse_json(file_path)
+        storage.insert(json_obj, collection_name)
+
+    original, Storage.storage = Storage.storage, storage
+    try:
+        rules = RuleSet.RuleSet.load(open_gaming_only=True)
+    finally:
+        Storage.storage = original
+        storage.close()
+
+    generator = Generator(rules=rules)
+    rng = random.Random(seed)
+    return [generator.create_character(rng).get_character() for _ in range(count)]
+
+
+def time_inserts(characters, repeat):
+    """
+    Times single and bulk inserts, with and without deep copies, and copying alone.
+
+    :param list characters: The characters to insert
+    :param int repeat: The number of times to time each, keeping the fastest
+    :return: The name of each way of inserting and its fastest time in seconds, in pairs
+    :rtype: list
+    """
+    def best(func):
+        Mongo._database()[COLLECTION].drop()
+        return min(timeit.repeat(func, number=1, repeat=repeat))
+
+    return [
+        ('deepcopy only', best(lambda: [deepcopy(character) for character in characters])),
+        ('shallow copy only', best(lambda: [Mongo._with_id(character)
+                                            for character in characters])),
+        ('single (deepcopy)', best(lambda: [deepcopy_insert(character, COLLECTION)
+                                            for character in characters])),
+        ('single', best(lambda: [Mongo.insert(character, COLLECTION)
+                                 for character in characters])),
+        ('bulk (deepcopy)', best(lambda: deepcopy_insert(characters, COLLECTION))),
+        ('bulk', best(lambda: Mongo.insert(characters, COLLECTION))),
+        ('bulk unordered', best(lambda: Mongo.insert_many(characters, COLLECTION)))
+    ]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    parser = argparse.ArgumentParser(description='Time inserting saved characters')
+    parser.add_argument('--count', type=int, default=500, help='characters to insert')
+    parser.add_argument('--repeat', type=int, default=5, help='times to repeat each timing')
+    parser.add_argument('--mock', action='store_true', help='insert into mongomock')
+    args = parser.parse_args()
+
+    if args.mock:
+        import mongomock
+        Mongo.database = mongomock.MongoClient()['Benchmark']
+
+    characters = make_characters(args.count)
+    try:
+        for name, seconds in time_inserts(characters, args.repeat):
+            print('{:<20}{:>10.2f} ms{:>10.1f} us/character'.format(
+                name, seconds * 1000, seconds * 1e6 / len(characters)))
+    finally:
+        Mongo._database()[COLLECTION].drop()
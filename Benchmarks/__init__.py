@@ -0,0 +1,4 @@
+"""
+Scripts for timing the slower parts of the app. Each one is run from the project directory as a
+module, e.g. ``python -m Benchmarks.Inserts``.
+"""
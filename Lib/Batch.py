@@ -0,0 +1,620 @@
+"""
+Generates characters in large batches. Rather than building one character object at a time (see
+:mod:`Lib.Generator`), every character in a batch is a row of a few NumPy arrays: one column per
+skill in the rules' :class:`~Lib.Skills.SkillIndex`, one per stat and one per derived attribute.
+Each step of generation is done at once for every character with the same class or package, and
+characters are only turned into dictionaries when they're asked for. Characters made this way
+follow the same distribution as those made one at a time.
+"""
+
+import random
+
+from collections.abc import Sequence
+
+import numpy as np
+
+import Lib.RuleSet as RuleSet
+
+from Lib.Character import HARD_EXPERIENCE_SKILLS
+from Lib.Plans import PACKAGE_BONUS
+from Lib.Sampling import stat_sampler
+from Lib.Skills import ABSENT, STAT_NAMES
+from Lib.Utilities.Exceptions import ExhaustedError
+
+ATTRIBUTE_NAMES = ('Sanity', 'Hit Points', 'Willpower Points', 'Breaking Point')
+
+# The codes used for each type of damaged veteran, which are positions in VETERAN_TYPES
+NOT_VETERAN, VIOLENCE, HELPLESSNESS, UNNATURAL, HARD_EXPERIENCE = range(5)
+VETERAN_TYPES = ('', 'Extreme Violence', 'Captivity or Imprisonment',
+                 'Things Man Was Not Meant to Know', 'Hard Experience')
+
+# The order stats are weighed in by RandomCharacter.apply_stats, which decides which of two
+# equally weighted stats gets the better roll
+_STAT_PRIORITY = ('Power', 'Strength', 'Constitution', 'Dexterity', 'Intelligence', 'Charisma')
+_STAT_BASE = (2, 1, 1, 0.5, 0, 0)
+_PRIORITY_TO_STAT = np.array([_STAT_PRIORITY.index(stat) for stat in STAT_NAMES])
+_STAT_COLUMNS = {stat: position for position, stat in enumerate(STAT_NAMES)}
+
+_UNRANKED = np.iinfo(np.int16).max  # the rank of a skill a character doesn't have
+
+
+class _SkillMatrix(object):
+    """
+    The skills of every character in a batch while it's being generated. Alongside the value of
+    each skill, the order in which each character got its skills is kept, so that ties between
+    skills are broken the same way as they are for a single character.
+
+    :param np.ndarray template: The starting value of every skill, with **ABSENT** for those that
+        characters don't start with
+    :param int default_count: The number of default skills (which come first)
+    :param int count: The number of characters
+    :ivar np.ndarray values: The value of every skill for every character
+    :ivar np.ndarray ranks: The order in which each character got each skill
+    :ivar np.ndarray added: The rank the next skill each character gets will have
+    """
+    __slots__ = ('values', 'ranks', 'added')
+
+    def __init__(self, template, default_count, count):
+        self.values = np.tile(template, (count, 1))
+        ranks = np.where(template != ABSENT, np.arange(len(template)), _UNRANKED)
+        self.ranks = np.tile(ranks.astype(np.int16), (count, 1))
+        self.added = np.full(count, default_count, dtype=np.int16)
+
+    def create(self, rows, columns):
+        """
+        Gives characters a skill (at 0) if they don't already have it.
+
+        :param np.ndarray rows: The characters, each at most once
+        :param columns: The position of the skill, or an array of positions (one per character)
+        :return: None
+        """
+        columns = np.broadcast_to(columns, rows.shape)
+        new = self.values[rows, columns] == ABSENT
+        if new.any():
+            rows = rows[new]
+            columns = columns[new]
+            self.values[rows, columns] = 0
+            self.ranks[rows, columns] = self.added[rows]
+            self.added[rows] += 1
+
+    def set(self, rows, columns, value):
+        """
+        Sets a skill to a value for some characters, giving it to them if needed.
+
+        :param np.ndarray rows: The characters, each at most once
+        :param columns: The position of the skill, or an array of positions (one per character)
+        :param int value: The value to set the skill to
+        :return: None
+        """
+        self.create(rows, columns)
+        self.values[rows, columns] = value
+
+    def add(self, rows, columns, addition):
+        """
+        Adds to a skill for some characters, giving it to them (at 0) first if needed.
+
+        :param np.ndarray rows: The characters, each at most once
+        :param columns: The position of the skill, or an array of positions (one per character)
+        :param int addition: The amount to add
+        :return: None
+        """
+        self.create(rows, columns)
+        self.values[rows, columns] += addition
+
+
+class CharacterBatch(Sequence):
+    """
+    A batch of generated characters, stored as arrays with one row per character. Indexing the
+    batch gives a character as the same dictionary as
+    :meth:`Lib.Character.BaseCharacter.get_character`, built only when it's asked for.
+
+    :ivar tuple skill_names: The name of the skill in each column of **skills**
+    :ivar np.ndarray skills: The skills of every character, with **ABSENT** for skills a character
+        doesn't have
+    :ivar np.ndarray stats: The stats of every character, in the order of
+        :data:`Lib.Skills.STAT_NAMES`
+    :ivar np.ndarray attributes: The derived attributes of every character, in the order of
+        **ATTRIBUTE_NAMES**
+    :ivar np.ndarray classes: The position of each character's class in **class_names**
+    :ivar np.ndarray packages: The position of each character's package in **package_names**
+    :ivar np.ndarray num_bonds: The number of bonds each character has
+    :ivar np.ndarray veterans: The type of damaged veteran each character is, as a position in
+        **VETERAN_TYPES**
+    :ivar np.ndarray disorders: The position of each character's disorder in the rules'
+        Unnatural disorders, or -1 if they don't have one
+    """
+
+    def __init__(self, rules, skill_names, skills, ranks, stats, attributes, classes, packages,
+                 num_bonds, veterans, disorders, bond_seeds):
+        self.rules = rules
+        self.class_names = tuple(class_obj['_id'] for class_obj in rules.classes)
+        self.package_names = tuple(package['_id'] for package in rules.packages)
+        self.skill_names = skill_names
+        self.skills = skills
+        self.ranks = ranks
+        self.stats = stats
+        self.attributes = attributes
+        self.classes = classes
+        self.packages = packages
+        self.num_bonds = num_bonds
+        self.veterans = veterans
+        self.disorders = disorders
+        self.bond_seeds = bond_seeds
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('Character batch index out of range')
+        return self.get_character(position)
+
+    def get_skills(self, position):
+        """
+        Gives the skills of one character, in the same order a single character would have them.
+
+        :param int position: The position of the character in the batch
+        :return: A dictionary mapping the name of every skill the character has to its value
+        :rtype: dict
+        """
+        values = self.skills[position]
+        columns = np.flatnonzero(values != ABSENT)
+        columns = columns[np.argsort(self.ranks[position, columns], kind='mergesort')]
+        return {self.skill_names[column]: int(values[column]) for column in columns}
+
+    def get_bonds(self, position):
+        """
+        Picks the bonds of one character. Bonds are picked from the character's own random seed,
+        so the same character always has the same bonds.
+
+        :param int position: The position of the character in the batch
+        :return: The names of the character's bonds and of the bonds they've lost
+        :rtype: tuple
+        """
+        class_name = self.class_names[self.classes[position]]
+        catalog = self.rules.bonds_for(class_name, self.package_names[self.packages[position]])
+        number = self.rules.class_plans[class_name].bonds
+        rng = random.Random(int(self.bond_seeds[position]))
+        bonds = [record.name for record in catalog.select(number, rng)]
+        lost_bonds = []
+        if self.veterans[position] == HARD_EXPERIENCE and bonds:
+            lost_bonds.append(bonds.pop())
+        return bonds, lost_bonds
+
+    def get_character(self, position):
+        """
+        Gives a dictionary containing all game relevant information about one character.
+
+        :param int position: The position of the character in the batch
+        :return: A dictionary with the same keys as
+            :meth:`Lib.Character.BaseCharacter.get_character`
+        :rtype: dict
+        """
+        stats = {stat: int(value) for stat, value in zip(STAT_NAMES, self.stats[position])}
+        bonds, lost_bonds = self.get_bonds(position)
+        veteran = self.veterans[position]
+        disorder = self.disorders[position]
+        adapted = []
+        if veteran == VIOLENCE:
+            adapted.append('Violence')
+        elif veteran == HELPLESSNESS:
+            adapted.append('Helplessness')
+        return {
+            'Class': self.class_names[self.classes[position]],
+            'Package': self.package_names[self.packages[position]],
+            'Number_Bonds': int(self.num_bonds[position]),
+            'Bonds': {bond: stats['Charisma'] for bond in bonds},
+            'Lost_Bonds': lost_bonds,
+            'Veteran': VETERAN_TYPES[veteran],
+            'Disorders': [] if disorder < 0 else [
+                self.rules.disorders['Unnatural'][disorder]['_id']],
+            'Adapted_To': adapted,
+            'Attributes': {name: int(value)
+                           for name, value in zip(ATTRIBUTE_NAMES, self.attributes[position])},
+            'Stats': stats,
+            'Skills': self.get_skills(position)
+        }
+
+
+class BatchGenerator(object):
+    """
+    Generates many characters at once from a shared snapshot of the rules (see
+    :mod:`Lib.RuleSet`). Like :class:`Lib.Generator.Generator`, it holds no state for any single
+    batch, so one instance can be used from any number of threads.
+
+    :param bool open_gaming_only: If set to true, only OLG licensed or homebrew materials will be
+        used. Ignored if *rules* is provided.
+    :param RuleSet rules: The snapshot of the rules to use. If not provided, the cached snapshot
+        for *open_gaming_only* is used.
+    """
+    def __init__(self, open_gaming_only=False, rules=None):
+        if rules is None:
+            rules = RuleSet.get_rule_set(open_gaming_only)
+        self.rules = rules
+        index = rules.skill_index
+        self.skill_names = tuple(index.names)
+        self._positions = {name: index.positions[name] for name in self.skill_names}
+        self._template = np.array(index.template[:len(self.skill_names)], dtype=np.int16)
+        self._default_count = index.default_count
+        self._class_plans = tuple(rules.class_plans[class_obj['_id']]
+                                  for class_obj in rules.classes)
+        self._package_plans = tuple(rules.package_plans[package['_id']]
+                                    for package in rules.packages)
+
+        # Repeated sub-skills keep one column each time they're repeated, so they're drawn as
+        # often as they are for a single character
+        self._all_options = {}
+        for skill, options in rules.sub_skills.items():
+            columns = [self._positions[skill + ' (' + sub + ')'] for sub in options]
+            self._all_options[skill] = np.array(columns, dtype=np.intp)
+
+        self._stat_weights = np.zeros((len(self.skill_names), len(_STAT_PRIORITY)))
+        for column, name in enumerate(self.skill_names):
+            observed = rules.skill_mapping.get(name)
+            if observed is None:
+                for skill_type in rules.sub_skills:
+                    if skill_type in name:
+                        observed = rules.skill_mapping.get(skill_type, ())
+                        break
+            for stat in observed or ():
+                self._stat_weights[column, _STAT_PRIORITY.index(stat)] += 1
+
+        self._experience = np.array([self._positions.get(skill, -1)
+                                     for skill in HARD_EXPERIENCE_SKILLS], dtype=np.intp)
+        self._stat_tables = {}
+
+    @staticmethod
+    def _subsets(rng, count, size, number):
+        """
+        Picks *number* different positions out of **range(size)** for each of *count* characters,
+        in a random order.
+
+        :param np.random.RandomState rng: The source of random numbers
+        :param int count: The number of characters
+        :param int size: The number of things to pick from
+        :param int number: The number of things to pick for each character
+        :return: An array with a row of positions for each character
+        :rtype: np.ndarray
+        """
+        return np.argsort(rng.random_sample((count, size)), axis=1)[:, :number]
+
+    def _novel_sub_skills(self, skills, rows, skill, rng):
+        """
+        Picks a random sub-skill of *skill* that each character doesn't have yet, weighted by how
+        many times it's repeated.
+
+        :param _SkillMatrix skills: The skills of the batch
+        :param np.ndarray rows: The characters
+        :param str skill: The sub-skill category
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: The position of the sub-skill picked for each character
+        :rtype: np.ndarray
+        """
+        options = self._all_options[skill]
+        free = skills.values[np.ix_(rows, options)] == ABSENT
+        remaining = free.sum(axis=1)
+        if not remaining.all():
+            raise ExhaustedError('Every option has already been used')
+        picks = np.minimum((rng.random_sample(len(rows)) * remaining).astype(np.intp),
+                           remaining - 1)
+        return options[np.argmax(np.cumsum(free, axis=1) > picks[:, None], axis=1)]
+
+    def _any_sub_skills(self, rows, skill, rng):
+        """
+        Picks a random sub-skill of *skill* for each character, whether they have it or not.
+
+        :param np.ndarray rows: The characters
+        :param str skill: The sub-skill category
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: The position of the sub-skill picked for each character
+        :rtype: np.ndarray
+        """
+        options = self._all_options[skill]
+        if not len(options):
+            raise ExhaustedError('{} has no sub-skills to choose from'.format(skill))
+        return options[rng.randint(len(options), size=len(rows))]
+
+    def _safe_set(self, skills, rows, option, rng):
+        """
+        Sets a class's choice of skill for some characters, the same way as
+        :meth:`Lib.Character.RandomCharacter._safe_set_skill`: only skills still at their default
+        value are changed.
+
+        :param _SkillMatrix skills: The skills of the batch
+        :param np.ndarray rows: The characters
+        :param tuple option: (skill, sub, value), where *sub* is empty for a skill or a random
+            sub-skill
+        :param np.random.RandomState rng: The source of random numbers
+        :return: None
+        """
+        skill, sub, value = option
+        if not sub and skill in self.rules.sub_skills:
+            skills.set(rows, self._novel_sub_skills(skills, rows, skill, rng), value)
+            return
+        if sub:
+            column = self._positions[skill + ' (' + sub + ')']
+            current = skills.values[rows, column]
+            rows = rows[(current == ABSENT) | (current == 0)]
+        else:
+            column = self._positions[skill]
+            rows = rows[skills.values[rows, column] == self.rules.defaults[skill]]
+        skills.set(rows, column, value)
+
+    def _apply_class(self, skills, rows, plan, rng):
+        """
+        Applies a class to some characters (see :meth:`Lib.Character.RandomCharacter.apply_class`).
+
+        :param _SkillMatrix skills: The skills of the batch
+        :param np.ndarray rows: The characters with the class
+        :param Lib.Plans.ClassPlan plan: The class
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: None
+        """
+        for skill, value in plan.skills.items():
+            skills.set(rows, self._positions[skill], value)
+        for skill, value in plan.random_sub_skills:
+            skills.set(rows, self._novel_sub_skills(skills, rows, skill, rng), value)
+
+        if not plan.num_choices:
+            return
+        options = [(skill, '', value) for skill, value in plan.skill_choices]
+        options += plan.sub_skill_choices
+        picked = self._subsets(rng, len(rows), len(options), plan.num_choices)
+        first = len(plan.skill_choices)
+        # Like a single character, the specific sub-skills picked go on before the other skills
+        for indices in (range(first, len(options)), range(first)):
+            for turn in range(plan.num_choices):
+                for index in indices:
+                    chosen = rows[picked[:, turn] == index]
+                    if len(chosen):
+                        self._safe_set(skills, chosen, options[index], rng)
+
+    def _apply_package(self, skills, rows, plan, rng):
+        """
+        Applies a package to some characters (see
+        :meth:`Lib.Character.RandomCharacter.apply_package`).
+
+        :param _SkillMatrix skills: The skills of the batch
+        :param np.ndarray rows: The characters with the package
+        :param Lib.Plans.PackagePlan plan: The package
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: None
+        """
+        for skill, addition in plan.skills.items():
+            skills.add(rows, self._positions[skill], addition)
+        for skill in plan.random_sub_skills:
+            skills.add(rows, self._any_sub_skills(rows, skill, rng), PACKAGE_BONUS)
+
+        if not plan.num_choices:
+            return
+        if plan.all_skills:
+            keys = rng.random_sample((len(rows), len(self.skill_names)))
+            missing = skills.values[rows] == ABSENT
+            unnatural = self._positions.get('Unnatural')
+            if unnatural is not None:
+                missing[:, unnatural] = True  # Can't improve Unnatural through normal channels
+            available = len(self.skill_names) - missing.sum(axis=1).max()
+            if plan.num_choices > available:
+                raise ExhaustedError('Cannot pick {} different things out of {}'.format(
+                    plan.num_choices, available))
+            keys[missing] = 2  # after every real key, so never picked
+            picked = np.argsort(keys, axis=1)[:, :plan.num_choices]
+            skills.values[rows[:, None], picked] += PACKAGE_BONUS
+            return
+
+        options = plan.skill_choices
+        picked = self._subsets(rng, len(rows), len(options), plan.num_choices)
+        for turn in range(plan.num_choices):
+            for index, skill in enumerate(options):
+                chosen = rows[picked[:, turn] == index]
+                if not len(chosen):
+                    continue
+                if skill in self.rules.sub_skills:
+                    columns = self._any_sub_skills(chosen, skill, rng)
+                else:
+                    columns = self._positions[skill]
+                skills.add(chosen, columns, PACKAGE_BONUS)
+
+    def _stat_table(self, floor):
+        """
+        Gets the alias table for sets of stats meeting *floor* (see
+        :func:`Lib.Sampling.stat_sampler`) as arrays.
+
+        :param int floor: The minimum allowable sum of the six stats
+        :raises: ExhaustedError
+        :return: The outcomes, thresholds and aliases of the table, and its total
+        :rtype: tuple
+        """
+        table = self._stat_tables.get(floor)
+        if table is None:
+            sampler = stat_sampler(floor)
+            # The total is at most 1296 ** 6, which fits in a 64 bit integer
+            table = (np.array(sampler.outcomes, dtype=np.int16),
+                     np.array(sampler.thresholds, dtype=np.int64),
+                     np.array(sampler.aliases, dtype=np.intp),
+                     sampler.total)
+            self._stat_tables[floor] = table
+        return table
+
+    def _roll_stats(self, count, floor, rng):
+        """
+        Rolls six stats (4d6 drop lowest) for each character, sorted from best to worst.
+
+        :param int count: The number of characters
+        :param int floor: The minimum allowable sum of the six stats, or 0 for no minimum
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: An array with a row of six stats for each character
+        :rtype: np.ndarray
+        """
+        if not floor:
+            dice = rng.randint(1, 7, size=(count, len(STAT_NAMES), 4))
+            rolls = (dice.sum(axis=2) - dice.min(axis=2)).astype(np.int16)
+            return -np.sort(-rolls, axis=1)
+
+        outcomes, thresholds, aliases, total = self._stat_table(floor)
+        indices = rng.randint(len(outcomes), size=count)
+        draws = rng.randint(0, total, size=count, dtype=np.int64)
+        limits = thresholds[indices]
+        indices = np.where((limits < total) & (draws >= limits), aliases[indices], indices)
+        return outcomes[indices]
+
+    def _apply_stats(self, skills, num_bonds, floor, rng):
+        """
+        Generates stats for every character, with the best rolls going to the stats used by
+        each character's five best skills (see :meth:`Lib.Character.RandomCharacter.apply_stats`).
+
+        :param _SkillMatrix skills: The skills of the batch
+        :param np.ndarray num_bonds: The number of bonds of each character
+        :param int floor: The minimum allowable sum of the six stats, or 0 for no minimum
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: An array with a row of stats for each character
+        :rtype: np.ndarray
+        """
+        count = len(num_bonds)
+        best = np.lexsort((skills.ranks, -skills.values.astype(np.int32)), axis=1)[:, :5]
+        weights = np.tile(np.array(_STAT_BASE, dtype=float), (count, 1))
+        weights[:, _STAT_PRIORITY.index('Charisma')] = num_bonds * 2 / 3
+        weights += self._stat_weights[best].sum(axis=1)
+
+        order = np.argsort(-weights, axis=1, kind='mergesort')
+        stats = np.empty((count, len(STAT_NAMES)), dtype=np.int16)
+        stats[np.arange(count)[:, None], order] = self._roll_stats(count, floor, rng)
+        return stats[:, _PRIORITY_TO_STAT]
+
+    def _apply_veterans(self, skills, stats, attributes, num_bonds, rng):
+        """
+        Makes a third of the characters damaged veterans, of a random type each (see
+        :meth:`Lib.Generator.Generator.random_damaged_veteran`).
+
+        :param _SkillMatrix skills: The skills of the batch
+        :param np.ndarray stats: The stats of the batch
+        :param np.ndarray attributes: The derived attributes of the batch
+        :param np.ndarray num_bonds: The number of bonds of each character
+        :param np.random.RandomState rng: The source of random numbers
+        :raises: ExhaustedError
+        :return: The type of veteran of each character and the position of their disorder
+        :rtype: tuple
+        """
+        count = len(num_bonds)
+        veteran = rng.randint(3, size=count) == 2
+        veterans = np.where(veteran, rng.randint(4, size=count) + 1, NOT_VETERAN).astype(np.int8)
+        disorders = np.full(count, -1, dtype=np.intp)
+        sanity, breaking = ATTRIBUTE_NAMES.index('Sanity'), ATTRIBUTE_NAMES.index('Breaking Point')
+        power = stats[:, _STAT_COLUMNS['Power']]
+
+        occult = self._positions.get('Occult')
+        unnatural = self._positions.get('Unnatural')
+        for kind in (VIOLENCE, HELPLESSNESS, UNNATURAL, HARD_EXPERIENCE):
+            rows = np.flatnonzero(veterans == kind)
+            if not len(rows):
+                continue
+            if occult is not None:
+                skills.values[rows, occult] += 20 if kind == UNNATURAL else 10
+
+            if kind == UNNATURAL:
+                if unnatural is not None:
+                    skills.values[rows, unnatural] += 10
+                attributes[rows, sanity] -= power[rows]
+                attributes[rows, breaking] -= power[rows]
+                choices = self.rules.disorders['Unnatural']
+                if not choices:
+                    raise ExhaustedError('There are no Unnatural disorders to choose from')
+                disorders[rows] = rng.randint(len(choices), size=len(rows))
+                continue
+
+            attributes[rows, sanity] -= 5
+            if kind == VIOLENCE:
+                stats[rows, _STAT_COLUMNS['Charisma']] -= 3
+            elif kind == HELPLESSNESS:
+                stats[rows, _STAT_COLUMNS['Power']] -= 3
+            else:
+                num_bonds[rows] -= 1
+                columns = self._experience[self._subsets(
+                    rng, len(rows), len(self._experience), 4)]
+                known = columns >= 0
+                skills.values[np.repeat(rows, 4).reshape(-1, 4)[known], columns[known]] += 10
+        return veterans, disorders
+
+    def generate(self, count, seed=None, floor=68):
+        """
+        Generates a batch of completed Delta Green characters.
+
+        :param int count: The number of characters to generate
+        :param seed: An integer seed or a **numpy.random.RandomState**, used for all random
+            choices. If not provided, the batch is different every time.
+        :param int floor: The minimum allowable sum of each character's stats (see
+            :meth:`Lib.Character.RandomCharacter.apply_stats`)
+        :raises: ExhaustedError
+        :return: The generated characters
+        :rtype: CharacterBatch
+        """
+        rng = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+        if not self._class_plans or not self._package_plans:
+            raise ExhaustedError('There are no classes or packages to choose from')
+
+        classes = rng.randint(len(self._class_plans), size=count)
+        packages = rng.randint(len(self._package_plans), size=count)
+        skills = _SkillMatrix(self._template, self._default_count, count)
+        num_bonds = np.zeros(count, dtype=np.int16)
+
+        for position, plan in enumerate(self._class_plans):
+            rows = np.flatnonzero(classes == position)
+            if len(rows):
+                num_bonds[rows] = plan.bonds
+                self._apply_class(skills, rows, plan, rng)
+        for position, plan in enumerate(self._package_plans):
+            rows = np.flatnonzero(packages == position)
+            if len(rows):
+                self._apply_package(skills, rows, plan, rng)
+                for class_position in np.unique(classes[rows]):
+                    class_plan = self._class_plans[class_position]
+                    self.rules.bonds_for(class_plan.name, plan.name).check_feasible(
+                        class_plan.bonds)
+
+        stats = self._apply_stats(skills, num_bonds, floor, rng)
+        power = stats[:, _STAT_COLUMNS['Power']]
+        attributes = np.empty((count, len(ATTRIBUTE_NAMES)), dtype=np.int16)
+        attributes[:, ATTRIBUTE_NAMES.index('Sanity')] = power * 5
+        attributes[:, ATTRIBUTE_NAMES.index('Hit Points')] = (
+            stats[:, _STAT_COLUMNS['Strength']] + stats[:, _STAT_COLUMNS['Constitution']] + 1) // 2
+        attributes[:, ATTRIBUTE_NAMES.index('Willpower Points')] = power
+        attributes[:, ATTRIBUTE_NAMES.index('Breaking Point')] = power * 4
+        bond_seeds = rng.randint(2 ** 31 - 1, size=count)
+        veterans, disorders = self._apply_veterans(skills, stats, attributes, num_bonds, rng)
+
+        return CharacterBatch(self.rules, self.skill_names, skills.values, skills.ranks, stats,
+                              attributes, classes, packages, num_bonds, veterans, disorders,
+                              bond_seeds)
+
+
+# The batch generator for each cached snapshot of the rules, by whether it's open gaming only
+_generators = {}
+
+
+def get_batch_generator(open_gaming_only=False):
+    """
+    Gives a batch generator for the process-wide snapshot of the rules (see
+    :func:`Lib.RuleSet.get_rule_set`). Each generator is only built once per snapshot, and is
+    built again when the snapshot is refreshed or expires.
+
+    :param bool open_gaming_only: If set to true, only OLG licensed or homebrew materials will be
+        used.
+    :return: A generator that can be shared between threads
+    :rtype: BatchGenerator
+    """
+    rules = RuleSet.get_rule_set(open_gaming_only)
+    generator = _generators.get(open_gaming_only)
+    if generator is None or generator.rules is not rules:
+        # Two threads might both build one for a new snapshot, which does no harm
+        generator = _generators[open_gaming_only] = BatchGenerator(rules=rules)
+    return generator
@@ -0,0 +1,150 @@
+"""
+Contains the catalog of bonds available to a character and the logic for picking a well
+distributed set of bonds from it.
+"""
+
+from collections import namedtuple
+
+from Lib.Utilities.Exceptions import ExhaustedError
+
+BOND_TYPES = ('Family', 'Romantic', 'Friend', 'Work', 'Therapy')
+ALL_TYPES = (1 << len(BOND_TYPES)) - 1
+
+Bond = namedtuple('Bond', ['name', 'mask', 'primary', 'document'])
+Bond.__doc__ = """
+A compact record of a single bond.
+
+:ivar str name: The name of the bond (its **_id** in the database)
+:ivar int mask: A bitmask of the types of the bond; bit *n* is set if the bond is of the type
+    **BOND_TYPES[n]**
+:ivar int primary: The index in **BOND_TYPES** of the first type the bond has, or None if it has no
+    type at all
+:ivar dict document: The bond as it is stored in the database
+"""
+
+
+def bond_mask(types):
+    """
+    Turns the names of some bond types into a bitmask.
+
+    :param list types: Names of bond types (any of: "Family", "Romantic", "Friend", "Work",
+        "Therapy")
+    :return: A bitmask with a bit set for each type
+    :rtype: int
+    """
+    mask = 0
+    for bit, bond_type in enumerate(BOND_TYPES):
+        if bond_type in types:
+            mask |= 1 << bit
+    return mask
+
+
+def make_bond(document):
+    """
+    Builds the compact record for a bond from its database representation.
+
+    :param dict document: A dictionary with the key **_id** (the bond's name) and optionally the
+        booleans **Family**, **Romantic**, **Friend**, **Work** and **Therapy**
+    :return: The record for the bond
+    :rtype: Bond
+    """
+    mask = 0
+    primary = None
+    for bit, bond_type in enumerate(BOND_TYPES):
+        if document.get(bond_type, False):  # protects against missing properties
+            mask |= 1 << bit
+            if primary is None:
+                primary = bit
+    return Bond(document['_id'], mask, primary, document)
+
+
+class BondCatalog(object):
+    """
+    All of the bonds available to one combination of class and package, bucketed by their type so
+    that a well distributed set of bonds can be picked without trial and error. Iterating over the
+    catalog gives the bonds as they are stored in the database.
+
+    :param list bonds: The bonds (as dictionaries from the database) in the catalog
+    """
+    __slots__ = ('records', 'buckets', 'types')
+
+    def __init__(self, bonds):
+        self.records = tuple(make_bond(bond) for bond in bonds)
+        buckets = [[] for _ in BOND_TYPES]
+        self.types = 0
+        for position, record in enumerate(self.records):
+            self.types |= record.mask
+            if record.primary is not None:
+                buckets[record.primary].append(position)
+        self.buckets = tuple(tuple(bucket) for bucket in buckets)
+
+    def __iter__(self):
+        return (record.document for record in self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def check_feasible(self, number):
+        """
+        Makes sure the catalog has enough bonds for a character to have *number* different ones.
+
+        :param int number: The number of bonds the character should have
+        :raises: ExhaustedError
+        :return: None
+        """
+        if number > len(self.records):
+            raise ExhaustedError('Character needs {} bonds, but only {} are available'.format(
+                number, len(self.records)))
+
+    def select(self, number, rng):
+        """
+        Picks *number* different bonds. The first is picked at random from all of the bonds. After
+        that, each bond is picked at random from those whose first type isn't yet covered by the
+        bonds already picked. Once every type is covered (or no bonds of the missing types are
+        left), each bond is picked at random from all those not yet picked. This is the same
+        distribution you get from proposing random bonds and rejecting the ones that don't fit,
+        but always takes exactly *number* random draws.
+
+        :param int number: The number of bonds to pick
+        :param rng: An object with the same interface as the built-in random module
+        :raises: ExhaustedError
+        :return: The records of the bonds picked, in the order they were picked
+        :rtype: list
+        """
+        self.check_feasible(number)
+        if not number:
+            return []
+
+        records = self.records
+        position = rng.randrange(len(records))
+        picked = [position]
+        covered = records[position].mask
+        remaining = None
+
+        for _ in range(number - 1):
+            if remaining is None and covered != ALL_TYPES:
+                # A bond whose first type is already covered can't be in an open bucket, so the
+                # open buckets never contain anything that has already been picked.
+                open_buckets = [bucket for bit, bucket in enumerate(self.buckets)
+                                if bucket and not covered & (1 << bit)]
+                total = sum(len(bucket) for bucket in open_buckets)
+                if total:
+                    index = rng.randrange(total)
+                    for bucket in open_buckets:
+                        if index < len(bucket):
+                            position = bucket[index]
+                            break
+                        index -= len(bucket)
+                    picked.append(position)
+                    covered |= records[position].mask
+                    continue
+
+            if remaining is None:
+                taken = set(picked)
+                remaining = [index for index in range(len(records)) if index not in taken]
+            index = rng.randrange(len(remaining))
+            picked.append(remaining[index])
+            remaining[index] = remaining[-1]
+            remaining.pop()
+
+        return [records[position] for position in picked]
@@ -4,25 +4,58 @@ characters and functions for displaying created characters.
 """
 
 import random
-import copy
 import operator
 import math
 
-import Lib.Utilities.Mongo as Mongo
+import Lib.Utilities.Serialize as Serialize
+import Lib.Utilities.Storage as Storage
 
-from ExternalServices import SAVE_LOCATION
-from Lib.Utilities.Exceptions import NotFoundError
+from ExternalServices import SAVE_LOCATION, CHARACTER_CACHE_SIZE, CHARACTER_CACHE_PATH
+from Lib.Plans import ClassPlan, PackagePlan, PACKAGE_BONUS
+from Lib.Sampling import stat_sampler, sample, sample_indices, RemainingPool
+from Lib.SavedIDs import SavedIDIndex
+from Lib.Skills import SkillIndex, SkillSet, StatBlock, STAT_NAMES
+from Lib.Utilities.Cache import LRUCache, DiskCache, TieredCache
+from Lib.Utilities.Exceptions import NotFoundError, MalformedError
+
+# Every property of a character dictionary, in the order get_character gives them
+CHARACTER_FIELDS = ('Class', 'Package', 'Number_Bonds', 'Bonds', 'Lost_Bonds', 'Veteran',
+                    'Disorders', 'Adapted_To', 'Attributes', 'Stats', 'Skills')
+
+# Each property of a character dictionary, encoded as a JSON key once rather than per character
+JSON_KEYS = {field: Serialize.key(field) for field in CHARACTER_FIELDS}
+
+# Skills that a "Hard Experience" damaged veteran could plausibly have improved
+HARD_EXPERIENCE_SKILLS = ("Alertness", "Athletics", "Bureaucracy", "Computer Science",
+                          "Criminology", "Demolitions", "Dodge", "Drive", "Firearms", "First Aid",
+                          "Forensics", "Heavy Machinery", "Heavy Weapons", "History", "HUMINT",
+                          "Law", "Melee Weapons", "Navigate", "Occult", "Persuade", "Pharmacy",
+                          "Psychotherapy", "Search", "Stealth", "Survival", "Unarmed Combat")
+
+# Saved characters never change, so they're cached (by ID) in front of the database
+cache = TieredCache(LRUCache(CHARACTER_CACHE_SIZE),
+                    DiskCache(CHARACTER_CACHE_PATH) if CHARACTER_CACHE_PATH else None)
+
+# Which characters have been saved, so IDs that never were don't need the database
+saved_ids = SavedIDIndex()
+
+# Saved characters, already encoded as JSON, so they can be sent without being encoded again
+encoded_cache = LRUCache(CHARACTER_CACHE_SIZE)
 
 
 class BaseCharacter(object):
     """
     Class that contains all important properties of a character and the methods for reading those.
     This class won't have any logic for setting or changing these; those show up in the
-    specialized sub-classes.
+    specialized sub-classes. Characters use slots rather than a dictionary of attributes and keep
+    their stats in a :class:`Lib.Skills.StatBlock`, so that many of them can be held in memory.
     """
+    __slots__ = ('storage', 'skills', 'num_bonds', 'bonds', 'lost_bonds', 'class_name',
+                 'package_name', 'disorders', 'adapted', 'damaged_veteran', 'stats', 'hp', 'wp',
+                 'sanity', 'bp')
 
     def __init__(self):
-        self.Mongo = Mongo
+        self.storage = Storage.storage
         self.skills = {}
         self.num_bonds = 0
         self.bonds = []
@@ -35,14 +68,7 @@ class BaseCharacter(object):
             "Helplessness": False
         }
         self.damaged_veteran = ''
-        self.stats = {
-            'Strength': 0,
-            'Dexterity': 0,
-            'Constitution': 0,
-            'Intelligence': 0,
-            'Power': 0,
-            'Charisma': 0
-        }
+        self.stats = StatBlock()
 
         self.hp = 0
         self.wp = 0
@@ -104,7 +130,8 @@ class BaseCharacter(object):
 
     def get_skills(self):
         """
-        Gives the dictionary containing all of the character's skills.
+        Gives the dictionary containing all of the character's skills. For randomly generated
+        characters this is a :class:`Lib.Skills.SkillSet`, which behaves like a dictionary.
 
         :return: A dictionary with all skills, mapping to the value associated with this skill
         :rtype: dict
@@ -234,10 +261,13 @@ class BaseCharacter(object):
         """
         return self.damaged_veteran
 
-    def get_character(self):
+    def get_character(self, fields=None):
         """
         Gives a dictionary containing all game relevant information about the character.
 
+        :param list fields: The properties to include (any of those listed below), each given
+            once in the order of **CHARACTER_FIELDS**. If not provided, every property is
+            included.
         :return: A dictionary with keys **Class**, **Package**, **Number_Bonds**, **Bonds** (here
             the name of the bond is mapped to the strength of the bond, an integer), **Lost_Bonds**
             (a simple list), **Veteran** (empty string if not a veteran) **Disorders** (empty list
@@ -257,66 +287,143 @@ class BaseCharacter(object):
             'Disorders': self.disorders,
             'Adapted_To': self.get_adaptations(),
             'Attributes': self.get_attributes(),
-            'Stats': self.stats,
-            'Skills': self.skills
+            'Stats': dict(self.stats),
+            'Skills': dict(self.skills)
         }
+        if fields is not None:
+            return {field: character[field] for field in normalize_fields(fields)}
         return character
 
-    def parse_character(self, character):
+    def get_character_json(self, fields=None):
+        """
+        Gives the same information as :meth:`get_character`, encoded as compact JSON. Each
+        property is encoded straight from the character, without building the whole dictionary
+        first, and the keys were encoded ahead of time.
+
+        :param list fields: The properties to include, each given once in the order of
+            **CHARACTER_FIELDS** however they're listed. If not provided, every property is
+            included.
+        :raises: MalformedError (if any of the properties doesn't exist)
+        :return: The encoded character
+        :rtype: bytes
+        """
+        fields = CHARACTER_FIELDS if fields is None else normalize_fields(fields)
+        return Serialize.join_object((JSON_KEYS[field], Serialize.dumps(_PROPERTIES[field](self)))
+                                     for field in fields)
+
+    def parse_character(self, character, fields=None, strict=False):
         """
         Method that overwrites whatever currently exists for this character with the character
         passed as a dictionary. Raises NotFoundError if any expected property of the character is
-        missing in this dictionary.
+        missing in this dictionary, or MalformedError if a property has the wrong type (e.g. the
+        stats aren't small integers, when being strict).
 
         :param dict character: The dictionary representation of a character as created by the
             :meth:`~BaseCharacter.get_character` method.
+        :param list fields: The properties to load (see :func:`required_fields`), for loading
+            only part of a character. The rest of the character is left as it is. If not
+            provided, every property is loaded.
+        :param bool strict: If true (as for a character about to be saved), the stats have to be
+            the six stats as small integers. Otherwise (as for a character that's already been
+            saved) stats that don't fit are kept just as they are.
 
-        :raises: NotFoundError
+        :raises: NotFoundError, MalformedError
 
         :return: True if the character is successfully loaded.
         """
+        fields = CHARACTER_FIELDS if fields is None else fields
         try:
-            self.skills = character['Skills']
-            self.num_bonds = character['Number_Bonds']
-            self.bonds = [{"_id": bond} for bond in character['Bonds'].keys()]
-            self.lost_bonds = [{"_id": bond} for bond in character['Lost_Bonds']]
-            self.class_name = character['Class']
-            self.package_name = character['Package']
-            self.disorders = character['Disorders']
-            self.adapted = {
-                "Violence": "Violence" in character['Adapted_To'],
-                "Helplessness": "Helplessness" in character['Adapted_To'],
-            }
-            self.damaged_veteran = character['Veteran']
-            self.stats = character['Stats']
-            self.hp = character['Attributes']['Hit Points']
-            self.bp = character['Attributes']['Breaking Point']
-            self.wp = character['Attributes']['Willpower Points']
-            self.sanity = character['Attributes']['Sanity']
+            if 'Skills' in fields:
+                self.skills = dict(character['Skills'])
+            if 'Number_Bonds' in fields:
+                self.num_bonds = character['Number_Bonds']
+            if 'Bonds' in fields:
+                if not isinstance(character['Bonds'], dict):
+                    raise TypeError('Bonds must be an object')
+                self.bonds = [{"_id": bond} for bond in character['Bonds'].keys()]
+            if 'Lost_Bonds' in fields:
+                self.lost_bonds = [{"_id": bond} for bond in character['Lost_Bonds']]
+            if 'Class' in fields:
+                self.class_name = character['Class']
+            if 'Package' in fields:
+                self.package_name = character['Package']
+            if 'Disorders' in fields:
+                self.disorders = list(character['Disorders'])
+            if 'Adapted_To' in fields:
+                self.adapted = {
+                    "Violence": "Violence" in character['Adapted_To'],
+                    "Helplessness": "Helplessness" in character['Adapted_To'],
+                }
+            if 'Veteran' in fields:
+                self.damaged_veteran = character['Veteran']
+            if 'Stats' in fields:
+                self.stats = self._parse_stats(character['Stats'], strict)
+            if 'Attributes' in fields:
+                self.hp = character['Attributes']['Hit Points']
+                self.bp = character['Attributes']['Breaking Point']
+                self.wp = character['Attributes']['Willpower Points']
+                self.sanity = character['Attributes']['Sanity']
             return True
         except KeyError as k:
             raise NotFoundError('Character dictionary missing expected property: {}'.format(k))
+        except (TypeError, ValueError, OverflowError, AttributeError) as e:
+            raise MalformedError('Character has an invalid property: {}'.format(e))
+
+    @staticmethod
+    def _parse_stats(stats, strict):
+        """
+        Turns a dictionary of stats into a :class:`Lib.Skills.StatBlock`, if it fits in one.
 
-    def load_character_from_db(self, character_id):
+        :param dict stats: The stats
+        :param bool strict: If true, stats that don't fit in a StatBlock are an error. Otherwise
+            they're kept as a copy of the dictionary, so nothing in it is lost.
+        :raises: KeyError, TypeError, OverflowError (if strict and the stats don't fit)
+        :return: The stats
+        :rtype: StatBlock_or_dict
+        """
+        if strict:
+            return StatBlock(stats)
+        if isinstance(stats, dict) and len(stats) == len(STAT_NAMES):
+            try:
+                return StatBlock(stats)
+            except (KeyError, TypeError, OverflowError):
+                pass
+        return dict(stats)
+
+    def load_character_from_db(self, character_id, fields=None):
         """
         Method that overwrites whatever currently exists for this character with the character
         that exists in the database with the provided **_id**. Raises NotFoundError if the
         character cannot be found in the database or any expected property of the character is
-        missing.
+        missing. Characters are read through the process-wide **cache**, so a character that has
+        been loaded before doesn't need the database at all, and IDs that **saved_ids** knows
+        weren't saved don't either.
 
         :param str character_id: The unique ID of the character. This is set by MongoDB and is how
             we find the character in the database.
+        :param list fields: The properties of the character to load. Only these (and any they
+            depend on, see :func:`required_fields`) are fetched from the database. If not
+            provided, the whole character is loaded.
 
         :raises: NotFoundError, MalformedError
 
         :return: True if the character is successfully loaded.
         """
-        character = self.Mongo.find_by_id(SAVE_LOCATION, character_id)
+        fields = None if fields is None else required_fields(fields)
+        object_id = self.storage.to_object_id(character_id)
+        key = str(object_id)
+        character = cache.get(key)
+        if character is None and not saved_ids.is_missing(object_id):
+            character = self.storage.find_by_id(SAVE_LOCATION, key, fields=fields)
+            if not character:
+                saved_ids.not_found(object_id)
+            elif fields is None:
+                cache.put(key, character)
 
         if not character:
             raise NotFoundError('Could not find character with ID {0!s}'.format(character_id))
 
-        self.parse_character(character)
+        self.parse_character(character, fields)
         return True
 
     def save(self):
@@ -328,7 +435,25 @@ class BaseCharacter(object):
         :rtype: ObjectID
         """
 
-        return self.Mongo.insert(self.get_character(), SAVE_LOCATION)
+        character_id = self.storage.insert(self.get_character(), SAVE_LOCATION)
+        saved_ids.add([character_id])
+        return character_id
+
+
+# How to get each property of a character dictionary from a character, one at a time
+_PROPERTIES = {
+    'Class': lambda character: character.class_name,
+    'Package': lambda character: character.package_name,
+    'Number_Bonds': lambda character: character.num_bonds,
+    'Bonds': lambda character: dict.fromkeys(character.get_bonds(), character.stats['Charisma']),
+    'Lost_Bonds': lambda character: character.get_lost_bonds(),
+    'Veteran': lambda character: character.damaged_veteran,
+    'Disorders': lambda character: character.disorders,
+    'Adapted_To': lambda character: character.get_adaptations(),
+    'Attributes': lambda character: character.get_attributes(),
+    'Stats': lambda character: dict(character.stats),
+    'Skills': lambda character: dict(character.skills)
+}
 
 
 class RandomCharacter(BaseCharacter):
@@ -344,19 +469,29 @@ class RandomCharacter(BaseCharacter):
         this distinction is important, because it comes up multiple times.
 
     :param dict default_skills: A dictionary containing all skills (except skills with
-        associated sub-skills) and their default values
+        associated sub-skills) and their default values. This is shared by the character rather
+        than copied, so it shouldn't be changed while the character is in use.
     :param dict sub_skills: A dictionary containing as keys all of the skills classified
         as sub-skills, mapped to lists of all sub-skill options for each
     :param dict skill_mappings: A dictionary that maps Skills with the stats that they're
         associated with. Used to give reasonable looking stats to each character.
+    :param Lib.Skills.SkillIndex skill_index: The index of skill names to store the character's
+        skills against. Should be shared by every character made from the same rules (see
+        :attr:`Lib.RuleSet.RuleSet.skill_index`); if not provided, a new one is built.
     """
-    def __init__(self, default_skills, sub_skills, skill_mappings):
+    __slots__ = ('defaults', 'sub_skills', 'sub_skill_types', 'skill_mappings',
+                 '_sub_skill_pools', 'random')
+
+    def __init__(self, default_skills, sub_skills, skill_mappings, skill_index=None):
         BaseCharacter.__init__(self)
-        self.skills = copy.deepcopy(default_skills)
+        if skill_index is None:
+            skill_index = SkillIndex(default_skills, sub_skills)
+        self.skills = SkillSet(skill_index)
         self.defaults = default_skills
         self.sub_skills = sub_skills
         self.sub_skill_types = sub_skills.keys()
         self.skill_mappings = skill_mappings
+        self._sub_skill_pools = {}
 
         self.random = random  # this will make my life easier with unit testing
 
@@ -395,6 +530,22 @@ class RandomCharacter(BaseCharacter):
         choices = self.sub_skills[skill]
         return self.random.choice(choices)
 
+    def _remaining_sub_skills(self, skill):
+        """
+        Gets the sub-skills of a skill that the character doesn't have yet. These are worked out
+        the first time they're needed and kept up to date as sub-skills are added after that.
+
+        :param str skill: A skill which has associated subskills (e.g. Craft, Foreign Language)
+        :return: The pool of sub-skills not yet used by the character
+        :rtype: Lib.Sampling.RemainingPool
+        """
+        pool = self._sub_skill_pools.get(skill)
+        if pool is None:
+            options = self.sub_skills[skill]
+            taken = [sub for sub in options if self._get_subskill_str(skill, sub) in self.skills]
+            pool = self._sub_skill_pools[skill] = RemainingPool(options, taken)
+        return pool
+
     def _set_skill(self, skill, value):
         """
         Sets the provided skill to the provided value. If the skill has subcomponents (i.e.
@@ -434,6 +585,9 @@ class RandomCharacter(BaseCharacter):
         string = self._get_subskill_str(skill, sub)
         if string not in self.skills:
             self.skills[string] = 0
+            pool = self._sub_skill_pools.get(skill)
+            if pool is not None:
+                pool.discard(sub)
         return string
     
     def _set_sub_skill(self, skill, sub, value):
@@ -458,18 +612,22 @@ class RandomCharacter(BaseCharacter):
         Adds a random sub-skill to the character (setting it to 0 in the process).
 
         :param str skill: A skill which has associated subskills (e.g. Craft, Foreign Language)
-        :param bool novel: If true, then the potential sub-skill will be generated and regenerated
-            until one not already in the character's skill list is found.
-
+        :param bool novel: If true, then the sub-skill will be picked from only those not already
+            in the character's skill list. Raises ExhaustedError if there aren't any left.
+        :raises: ExhaustedError
         :return: The display string (e.g. "Foreign Language (French)") for the sub-skill
         :rtype: str
         """
-        choice = self._get_random_sub_skill(skill)
-        string = self._get_subskill_str(skill, choice)
         if novel:
-            while string in self.skills:
-                choice = self._get_random_sub_skill(skill)
+            pool = self._remaining_sub_skills(skill)
+            choice = pool.draw(self.random)
+            string = self._get_subskill_str(skill, choice)
+            while string in self.skills:  # only if the skill was added without going through here
+                choice = pool.draw(self.random)
                 string = self._get_subskill_str(skill, choice)
+        else:
+            choice = self._get_random_sub_skill(skill)
+            string = self._get_subskill_str(skill, choice)
         self._add_sub_skill(skill, choice)
         return string
 
@@ -509,53 +667,66 @@ class RandomCharacter(BaseCharacter):
                 self._set_sub_skill(skill, sub, value)
                 return True
 
+    def _claim_sub_skills(self, sub_skills):
+        """
+        Takes specific sub-skills that have just been added to the character straight from a plan
+        out of the pools of sub-skills that are still available to it.
+
+        :param tuple sub_skills: (skill, sub) pairs, e.g. ("Craft", "Mechanic")
+        :return: None
+        """
+        for skill, sub in sub_skills:
+            pool = self._sub_skill_pools.get(skill)
+            if pool is not None:
+                pool.discard(sub)
+
     def apply_class(self, class_obj):
         """
         Applies a class to this character. Classes are defined in dictionaries. For an example of
         what these classes look like, see `OpenGamingJSON/classes.json`. Applying a class sets
-        many skills to non-default values and sets the number of bonds.
-
-        :param class_obj: A dictionary containing the keys **_id** (the class name),
-            **Skills** (a dictionary mapping skills to their starting value), **Choices** (a
-            dictionary with keys **Skills**, **Number** and sometimes **Subskills**, which is
-            used when a class is allowed to choose one from a number of skills), **Subskills**
-            (an array of dictionaries; each inner one contains the keys **Skill**, **Sub**, and
-            **Value** - which are used to set up skills the character class gets when sub-skills
-            like Craft (Microelectronics) are specified in the class description, or when a
-            skill with sub-skills is included multiple times in the class), and **Bonds** (the
-            number of bonds the character class gets)
+        many skills to non-default values and sets the number of bonds. Everything the class sets
+        for sure (skills and specific sub-skills) is set first, then random sub-skills are
+        picked, then the class's choices are made.
+
+        :param class_obj: A :class:`Lib.Plans.ClassPlan` (as kept by the rules), or a dictionary
+            containing the keys **_id** (the class name), **Skills** (a dictionary mapping skills
+            to their starting value), **Choices** (a dictionary with keys **Skills**, **Number**
+            and sometimes **Subskills**, which is used when a class is allowed to choose one from
+            a number of skills), **Subskills** (an array of dictionaries; each inner one contains
+            the keys **Skill**, **Sub**, and **Value** - which are used to set up skills the
+            character class gets when sub-skills like Craft (Microelectronics) are specified in
+            the class description, or when a skill with sub-skills is included multiple times in
+            the class), and **Bonds** (the number of bonds the character class gets). A
+            dictionary is compiled into a plan before it's applied.
+        :raises: MalformedError (if a dictionary isn't a valid class), ExhaustedError
         :return: None
         :rtype: None
         """
-        skills = class_obj['Skills']
-        sub_skills = class_obj['Subskills']
-        self.num_bonds = class_obj['Bonds']
-        self.class_name = class_obj['_id']
-
-        for skill in skills:
-            self._set_skill(skill, skills[skill])
-        
-        for obj in sub_skills:
-            self._set_sub_skill(obj['Skill'], obj['Sub'], obj['Value'])
-
-        choices = class_obj['Choices']
-        skill_choices = choices['Skills']
-        num_choices = choices['Number']
-
-        if num_choices:
-            skill_list = list(skill_choices.keys())
-            if 'Subskills' in choices:
-                choice_sub_skills = choices['Subskills']
-                sample_list = [False for _ in skill_list]
-                sample_list.extend(choice_sub_skills)
-                for tf in self.random.sample(sample_list, num_choices):
-                    # picks a fair amount of sub-skills, proportional to the number there are
-                    if tf:
-                        num_choices -= 1
-                        self._safe_set_skill(tf['Skill'], tf['Sub'], tf['Value'])
-            if num_choices:
-                for skill in self.random.sample(skill_list, num_choices):
-                    self._safe_set_skill(skill, '', skill_choices[skill])
+        if not isinstance(class_obj, ClassPlan):
+            class_obj = ClassPlan(class_obj, self.defaults, self.sub_skills)
+        self.num_bonds = class_obj.bonds
+        self.class_name = class_obj.name
+
+        self.skills.update(class_obj.skills)
+        self._claim_sub_skills(class_obj.sub_skills)
+        for skill, value in class_obj.random_sub_skills:
+            self.skills[self._add_random_sub_skill(skill)] = value
+
+        if class_obj.num_choices:
+            # skills and sub-skills are picked together, so a fair amount of sub-skills are
+            # picked, proportional to the number there are
+            skill_choices = class_obj.skill_choices
+            sub_skill_choices = class_obj.sub_skill_choices
+            picked = sample_indices(len(skill_choices) + len(sub_skill_choices),
+                                    class_obj.num_choices, self.random)
+            for index in picked:
+                if index >= len(skill_choices):
+                    skill, sub, value = sub_skill_choices[index - len(skill_choices)]
+                    self._safe_set_skill(skill, sub, value)
+            for index in picked:
+                if index < len(skill_choices):
+                    skill, value = skill_choices[index]
+                    self._safe_set_skill(skill, '', value)
 
     def _add_to_skill(self, skill, addition, novel_sub_skill=True):
         """
@@ -620,41 +791,40 @@ class RandomCharacter(BaseCharacter):
         :rtype: bool
         """
         if sub:
-            return self._add_to_sub_skill(skill, sub, 20)
+            return self._add_to_sub_skill(skill, sub, PACKAGE_BONUS)
         else:
-            return self._add_to_skill(skill, 20, False)
+            return self._add_to_skill(skill, PACKAGE_BONUS, False)
 
     def apply_package(self, package):
         """
         Applies a package (normally 8 skills that each get +20) to a character. Also sets the
         **package_name** property on the character.
 
-        :param dict package: A dictionary with keys **Skills**, **Subskills** and **Choices**.
-            This is similar to the character dictionary, but there are no values involved and the
-            **Skills** top level key maps to an array.
+        :param package: A :class:`Lib.Plans.PackagePlan` (as kept by the rules), or a dictionary
+            with keys **Skills**, **Subskills** and **Choices**. This is similar to the character
+            dictionary, but there are no values involved and the **Skills** top level key maps to
+            an array. A dictionary is compiled into a plan before it's applied.
+        :raises: MalformedError (if a dictionary isn't a valid package), ExhaustedError
         :return: None
         :rtype: None
         """
-        skills = package['Skills']
-        sub_skills = package['Subskills']
-        self.package_name = package['_id']
-
-        for skill in skills:
-            self.add_package_skill(skill, '')
-
-        for obj in sub_skills:
-            self.add_package_skill(obj['Skill'], obj['Sub'])
-        
-        choices = package['Choices']
-        skill_choices = choices['List']
-        all_skills = choices['All']
-        num_choices = choices['Number']
-        if num_choices:
-            if all_skills:
-                skill_choices = list(self.skills.keys())
-                skill_choices.remove('Unnatural')  # Can't improve this through normal channels
-            self.random.shuffle(skill_choices)
-            for skill in skill_choices[:num_choices]:
+        if not isinstance(package, PackagePlan):
+            package = PackagePlan(package, self.defaults, self.sub_skills)
+        self.package_name = package.name
+
+        skills = self.skills
+        for skill, addition in package.skills.items():
+            skills[skill] = skills.get(skill, 0) + addition
+        self._claim_sub_skills(package.sub_skills)
+        for skill in package.random_sub_skills:
+            self._add_to_skill(skill, PACKAGE_BONUS, False)
+
+        if package.num_choices:
+            skill_choices = package.skill_choices
+            if package.all_skills:
+                # Can't improve Unnatural through normal channels
+                skill_choices = [skill for skill in skills if skill != 'Unnatural']
+            for skill in sample(skill_choices, package.num_choices, self.random):
                 self.add_package_skill(skill, '')
 
     def set_stat(self, stat, value):
@@ -682,6 +852,9 @@ class RandomCharacter(BaseCharacter):
             Having this set to a value significantly increases the strength of a character (although
             this effect is less pronounced for values less than 65 and practically non-existent
             below 60). Set to 0 for the hardcore gamer cred of taking whatever the dice gives you.
+            Rather than re-rolling until the floor is met, stats are drawn from a precomputed table
+            of every set of rolls that meets it, which gives the same results in constant time.
+        :raises: ExhaustedError (if no set of rolls can meet the floor)
         :return: None
         :rtype: None
         """
@@ -707,12 +880,12 @@ class RandomCharacter(BaseCharacter):
         for stat in observed_stats:
             stat_count[stat] += 1
 
-        die_rolls = sorted([self.roll_stat() for _ in range(6)], reverse=True)
         if floor:
-            while sum(die_rolls) < floor:
-                die_rolls = sorted([self.roll_stat() for _ in range(6)], reverse=True)
+            die_rolls = stat_sampler(floor).draw(self.random)
+        else:
+            die_rolls = sorted([self.roll_stat() for _ in range(6)], reverse=True)
         stat_order = sorted(stat_count.items(), key=operator.itemgetter(1), reverse=True)
-        self.stats = {stat[0]: die_rolls[i] for i, stat in enumerate(stat_order)}
+        self.stats = StatBlock({stat[0]: die_rolls[i] for i, stat in enumerate(stat_order)})
 
     def calculate_attributes(self):
         """
@@ -788,13 +961,7 @@ class RandomCharacter(BaseCharacter):
         self.damaged_veteran = 'Hard Experience'
         self.lost_bonds.append(self.bonds.pop())
         self.num_bonds -= 1
-        plausible_skills = ["Alertness", "Athletics", "Bureaucracy", "Computer Science",
-                            "Criminology", "Demolitions", "Dodge", "Drive", "Firearms",
-                            "First Aid", "Forensics", "Heavy Machinery", "Heavy Weapons", "History",
-                            "HUMINT", "Law", "Melee Weapons", "Navigate", "Occult", "Persuade",
-                            "Pharmacy", "Psychotherapy", "Search", "Stealth", "Survival",
-                            "Unarmed Combat"]
-        skills = self.random.sample(plausible_skills, 4)
+        skills = sample(HARD_EXPERIENCE_SKILLS, 4, self.random)
 
         for skill in skills:
             self._add_to_skill(skill, 10)
@@ -834,3 +1001,143 @@ class RandomCharacter(BaseCharacter):
         :rtype: None
         """
         self.disorders.append(disorder['_id'])
+
+
+def save_characters(characters):
+    """
+    Saves many characters to the database at once, with a single unordered bulk insert rather than
+    one insert per character.
+
+    :param list characters: The characters (:class:`BaseCharacter` or subclasses) to save
+    :return: The MongoDB ID of each character's record, in the same order as the characters, with
+        None for any character that couldn't be saved
+    :rtype: list
+    """
+    character_ids = Storage.storage.insert_many(
+        [character.get_character() for character in characters], SAVE_LOCATION)
+    saved_ids.add([character_id for character_id in character_ids if character_id is not None])
+    return character_ids
+
+
+def normalize_fields(fields):
+    """
+    Puts a list of character properties in a standard form, so that lists asking for the same
+    properties (in any order, or with some repeated) give the same result.
+
+    :param list fields: The properties wanted (any of **CHARACTER_FIELDS**)
+    :raises: MalformedError (if any of the properties doesn't exist)
+    :return: Each property once, in the order of **CHARACTER_FIELDS**
+    :rtype: list
+    """
+    unknown = [field for field in fields if field not in CHARACTER_FIELDS]
+    if unknown:
+        raise MalformedError('Characters have no property: {}'.format(', '.join(unknown)))
+    wanted = set(fields)
+    return [field for field in CHARACTER_FIELDS if field in wanted]
+
+
+def required_fields(fields):
+    """
+    Works out which properties of a saved character have to be loaded to give *fields*. The
+    strength of a character's bonds comes from their Charisma, so loading the bonds also needs
+    the stats.
+
+    :param list fields: The properties wanted (any of **CHARACTER_FIELDS**)
+    :raises: MalformedError (if any of the properties doesn't exist)
+    :return: The properties to load, in the form given by :func:`normalize_fields`
+    :rtype: list
+    """
+    if 'Bonds' in fields and 'Stats' not in fields:
+        fields = list(fields) + ['Stats']
+    return normalize_fields(fields)
+
+
+def load_character_json(character_id, fields=None):
+    """
+    Loads a saved character (see :meth:`BaseCharacter.load_character_from_db`) and gives it
+    encoded as JSON. Saved characters never change, so whole characters are only encoded once and
+    are then sent straight from the **encoded_cache**.
+
+    :param str character_id: The unique ID of the character
+    :param list fields: The properties of the character to give (see
+        :func:`normalize_fields`). If not provided, the whole character is given.
+    :raises: NotFoundError, MalformedError
+    :return: The encoded character
+    :rtype: bytes
+    """
+    key = str(Storage.storage.to_object_id(character_id))
+    if fields is not None:
+        fields = normalize_fields(fields)
+        if len(fields) == len(CHARACTER_FIELDS):
+            fields = None  # the whole character, so it can come from the cache
+    if fields is None:
+        body = encoded_cache.get(key)
+        if body is not None:
+            return body
+
+    character = BaseCharacter()
+    character.load_character_from_db(key, fields)
+    body = character.get_character_json(fields)
+    if fields is None:
+        encoded_cache.put(key, body)
+    return body
+
+
+def load_characters(character_ids, fields=None):
+    """
+    Loads many characters from the database with a single query. Every ID is checked before the
+    query is made, and a problem with one character doesn't stop the others from being loaded.
+    Characters in the **cache**, and IDs that **saved_ids** knows weren't saved, aren't queried
+    for at all.
+
+    :param list character_ids: The unique IDs of the characters
+    :param list fields: The properties of the characters to load (see
+        :meth:`BaseCharacter.load_character_from_db`). If not provided, the whole characters are
+        loaded.
+    :raises: MalformedError (if any of *fields* doesn't exist)
+    :return: For each ID, in the same order, either the loaded character
+        (a :class:`BaseCharacter`) or the error (a NotFoundError or MalformedError) explaining why
+        it couldn't be loaded
+    :rtype: list
+    """
+    fields = None if fields is None else required_fields(fields)
+    results = [None] * len(character_ids)
+    positions = []
+    object_ids = []
+    records = [None] * len(character_ids)
+    for position, character_id in enumerate(character_ids):
+        try:
+            object_id = Storage.storage.to_object_id(character_id)
+        except MalformedError as e:
+            results[position] = e
+            continue
+        records[position] = cache.get(str(object_id))
+        if records[position] is None:
+            if saved_ids.is_missing(object_id):
+                records[position] = {}
+                continue
+            object_ids.append(object_id)
+            positions.append(position)
+
+    found = Storage.storage.find_by_ids(SAVE_LOCATION, object_ids, literal=True, fields=fields)
+    for position, object_id, record in zip(positions, object_ids, found):
+        records[position] = record
+        if not record:
+            saved_ids.not_found(object_id)
+        elif fields is None:
+            cache.put(str(object_id), record)
+
+    for position, record in enumerate(records):
+        if results[position] is not None:
+            continue
+        if not record:
+            results[position] = NotFoundError(
+                'Could not find character with ID {0!s}'.format(character_ids[position]))
+            continue
+        character = BaseCharacter()
+        try:
+            character.parse_character(record, fields)
+            results[position] = character
+        except (NotFoundError, MalformedError) as e:
+            results[position] = e
+    return results
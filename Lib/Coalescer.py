@@ -0,0 +1,130 @@
+"""
+Collects requests for new characters that arrive at about the same time, so they can be generated
+together in one batch (see :mod:`Lib.Batch`) rather than one at a time.
+"""
+
+from threading import Event, Lock
+
+
+class _Batch(object):
+    """
+    The requests collected into one batch, and what they're waiting for.
+
+    :ivar int size: The number of requests in the batch
+    :ivar threading.Event full: Set once the batch can't take any more requests
+    :ivar threading.Event done: Set once the batch has been run
+    :ivar list results: One result for each request, once the batch has been run
+    :ivar Exception error: What went wrong, if the batch couldn't be run
+    """
+    __slots__ = ('size', 'full', 'done', 'results', 'error')
+
+    def __init__(self):
+        self.size = 1
+        self.full = Event()
+        self.done = Event()
+        self.results = None
+        self.error = None
+
+
+class Coalescer(object):
+    """
+    Combines concurrent requests into batches. The first request to arrive while others are
+    already being handled opens a batch and waits (for up to *window* seconds, or until the batch
+    has *max_batch* requests) for more to join it, then runs the whole batch at once and hands
+    each request its own result.
+
+    A request that arrives while nothing else is being handled is run straight away, by itself,
+    so coalescing adds no latency when traffic is low.
+
+    :param function run_batch: A function taking a number of requests and giving a list with that
+        many results
+    :param float window: The most seconds a batch waits for requests to join it. If 0, every
+        request is run by itself.
+    :param int max_batch: The most requests in one batch
+    :ivar int requests: The number of requests handled
+    :ivar int batches: The number of batches run
+    :ivar int largest: The most requests that have been in one batch
+    """
+    def __init__(self, run_batch, window, max_batch):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = 0
+        self.batches = 0
+        self.largest = 0
+        self._open = None
+        self._in_flight = 0
+        self._lock = Lock()
+
+    def _run(self, batch):
+        """
+        Closes a batch to new requests, runs it and wakes the requests waiting for it.
+
+        :param _Batch batch: The batch to run
+        :return: None
+        """
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+            self.batches += 1
+            self.largest = max(self.largest, batch.size)
+        try:
+            batch.results = self.run_batch(batch.size)
+        except Exception as e:
+            batch.error = e
+        batch.done.set()
+
+    def get(self):
+        """
+        Gives the result of one request, once the batch it's part of has been run.
+
+        :raises: Whatever running the batch raised
+        :return: The result
+        """
+        with self._lock:
+            self.requests += 1
+            busy = self._in_flight > 0
+            self._in_flight += 1
+            batch = self._open
+            if batch is not None:
+                position = batch.size
+                batch.size += 1
+                if batch.size >= self.max_batch:
+                    self._open = None
+                    batch.full.set()
+            else:
+                batch = _Batch()
+                position = 0
+                if busy and self.window > 0 and self.max_batch > 1:
+                    self._open = batch
+
+        try:
+            if position == 0:
+                if self._open is batch:
+                    batch.full.wait(self.window)
+                self._run(batch)
+            else:
+                batch.done.wait()
+
+            if batch.error is not None:
+                raise batch.error
+            return batch.results[position]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self):
+        """
+        Gives counts of how much requests are being combined.
+
+        :return: A dictionary with the keys **requests** (requests handled), **batches** (batches
+            run), **mean_batch** (the mean number of requests in a batch) and **largest** (the
+            most requests in one batch)
+        :rtype: dict
+        """
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch': self.requests / self.batches if self.batches else 0.0,
+            'largest': self.largest
+        }
@@ -2,242 +2,228 @@
 Handles generation of characters
 """
 
-from threading import Thread
+from threading import local
 
-import Lib.Utilities.Mongo as Mongo
 import Lib.Character as Character
+import Lib.RuleSet as RuleSet
 
 from ExternalServices import SAVE_LOCATION
 
 
 class Generator(object):
     """
-    Class that handles the actual character generation. It gets information from the project Mongo
-    Database, uses this to instantiate a character, and contains functions for ensuring some
-    character features get generated correctly.
+    Class that handles the actual character generation. It uses a shared snapshot of the rules
+    (see :mod:`Lib.RuleSet`) to instantiate characters, and contains functions for ensuring some
+    character features get generated correctly. A generator holds no state for any single
+    character, so one instance can generate any number of characters, on any number of threads.
     """
-    def __init__(self, open_gaming_only=False):
+    def __init__(self, open_gaming_only=False, rules=None):
         """
-        Gets all information from the Mongo Database and uses it to instantiate a character class.
+        Gets the rules to use (from the process-wide cache unless they're passed in).
 
         :param bool open_gaming_only: If set to true, only OLG licensed or homebrew materials
             where the rights-holders have given me permission to use them will be used in the
-            character.
-        """
-        self.open_gaming_only = open_gaming_only
-        self.Mongo = Mongo
-        self.classes = []
-        self.bonds = []
-        self.packages = []
-        self.disorders = {
-            "Violence": [],
-            "Helplessness": [],
-            "Unnatural": []
-        }
-        self.skill_mapping = {}
-        self.defaults = {}
-        self.sub_skills = {}
-
-        threads = [
-            Thread(target=self._get_classes),
-            Thread(target=self._get_packages),
-            Thread(target=self._get_defaults),
-            Thread(target=self._get_violence_disorders),
-            Thread(target=self._get_helplessness_disorders),
-            Thread(target=self._get_unnatural_disorders),
-            Thread(target=self._get_sub_skills),
-            Thread(target=self._get_skill_mapping)
-        ]
-
-        for t in threads:
-            t.start()
-
-        for t in threads:
-            t.join()
-
-        self.character = Character.RandomCharacter(self.defaults, self.sub_skills,
-                                                   self.skill_mapping)
-
-    def _get_classes(self):
-        """
-        Gets character classes from the database and appends them to the classes property.
-
-        :return: None
+            character. Ignored if *rules* is provided.
+        :param RuleSet rules: The snapshot of the rules to use. If not provided, the cached
+            snapshot for *open_gaming_only* is used.
         """
-        if self.open_gaming_only:
-            self.classes = self.Mongo.find_subset('classes', {"open": True})
-        else:
-            self.classes = self.Mongo.find_all('classes')
+        if rules is None:
+            rules = RuleSet.get_rule_set(open_gaming_only)
+        self.rules = rules
+        self.open_gaming_only = rules.open_gaming_only
+        self._local = local()
 
-    def _get_violence_disorders(self):
+    @property
+    def classes(self):
         """
-        Gets all violence related disorders from the database.
-
-        :return: None
+        :return: All character classes available to the generator
+        :rtype: tuple
         """
-        self.disorders['Violence'] = self.Mongo.find_subset('disorders', {"Violence": True})
+        return self.rules.classes
 
-    def _get_helplessness_disorders(self):
+    @property
+    def packages(self):
         """
-        Gets all helplessness related disorders from the database.
-
-        :return: None
+        :return: All skill packages available to the generator
+        :rtype: tuple
         """
-        self.disorders['Helplessness'] = self.Mongo.find_subset('disorders', {"Helplessness": True})
+        return self.rules.packages
 
-    def _get_unnatural_disorders(self):
+    @property
+    def defaults(self):
         """
-        Gets all unnatural related disorders from the database.
-
-        :return: None
+        :return: A mapping of every skill to its default value
+        :rtype: MappingProxyType
         """
-        self.disorders['Unnatural'] = self.Mongo.find_subset('disorders', {"Unnatural": True})
+        return self.rules.defaults
 
-    def _get_packages(self):
+    @property
+    def disorders(self):
         """
-        Gets packages from the database and appends them to the **packages** property.
-
-        :return: None
+        :return: A mapping of the types of disorder to all disorders of that type
+        :rtype: MappingProxyType
         """
-        if self.open_gaming_only:
-            self.packages = self.Mongo.find_subset('packages', {"open": True})
-        else:
-            self.packages = self.Mongo.find_all('packages')
+        return self.rules.disorders
 
-    def _get_defaults(self):
+    @property
+    def sub_skills(self):
         """
-        Gets default skills from the database and appends them to the **defaults** property.
+        :return: A mapping of sub-skill categories to their specific options
+        :rtype: MappingProxyType
+        """
+        return self.rules.sub_skills
 
-        :return: None
+    @property
+    def skill_mapping(self):
+        """
+        :return: A mapping of skills to the stats they're associated with
+        :rtype: MappingProxyType
         """
-        self.defaults = self.Mongo.find_one('default_stats')
+        return self.rules.skill_mapping
 
-    def _get_skill_mapping(self):
+    def new_character(self, rng=None):
         """
-        Gets skill mappings (which determine stat order) from the database and appends them to
-        the **skill_mapping** property.
+        Creates a blank character to be generated. Everything that changes while a character is
+        generated lives on this object, not on the generator, which is what allows one generator
+        to be used by many threads at once.
 
-        :return: None
+        :param rng: An object with the same interface as the built-in random module, used for all
+            of the character's random choices. Defaults to the random module itself.
+        :return: A character with every skill at its default value
+        :rtype: Lib.Character.RandomCharacter
         """
-        self.skill_mapping = self.Mongo.find_one('skill_mapping')
+        character = Character.RandomCharacter(self.defaults, self.sub_skills, self.skill_mapping,
+                                              self.rules.skill_index)
+        if rng is not None:
+            character.random = rng
+        return character
 
-    def _get_sub_skills(self):
+    @property
+    def character(self):
         """
-        Gets a dictionary mapping sub-skill categories to their specific options from the database
-        and appends them to the **sub_skills** property.
+        The last character generated by :meth:`generate` on the current thread. Kept so that
+        :meth:`save_character` and code written against the older, one character per generator
+        API still work. If nothing has been generated yet, a blank character is given.
 
-        :return: None
+        :return: The last character generated on this thread
+        :rtype: Lib.Character.RandomCharacter
         """
-        self.sub_skills = self.Mongo.find_one('sub_skills')
+        character = getattr(self._local, 'character', None)
+        if character is None:
+            character = self._local.character = self.new_character()
+        return character
 
-    def _get_bonds(self):
+    def _get_bonds(self, character):
         """
         Gets bonds that are available to the character (based on the class and package) from the
-        database and appends them to the **bonds** property.
+        index of bonds in the rules.
 
-        :return: None
+        :param Lib.Character.RandomCharacter character: The character being generated
+        :return: A catalog of all bonds the character could have
+        :rtype: Lib.Bonds.BondCatalog
         """
-        required = [None]
-
-        character_class = self.character.get_class()
-        if character_class:
-            required.append(character_class)
+        return self.rules.bonds_for(character.get_class(), character.get_package())
 
-        character_package = self.character.get_package()
-        if character_package:
-            required.append(character_package)
-
-        self.bonds = self.Mongo.find_subset('bonds', {"Required": {"$in": required}})
-
-    def random_character_class(self):
+    def random_character_class(self, character):
         """
         Randomly chooses a character class from among those it has access to (from the database) and
-        applies it to the character object
+        applies its compiled plan to the character object
 
+        :param Lib.Character.RandomCharacter character: The character being generated
         :return: None
         """
-        class_obj = self.character.random.choice(self.classes)
-        self.character.apply_class(class_obj)
+        class_obj = character.random.choice(self.classes)
+        character.apply_class(self.rules.class_plans[class_obj['_id']])
 
-    def random_character_package(self):
+    def random_character_package(self, character):
         """
         Randomly chooses a skill package from among those it has access to (from the database) and
-        applies it to the character object
+        applies its compiled plan to the character object
 
+        :param Lib.Character.RandomCharacter character: The character being generated
         :return: None
         """
-        package = self.character.random.choice(self.packages)
-        self.character.apply_package(package)
+        package = character.random.choice(self.packages)
+        character.apply_package(self.rules.package_plans[package['_id']])
 
-    def random_character_stats(self):
+    @staticmethod
+    def random_character_stats(character):
         """
-        Generates stats for the attached character and uses them to calculate derived attributes.
+        Generates stats for the character and uses them to calculate derived attributes.
 
+        :param Lib.Character.RandomCharacter character: The character being generated
         :return: None
         """
-        self.character.apply_stats()
-        self.character.calculate_attributes()
+        character.apply_stats()
+        character.calculate_attributes()
 
-    def random_character_bonds(self):
+    @staticmethod
+    def random_character_bonds(character, bonds):
         """
-        Uses the bonds it has on file as valid for the character class and the number of bonds the
+        Uses the bonds that are valid for the character class and the number of bonds the
         character class allows to create the correct number of bonds, well distributed across
-        potential types of bonds.
+        potential types of bonds. Raises ExhaustedError if the character needs more bonds than
+        there are available to it.
 
+        :param Lib.Character.RandomCharacter character: The character being generated
+        :param Lib.Bonds.BondCatalog bonds: All bonds the character could have (see
+            :meth:`_get_bonds`)
+        :raises: ExhaustedError
         :return: None
         """
-        num_bonds = self.character.num_bonds
-        if num_bonds:
-            self.character.add_bond(self.character.random.choice(self.bonds))
-            num_bonds -= 1
-
-        for _ in range(num_bonds):
-            bond_types = self.character.get_bond_types()
-            all_types = all([bond_types[bond_type] for bond_type in bond_types])
-            while True:
-                proposed_bond = self.character.random.choice(self.bonds)
-                if proposed_bond in self.character.bonds:
-                    continue
+        for bond in bonds.select(character.num_bonds, character.random):
+            character.add_bond(bond.document)
 
-                if all_types:
-                    self.character.add_bond(proposed_bond)
-                    break
-
-                for bond_type in bond_types:
-                    if proposed_bond.get(bond_type, False):  # protects against missing properties
-                        proposed_bond_type = bond_type
-                        break
-                else:
-                    continue
-
-                if not self.character.has_bond_type(proposed_bond_type):
-                    self.character.add_bond(proposed_bond)
-                    break
-
-    def random_damaged_veteran(self):
+    def random_damaged_veteran(self, character):
         """
         Applies a random type of random veteran to the character. This is the last thing that
         should be applied to a character
 
+        :param Lib.Character.RandomCharacter character: The character being generated
         :return: None
         """
         types = ['Violence', 'Helpless', 'Unnatural', 'Hard Experience']
-        damage_type = self.character.random.choice(types)
+        damage_type = character.random.choice(types)
 
         if damage_type == 'Violence':
-            self.character.damaged_veteran_violence()
+            character.damaged_veteran_violence()
         elif damage_type == 'Helpless':
-            self.character.damaged_veteran_helplessness()
+            character.damaged_veteran_helplessness()
         elif damage_type == 'Unnatural':
-            self.character.damaged_veteran_unnatural(self.disorders['Unnatural'])
+            character.damaged_veteran_unnatural(self.disorders['Unnatural'])
         else:
-            self.character.damaged_veteran_experience()
+            character.damaged_veteran_experience()
+
+    def create_character(self, rng=None):
+        """
+        Randomly generates a completed Delta Green character. Safe to call from many threads at
+        once, as nothing on the generator itself is changed.
+
+        :param rng: An object with the same interface as the built-in random module, used for all
+            of the character's random choices. Defaults to the random module itself.
+        :return: The completed character
+        :rtype: Lib.Character.RandomCharacter
+        """
+        character = self.new_character(rng)
+        self.random_character_class(character)
+        self.random_character_package(character)
+        bonds = self._get_bonds(character)
+        bonds.check_feasible(character.num_bonds)  # fail before doing any more work
+        self.random_character_stats(character)
+        self.random_character_bonds(character, bonds)
+        if character.random.randrange(0, 3) == 2:
+            self.random_damaged_veteran(character)
+        return character
 
-    def generate(self):
+    def generate(self, rng=None):
         """
         Method that randomly generates a completed Delta Green character. Returns a dictionary
-        that contains all game relevant information about the character.
+        that contains all game relevant information about the character. The character is also
+        kept (for the current thread only) as the **character** property, so it can be saved
+        with :meth:`save_character`.
 
+        :param rng: An object with the same interface as the built-in random module, used for all
+            of the character's random choices. Defaults to the random module itself.
         :return: A dictionary with keys **Class**, **Package**, **Number_Bonds**, **Bonds** (here
             the name of the bond is mapped to the strength of the bond, an integer), **Lost_Bonds**
             (a simple list), **Veteran** (empty string if not a veteran) **Disorders** (empty list
@@ -246,19 +232,14 @@ class Generator(object):
             **Stats**, and **Skills**
         :rtype: dict
         """
-        self.random_character_class()
-        self.random_character_package()
-        self._get_bonds()
-        self.random_character_stats()
-        self.random_character_bonds()
-        if self.character.random.randrange(0, 3) == 2:
-            self.random_damaged_veteran()
-        return self.character.get_character()
+        character = self.create_character(rng)
+        self._local.character = character
+        return character.get_character()
 
     def save_character(self):
         """
-        Method for saving a character to the database. Returns the unique ID of the record the
-        character is saved to.
+        Method for saving the last character generated on this thread to the database. Returns
+        the unique ID of the record the character is saved to.
 
         :return: A MongoDB ID, corresponding to the record in which the character is saved.
         :rtype: ObjectID
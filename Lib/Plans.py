@@ -0,0 +1,239 @@
+"""
+Contains the compiled forms of classes and packages. Classes and packages are stored in the
+database as nested dictionaries (see `OpenGamingJSON/classes.json` and
+`OpenGamingJSON/packages.json`); a plan is built from one of these once, when the rules are
+loaded, and checked against the skills that actually exist. Applying a plan to a character is then
+a dictionary update plus whatever random choices the class or package calls for.
+"""
+
+import warnings
+
+from sys import intern
+
+from Lib.Utilities.Exceptions import MalformedError
+
+PACKAGE_BONUS = 20
+
+
+def _sub_skill_key(skill, sub):
+    """
+    Builds the interned skill string for a specific sub-skill, in the format <skill> (<sub>)
+
+    :param str skill: The name of the primary skill
+    :param str sub: The name of the sub-skill
+    :return: The formatted skill name
+    :rtype: str
+    """
+    return intern(skill + ' (' + sub + ')')
+
+
+def _check(value, kind, key, description):
+    """
+    Makes sure a property of a class or package has the right type.
+
+    :param value: The value of the property
+    :param type kind: The type the property should have
+    :param str key: The name of the property, for the error message
+    :param str description: What the class or package is, for the error message
+    :raises: MalformedError
+    :return: The value of the property
+    """
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise MalformedError('"{}" of {} is not a {}'.format(key, description, kind.__name__))
+    return value
+
+
+def _get(obj, key, kind, description):
+    """
+    Gets a required property of a class or package, making sure it has the right type.
+
+    :param dict obj: The class or package (or one of its nested dictionaries)
+    :param str key: The name of the property
+    :param type kind: The type the property should have
+    :param str description: What the class or package is, for the error message
+    :raises: MalformedError
+    :return: The value of the property
+    """
+    try:
+        value = obj[key]
+    except (KeyError, TypeError):
+        raise MalformedError('{} is missing "{}"'.format(description, key))
+    return _check(value, kind, key, description)
+
+
+def _get_number(obj, available, description):
+    """
+    Gets the number of choices a class or package allows, making sure there are enough options to
+    choose from.
+
+    :param dict obj: The **Choices** of the class or package
+    :param int available: The number of options there are to choose from, or None if there is
+        no limit
+    :param str description: What the class or package is, for the error message
+    :raises: MalformedError
+    :return: The number of choices
+    :rtype: int
+    """
+    number = _get(obj, 'Number', int, description)
+    if number < 0 or available is not None and number > available:
+        raise MalformedError('{} allows {} choices, but has {} to choose from'.format(
+            description, number, available))
+    return number
+
+
+def _ignore(description, skill):
+    """
+    Warns that a skill that isn't in the rules is being left out of a class or package.
+
+    :param str description: What the class or package is
+    :param str skill: The name of the unknown skill
+    :return: None
+    """
+    message = '{} has the unknown skill "{}", which will be ignored'
+    warnings.warn(message.format(description, skill))
+
+
+class ClassPlan(object):
+    """
+    A class, compiled for applying to characters.
+
+    :param dict class_obj: The class as stored in the database, with the keys **_id**,
+        **Skills**, **Choices**, **Subskills** and **Bonds** (see
+        :meth:`Lib.Character.RandomCharacter.apply_class`)
+    :param dict defaults: A dictionary mapping every skill to its default value
+    :param dict sub_skills: A dictionary mapping sub-skill categories to their specific options
+    :raises: MalformedError
+    :ivar str name: The name of the class
+    :ivar int bonds: The number of bonds the class gets
+    :ivar dict skills: Every skill and specific sub-skill the class sets, mapped to its value
+    :ivar tuple sub_skills: (skill, sub) pairs for every specific sub-skill in **skills**
+    :ivar tuple random_sub_skills: (skill, value) pairs; for each, a random sub-skill the
+        character doesn't have yet is set to the value
+    :ivar int num_choices: The number of choices the class gets
+    :ivar tuple skill_choices: (skill, value) pairs the choices are made from
+    :ivar tuple sub_skill_choices: (skill, sub, value) tuples the choices are also made from
+    """
+    __slots__ = ('name', 'bonds', 'skills', 'sub_skills', 'random_sub_skills', 'num_choices',
+                 'skill_choices', 'sub_skill_choices')
+
+    def __init__(self, class_obj, defaults, sub_skills):
+        self.name = _get(class_obj, '_id', str, 'A class')
+        description = 'Class "{}"'.format(self.name)
+        self.bonds = _get(class_obj, 'Bonds', int, description)
+        self.skills = {}
+        self.sub_skills = []
+        self.random_sub_skills = []
+
+        for skill, value in _get(class_obj, 'Skills', dict, description).items():
+            _check(value, int, skill, description)
+            if skill in sub_skills:
+                self.random_sub_skills.append((skill, value))
+            elif skill in defaults:
+                self.skills[intern(skill)] = value
+            else:
+                _ignore(description, skill)
+
+        for obj in _get(class_obj, 'Subskills', list, description):
+            skill = _get(obj, 'Skill', str, description)
+            sub = _get(obj, 'Sub', str, description)
+            value = _get(obj, 'Value', int, description)
+            if skill not in sub_skills:
+                _ignore(description, skill)
+            elif sub:
+                self.skills[_sub_skill_key(skill, sub)] = value
+                self.sub_skills.append((skill, sub))
+            else:
+                self.random_sub_skills.append((skill, value))
+
+        choices = _get(class_obj, 'Choices', dict, description)
+        self.skill_choices = []
+        for skill, value in _get(choices, 'Skills', dict, description).items():
+            _check(value, int, skill, description)
+            if skill in defaults or skill in sub_skills:
+                self.skill_choices.append((skill, value))
+            else:
+                _ignore(description, skill)
+
+        self.sub_skill_choices = []
+        for obj in choices.get('Subskills', []):
+            skill = _get(obj, 'Skill', str, description)
+            if skill in sub_skills:
+                self.sub_skill_choices.append((skill, _get(obj, 'Sub', str, description),
+                                               _get(obj, 'Value', int, description)))
+            else:
+                _ignore(description, skill)
+
+        self.num_choices = _get_number(
+            choices, len(self.skill_choices) + len(self.sub_skill_choices), description)
+        self.sub_skills = tuple(self.sub_skills)
+        self.random_sub_skills = tuple(self.random_sub_skills)
+        self.skill_choices = tuple(self.skill_choices)
+        self.sub_skill_choices = tuple(self.sub_skill_choices)
+
+
+class PackagePlan(object):
+    """
+    A package, compiled for applying to characters. Every skill in a package gets
+    **PACKAGE_BONUS** (20) added to it.
+
+    :param dict package: The package as stored in the database, with the keys **_id**,
+        **Skills**, **Subskills** and **Choices** (see
+        :meth:`Lib.Character.RandomCharacter.apply_package`)
+    :param dict defaults: A dictionary mapping every skill to its default value
+    :param dict sub_skills: A dictionary mapping sub-skill categories to their specific options
+    :raises: MalformedError
+    :ivar str name: The name of the package
+    :ivar dict skills: Every skill and specific sub-skill the package improves, mapped to the
+        total amount it's improved by
+    :ivar tuple sub_skills: (skill, sub) pairs for every specific sub-skill in **skills**
+    :ivar tuple random_sub_skills: Sub-skill categories; for each, a random sub-skill (which the
+        character may already have) is improved
+    :ivar int num_choices: The number of extra skills the package improves
+    :ivar bool all_skills: If true, the choices are made from all of the character's skills
+    :ivar tuple skill_choices: The skills the choices are made from, if **all_skills** is false
+    """
+    __slots__ = ('name', 'skills', 'sub_skills', 'random_sub_skills', 'num_choices',
+                 'all_skills', 'skill_choices')
+
+    def __init__(self, package, defaults, sub_skills):
+        self.name = _get(package, '_id', str, 'A package')
+        description = 'Package "{}"'.format(self.name)
+        self.skills = {}
+        self.sub_skills = []
+        self.random_sub_skills = []
+
+        for skill in _get(package, 'Skills', list, description):
+            if skill in sub_skills:
+                self.random_sub_skills.append(skill)
+            elif skill in defaults:
+                skill = intern(skill)
+                self.skills[skill] = self.skills.get(skill, 0) + PACKAGE_BONUS
+            else:
+                _ignore(description, skill)
+
+        for obj in _get(package, 'Subskills', list, description):
+            skill = _get(obj, 'Skill', str, description)
+            sub = _get(obj, 'Sub', str, description)
+            if skill not in sub_skills:
+                _ignore(description, skill)
+            elif sub:
+                key = _sub_skill_key(skill, sub)
+                self.skills[key] = self.skills.get(key, 0) + PACKAGE_BONUS
+                self.sub_skills.append((skill, sub))
+            else:
+                self.random_sub_skills.append(skill)
+
+        choices = _get(package, 'Choices', dict, description)
+        self.all_skills = _get(choices, 'All', bool, description)
+        self.skill_choices = []
+        for skill in _get(choices, 'List', list, description):
+            if skill in defaults or skill in sub_skills:
+                self.skill_choices.append(skill)
+            else:
+                _ignore(description, skill)
+
+        self.num_choices = _get_number(
+            choices, None if self.all_skills else len(self.skill_choices), description)
+        self.sub_skills = tuple(self.sub_skills)
+        self.random_sub_skills = tuple(self.random_sub_skills)
+        self.skill_choices = tuple(self.skill_choices)
@@ -0,0 +1,158 @@
+"""
+A pool of ready-made characters, kept filled by background threads, so that a request for a new
+character doesn't have to wait for one to be generated.
+"""
+
+import os
+import time
+
+from collections import deque
+from threading import Condition, Thread
+
+# Seconds a worker waits before trying again after failing to generate a character
+ERROR_BACKOFF = 1
+
+
+class CharacterPool(object):
+    """
+    A bounded pool of ready-made characters (already serialized, so they can be sent as they
+    are). Background workers start the first time a character is taken and, whenever the pool
+    drops to the low watermark, refill it up to the high watermark. Taking a character never
+    waits: if the pool is empty, the caller should generate one itself.
+
+    Workers are threads of the process that started them, so a forked process (e.g. a server
+    worker) throws away the characters it inherited, rather than handing out the same characters
+    as its parent, and starts its own workers.
+
+    :param function generate: A function with no arguments giving one ready-made character
+    :param int high: The most characters the pool holds. If 0, the pool is disabled.
+    :param int low: The number of characters at (or below) which the pool is refilled. Defaults
+        to half of *high*, and is lowered to one less than *high* if it isn't already below it.
+    :param int workers: The number of background threads refilling the pool
+    :param function clock: A function giving the current (monotonic) time in seconds. Only
+        needs to be changed for testing.
+    :ivar int hits: The number of characters taken from the pool
+    :ivar int fallbacks: The number of times the pool was empty when a character was wanted
+    :ivar int generated: The number of characters the workers have added to the pool
+    :ivar int errors: The number of times a worker failed to generate a character
+    """
+    def __init__(self, generate, high, low=None, workers=1, clock=time.monotonic):
+        self.generate = generate
+        self.high = high
+        self.low = high // 2 if low is None else max(min(low, high - 1), 0)
+        self.workers = workers
+        self.clock = clock
+        self.hits = 0
+        self.fallbacks = 0
+        self.generated = 0
+        self.errors = 0
+        self._refill_seconds = 0.0
+        self._pool = deque(maxlen=max(high, 1))
+        self._wake = Condition()
+        self._pid = None
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._pool)
+
+    def _start(self):
+        """
+        Starts the background workers, if they haven't been started by this process.
+
+        :return: None
+        """
+        with self._wake:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pool.clear()
+            self._generation += 1
+            for _ in range(self.workers):
+                Thread(target=self._work, args=(self._generation,), daemon=True).start()
+
+    def _work(self, generation):
+        """
+        What each background worker does: waits until the pool drops to the low watermark, then
+        fills it up to the high watermark, until the pool is stopped (or its workers restarted).
+
+        :param int generation: Which start of the workers this worker belongs to
+        :return: None
+        """
+        while True:
+            with self._wake:
+                while ((len(self._pool) > self.low or len(self._pool) >= self.high) and
+                       generation == self._generation):
+                    self._wake.wait()
+                if generation != self._generation:
+                    return
+
+            while len(self._pool) < self.high and generation == self._generation:
+                started = self.clock()
+                try:
+                    character = self.generate()
+                except Exception:
+                    self.errors += 1
+                    with self._wake:
+                        self._wake.wait(ERROR_BACKOFF)
+                    break
+                self._pool.append(character)
+                self.generated += 1
+                self._refill_seconds += self.clock() - started
+
+    def get(self):
+        """
+        Takes a ready-made character from the pool, waking the workers if it's running low.
+
+        :return: The character, or None if the pool is empty or disabled
+        """
+        if self.high <= 0:
+            return None
+        if self._pid != os.getpid():
+            self._start()
+
+        try:
+            character = self._pool.popleft()
+            self.hits += 1
+        except IndexError:
+            character = None
+            self.fallbacks += 1
+
+        if len(self._pool) <= self.low:
+            with self._wake:
+                self._wake.notify_all()
+        return character
+
+    def stop(self):
+        """
+        Stops the background workers once they've finished the character they're working on. The
+        workers are started again the next time a character is taken.
+
+        :return: None
+        """
+        with self._wake:
+            self._generation += 1
+            self._pid = None
+            self._wake.notify_all()
+
+    def stats(self):
+        """
+        Gives counts of how well the pool is keeping up, for sizing it.
+
+        :return: A dictionary with the keys **depth** (characters in the pool now), **low** and
+            **high** (the watermarks), **hits** (characters taken from the pool), **fallbacks**
+            (times the pool was empty), **generated** (characters added by the workers),
+            **refill_rate** (characters each worker adds per second while refilling) and
+            **errors** (times a worker failed to generate a character)
+        :rtype: dict
+        """
+        return {
+            'depth': len(self._pool),
+            'low': self.low,
+            'high': self.high,
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+            'generated': self.generated,
+            'refill_rate': (self.generated / self._refill_seconds
+                            if self._refill_seconds else 0.0),
+            'errors': self.errors
+        }
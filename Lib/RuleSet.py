@@ -0,0 +1,391 @@
+"""
+Handles loading the rules of the game (classes, packages, skills, disorders) from the database.
+These almost never change, so a single snapshot of them is kept for each process and shared by
+every character generator, rather than being fetched from the database for each character.
+"""
+
+import time
+
+from threading import Thread, Lock
+from types import MappingProxyType
+
+import Lib.Utilities.Storage as Storage
+
+from Lib.Bonds import BondCatalog
+from Lib.Plans import ClassPlan, PackagePlan
+from Lib.Skills import SkillIndex
+from ExternalServices import RULES_TTL
+
+
+class RuleSet(object):
+    """
+    An immutable snapshot of all of the rule data needed to generate a character. Nothing in here
+    is specific to a single character, so one snapshot can safely be shared between any number of
+    generators and threads.
+
+    :param list classes: All character classes available
+    :param list packages: All skill packages available
+    :param dict defaults: A dictionary mapping every skill to its default value
+    :param dict disorders: A dictionary with keys **Violence**, **Helplessness** and **Unnatural**,
+        each of which maps to a list of the disorders of that type
+    :param dict sub_skills: A dictionary mapping sub-skill categories to their specific options
+    :param dict skill_mapping: A dictionary mapping skills to the stats they're associated with
+    :param list bonds: Every bond in the database. Bonds are indexed by their **Required** property
+        when the snapshot is built, so the bonds available to any class and package can be looked
+        up without another query (see :meth:`bonds_for`).
+    :param bool open_gaming_only: Whether or not this snapshot was restricted to open gaming
+        content
+    :param float loaded_at: The (monotonic) time at which the snapshot was loaded
+    :raises: MalformedError (if any class or package isn't valid)
+    """
+    __slots__ = ('_classes', '_packages', '_class_plans', '_package_plans', '_skill_index',
+                 '_defaults', '_disorders', '_sub_skills', '_skill_mapping', '_bonds',
+                 '_unrestricted_bonds', '_bonds_by_requirement', '_bond_views', '_open_gaming_only',
+                 '_loaded_at')
+
+    def __init__(self, classes, packages, defaults, disorders, sub_skills, skill_mapping,
+                 bonds=(), open_gaming_only=False, loaded_at=None):
+        self._classes = tuple(classes)
+        self._packages = tuple(packages)
+        self._defaults = MappingProxyType(dict(defaults))
+        self._disorders = MappingProxyType({
+            disorder_type: tuple(disorders.get(disorder_type, []))
+            for disorder_type in ('Violence', 'Helplessness', 'Unnatural')
+        })
+        self._sub_skills = MappingProxyType(dict(sub_skills))
+        self._skill_mapping = MappingProxyType(dict(skill_mapping))
+        self._class_plans = MappingProxyType({
+            class_obj['_id']: ClassPlan(class_obj, self._defaults, self._sub_skills)
+            for class_obj in self._classes
+        })
+        self._package_plans = MappingProxyType({
+            package['_id']: PackagePlan(package, self._defaults, self._sub_skills)
+            for package in self._packages
+        })
+        self._skill_index = SkillIndex(self._defaults, self._sub_skills)
+        for plan in self._class_plans.values():
+            for skill in plan.skills:
+                self._skill_index.intern(skill)
+        for plan in self._package_plans.values():
+            for skill in plan.skills:
+                self._skill_index.intern(skill)
+        self._index_bonds(bonds)
+        self._open_gaming_only = open_gaming_only
+        self._loaded_at = time.monotonic() if loaded_at is None else loaded_at
+
+    @property
+    def classes(self):
+        """
+        :return: All character classes available
+        :rtype: tuple
+        """
+        return self._classes
+
+    @property
+    def packages(self):
+        """
+        :return: All skill packages available
+        :rtype: tuple
+        """
+        return self._packages
+
+    @property
+    def class_plans(self):
+        """
+        :return: A read-only mapping of the name of every class to its compiled plan
+        :rtype: MappingProxyType
+        """
+        return self._class_plans
+
+    @property
+    def package_plans(self):
+        """
+        :return: A read-only mapping of the name of every package to its compiled plan
+        :rtype: MappingProxyType
+        """
+        return self._package_plans
+
+    @property
+    def skill_index(self):
+        """
+        :return: The index of every skill name (including every sub-skill the rules know of),
+            shared by every character generated from these rules
+        :rtype: Lib.Skills.SkillIndex
+        """
+        return self._skill_index
+
+    @property
+    def defaults(self):
+        """
+        :return: A read-only mapping of every skill to its default value
+        :rtype: MappingProxyType
+        """
+        return self._defaults
+
+    @property
+    def disorders(self):
+        """
+        :return: A read-only mapping with keys **Violence**, **Helplessness** and **Unnatural**,
+            each of which maps to a tuple of disorders of that type
+        :rtype: MappingProxyType
+        """
+        return self._disorders
+
+    @property
+    def sub_skills(self):
+        """
+        :return: A read-only mapping of sub-skill categories to their specific options
+        :rtype: MappingProxyType
+        """
+        return self._sub_skills
+
+    @property
+    def skill_mapping(self):
+        """
+        :return: A read-only mapping of skills to the stats they're associated with
+        :rtype: MappingProxyType
+        """
+        return self._skill_mapping
+
+    @property
+    def bonds(self):
+        """
+        :return: Every bond, whatever its requirements
+        :rtype: tuple
+        """
+        return self._bonds
+
+    def _index_bonds(self, bonds):
+        """
+        Splits the bonds up into those anyone can have and those that require a specific class or
+        package (indexed by the name of that class or package), then builds the list of bonds
+        available to every combination of class and package in the snapshot.
+
+        :param list bonds: Every bond in the database
+        :return: None
+        """
+        self._bonds = tuple(bonds)
+        unrestricted = []
+        by_requirement = {}
+        for position, bond in enumerate(self._bonds):
+            required = bond.get('Required')
+            if required is None:
+                unrestricted.append(position)
+                continue
+            if isinstance(required, str):
+                required = [required]
+            for name in required:
+                by_requirement.setdefault(name, []).append(position)
+
+        self._unrestricted_bonds = tuple(unrestricted)
+        self._bonds_by_requirement = {name: tuple(positions)
+                                      for name, positions in by_requirement.items()}
+        self._bond_views = {}
+        for class_obj in self._classes:
+            for package in self._packages:
+                self.bonds_for(class_obj['_id'], package['_id'])
+
+    def bonds_for(self, class_name='', package_name=''):
+        """
+        Gives the bonds available to a character with the given class and package; that is, every
+        bond that has no requirements or requires that class or package. The bonds are in the same
+        order they are in the database.
+
+        :param str class_name: The name of the character's class, if any
+        :param str package_name: The name of the character's package, if any
+        :return: A catalog of all bonds the character could have
+        :rtype: Lib.Bonds.BondCatalog
+        """
+        key = (class_name, package_name)
+        view = self._bond_views.get(key)
+        if view is None:
+            positions = set(self._unrestricted_bonds)
+            for name in key:
+                if name:
+                    positions.update(self._bonds_by_requirement.get(name, ()))
+            view = BondCatalog(self._bonds[position] for position in sorted(positions))
+            self._bond_views[key] = view
+        return view
+
+    @property
+    def open_gaming_only(self):
+        """
+        :return: True if this snapshot only contains open gaming content
+        :rtype: bool
+        """
+        return self._open_gaming_only
+
+    @property
+    def loaded_at(self):
+        """
+        :return: The (monotonic) time at which the snapshot was loaded
+        :rtype: float
+        """
+        return self._loaded_at
+
+    @classmethod
+    def load(cls, open_gaming_only=False, loaded_at=None):
+        """
+        Gets all of the rule data from the database and uses it to build a new snapshot. The
+        queries are independent of each other, so each one is run on its own thread.
+
+        :param bool open_gaming_only: If set to true, only OLG licensed or homebrew materials
+            where the rights-holders have given me permission to use them will be loaded.
+        :param float loaded_at: The (monotonic) time to record as the load time. Defaults to now.
+        :raises: Whatever the first query to fail raised
+        :return: A freshly loaded snapshot of the rules
+        :rtype: RuleSet
+        """
+        data = {}
+        errors = []
+        storage = Storage.storage
+
+        def fetch(key, func, *args):
+            try:
+                data[key] = func(*args)
+            except Exception as e:
+                errors.append(e)
+
+        if open_gaming_only:
+            class_args = (storage.find_subset, 'classes', {"open": True})
+            package_args = (storage.find_subset, 'packages', {"open": True})
+        else:
+            class_args = (storage.find_all, 'classes')
+            package_args = (storage.find_all, 'packages')
+
+        queries = [
+            ('classes',) + class_args,
+            ('packages',) + package_args,
+            ('defaults', storage.find_one, 'default_stats'),
+            ('Violence', storage.find_subset, 'disorders', {"Violence": True}),
+            ('Helplessness', storage.find_subset, 'disorders', {"Helplessness": True}),
+            ('Unnatural', storage.find_subset, 'disorders', {"Unnatural": True}),
+            ('sub_skills', storage.find_one, 'sub_skills'),
+            ('skill_mapping', storage.find_one, 'skill_mapping'),
+            ('bonds', storage.find_all, 'bonds')
+        ]
+
+        threads = [Thread(target=fetch, args=query) for query in queries]
+
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        if errors:
+            raise errors[0]
+
+        return cls(data['classes'], data['packages'], data['defaults'], {
+            "Violence": data['Violence'],
+            "Helplessness": data['Helplessness'],
+            "Unnatural": data['Unnatural']
+        }, data['sub_skills'], data['skill_mapping'], data['bonds'], open_gaming_only, loaded_at)
+
+
+class RuleSetCache(object):
+    """
+    Keeps one :class:`RuleSet` for open gaming content and one for all content, reloading each
+    from the database once it's older than the time to live.
+
+    :param float ttl: The number of seconds a snapshot is good for. If None, snapshots never
+        expire on their own and only :meth:`refresh` will reload them.
+    :param function clock: A function giving the current (monotonic) time in seconds. Only
+        needs to be changed for testing.
+    """
+    def __init__(self, ttl=RULES_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._rule_sets = {}
+        self._lock = Lock()
+
+    def _is_fresh(self, rule_set):
+        """
+        Determines if a snapshot is still within its time to live.
+
+        :param RuleSet rule_set: A snapshot of the rules
+        :return: True if the snapshot can still be used, false otherwise
+        :rtype: bool
+        """
+        return self.ttl is None or self.clock() - rule_set.loaded_at < self.ttl
+
+    def _load(self, open_gaming_only):
+        """
+        Loads a new snapshot and stores it in the cache. Should only be called while holding the
+        lock.
+
+        :param bool open_gaming_only: Which of the two snapshots to load
+        :return: The freshly loaded snapshot
+        :rtype: RuleSet
+        """
+        rule_set = RuleSet.load(open_gaming_only, self.clock())
+        self._rule_sets[open_gaming_only] = rule_set
+        return rule_set
+
+    def get(self, open_gaming_only=False):
+        """
+        Gives the cached snapshot, loading it from the database first if there isn't one or it
+        has expired.
+
+        :param bool open_gaming_only: If true, gives the snapshot of only open gaming content
+        :return: A snapshot of the rules
+        :rtype: RuleSet
+        """
+        rule_set = self._rule_sets.get(open_gaming_only)
+        if rule_set is not None and self._is_fresh(rule_set):
+            return rule_set
+
+        with self._lock:
+            rule_set = self._rule_sets.get(open_gaming_only)
+            if rule_set is not None and self._is_fresh(rule_set):
+                return rule_set  # another thread got here first
+            return self._load(open_gaming_only)
+
+    def refresh(self, open_gaming_only=None):
+        """
+        Reloads snapshots from the database right away, whether or not they have expired.
+
+        :param bool open_gaming_only: Which snapshot to reload. If None, every snapshot that has
+            already been loaded is reloaded.
+        :return: None
+        """
+        with self._lock:
+            if open_gaming_only is None:
+                for key in list(self._rule_sets.keys()):
+                    self._load(key)
+            else:
+                self._load(open_gaming_only)
+
+    def clear(self):
+        """
+        Drops all cached snapshots, so that the next request for one goes to the database.
+
+        :return: None
+        """
+        with self._lock:
+            self._rule_sets = {}
+
+
+cache = RuleSetCache()
+
+
+def get_rule_set(open_gaming_only=False):
+    """
+    Gives the process-wide snapshot of the rules, loading it if necessary.
+
+    :param bool open_gaming_only: If true, gives the snapshot of only open gaming content
+    :return: A snapshot of the rules
+    :rtype: RuleSet
+    """
+    return cache.get(open_gaming_only)
+
+
+def refresh(open_gaming_only=None):
+    """
+    Reloads the process-wide snapshots of the rules from the database.
+
+    :param bool open_gaming_only: Which snapshot to reload. If None, all loaded snapshots are
+        reloaded.
+    :return: None
+    """
+    cache.refresh(open_gaming_only)
@@ -0,0 +1,259 @@
+"""
+Sampling primitives used when generating characters. Everything in here draws its random numbers
+from an object with the same interface as the built-in random module, so the same code can be
+driven by the random module, a seeded random.Random or a test mock.
+"""
+
+from itertools import combinations_with_replacement, product
+from math import factorial, gcd
+from threading import Lock
+
+from Lib.Utilities.Exceptions import ExhaustedError
+
+NUM_STATS = 6
+STAT_VALUES = tuple(range(18, 2, -1))
+
+
+def _stat_counts():
+    """
+    Works out the exact distribution of a 4d6 drop lowest roll.
+
+    :return: A dictionary mapping each possible value (3 to 18) to the number of the 1296
+        possible rolls of four dice that give it
+    :rtype: dict
+    """
+    counts = {value: 0 for value in STAT_VALUES}
+    for rolls in product(range(1, 7), repeat=4):
+        counts[sum(rolls) - min(rolls)] += 1
+    return counts
+
+
+STAT_COUNTS = _stat_counts()
+
+
+class AliasTable(object):
+    """
+    Walker's alias method (Vose's variant) for drawing from a fixed discrete distribution in
+    constant time, however many outcomes there are. The weights are integers and the table is
+    built with integer arithmetic, so draws follow the distribution exactly, not just to within
+    floating point error.
+
+    :param list outcomes: The things that can be drawn
+    :param list weights: Positive integers, proportional to how likely each outcome is
+    """
+    __slots__ = ('outcomes', 'weights', 'total', 'thresholds', 'aliases')
+
+    def __init__(self, outcomes, weights):
+        if not outcomes:
+            raise ExhaustedError('Cannot build a sampler with nothing to sample')
+
+        divisor = 0
+        for weight in weights:
+            divisor = gcd(divisor, weight)
+        weights = [weight // divisor for weight in weights]
+
+        self.outcomes = tuple(outcomes)
+        self.weights = tuple(weights)
+        self.total = sum(weights)
+
+        size = len(weights)
+        scaled = [weight * size for weight in weights]  # each column holds exactly self.total
+        self.thresholds = [self.total] * size
+        self.aliases = list(range(size))
+        small = [index for index, weight in enumerate(scaled) if weight < self.total]
+        large = [index for index, weight in enumerate(scaled) if weight >= self.total]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.thresholds[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= self.total - scaled[less]
+            if scaled[more] < self.total:
+                small.append(more)
+            else:
+                large.append(more)
+
+        self.thresholds = tuple(self.thresholds)
+        self.aliases = tuple(self.aliases)
+
+    def draw(self, rng):
+        """
+        Draws one outcome.
+
+        :param rng: An object with the same interface as the built-in random module
+        :return: One of the outcomes, with probability proportional to its weight
+        """
+        index = rng.randrange(len(self.outcomes))
+        threshold = self.thresholds[index]
+        if threshold < self.total and rng.randrange(self.total) >= threshold:
+            index = self.aliases[index]
+        return self.outcomes[index]
+
+
+_stat_arrays = None
+_stat_samplers = {}
+_stat_lock = Lock()
+
+
+def _all_stat_arrays():
+    """
+    Lists every possible set of six 4d6 drop lowest rolls, sorted from best to worst, along with
+    its total and the number of ways of rolling it. Only worked out once per process.
+
+    :return: A list of tuples of (rolls, total, weight)
+    :rtype: list
+    """
+    global _stat_arrays
+    if _stat_arrays is None:
+        orderings = factorial(NUM_STATS)
+        arrays = []
+        for rolls in combinations_with_replacement(STAT_VALUES, NUM_STATS):
+            weight = orderings
+            for value in set(rolls):
+                weight //= factorial(rolls.count(value))
+            for value in rolls:
+                weight *= STAT_COUNTS[value]
+            arrays.append((rolls, sum(rolls), weight))
+        _stat_arrays = arrays
+    return _stat_arrays
+
+
+def stat_sampler(floor):
+    """
+    Gives a sampler for sets of six 4d6 drop lowest rolls (sorted from best to worst) whose total
+    is at least *floor*. Draws from it follow exactly the same distribution as rolling all six
+    stats over and over until their total reaches the floor. Samplers are built the first time
+    a floor is used and reused after that.
+
+    :param int floor: The minimum allowable sum of the six stats
+    :raises: ExhaustedError
+    :return: A sampler whose **draw** method gives a tuple of six stats
+    :rtype: AliasTable
+    """
+    sampler = _stat_samplers.get(floor)
+    if sampler is None:
+        with _stat_lock:
+            sampler = _stat_samplers.get(floor)
+            if sampler is None:
+                arrays = [(rolls, weight) for rolls, total, weight in _all_stat_arrays()
+                          if total >= floor]
+                if not arrays:
+                    raise ExhaustedError('No set of stats can add up to {}'.format(floor))
+                sampler = AliasTable([rolls for rolls, _ in arrays],
+                                     [weight for _, weight in arrays])
+                _stat_samplers[floor] = sampler
+    return sampler
+
+
+def sample_indices(size, number, rng):
+    """
+    Picks *number* different positions out of **range(size)**, using a partial Fisher-Yates
+    shuffle. Only the positions that get swapped are remembered, so this takes *number* random
+    draws and *number* steps however big *size* is, and never retries a draw.
+
+    :param int size: The number of things to pick from
+    :param int number: The number of different things to pick
+    :param rng: An object with the same interface as the built-in random module
+    :raises: ExhaustedError
+    :return: The positions picked, in the order they were picked
+    :rtype: list
+    """
+    if number > size:
+        raise ExhaustedError('Cannot pick {} different things out of {}'.format(number, size))
+
+    swapped = {}
+    picked = []
+    for position in range(number):
+        index = rng.randrange(position, size)
+        picked.append(swapped.get(index, index))
+        swapped[index] = swapped.get(position, position)
+    return picked
+
+
+def sample(population, number, rng):
+    """
+    Picks *number* different items from *population* (see :func:`sample_indices`). Each item is
+    picked at most once, although items that appear more than once in the population might be
+    picked more than once.
+
+    :param population: A sequence (anything that can be indexed and has a length) to pick from
+    :param int number: The number of items to pick
+    :param rng: An object with the same interface as the built-in random module
+    :raises: ExhaustedError
+    :return: The items picked, in the order they were picked
+    :rtype: list
+    """
+    return [population[index] for index in sample_indices(len(population), number, rng)]
+
+
+class RemainingPool(object):
+    """
+    The options in a category that haven't been used up yet, e.g. the languages a character
+    doesn't already speak. Options are kept in a list with a map from each option to its
+    positions, so one can be drawn or removed by swapping it with the last option, in time that
+    only depends on how many times it's repeated.
+
+    :param options: Every option in the category. Repeated options go in the pool once for each
+        time they're repeated, so they're as likely to be drawn as they are in the full list.
+    :param taken: Options to leave out of the pool
+    """
+    __slots__ = ('options', 'positions')
+
+    def __init__(self, options, taken=()):
+        taken = set(taken)
+        self.options = []
+        self.positions = {}
+        for option in options:
+            if option not in taken:
+                self.positions.setdefault(option, []).append(len(self.options))
+                self.options.append(option)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, option):
+        return option in self.positions
+
+    def _remove(self, position):
+        """
+        Removes whatever is at a position in the list, by moving the last option into its place.
+        Every copy of an option after the position must already have been removed.
+
+        :param int position: The position
+        :return: None
+        """
+        last_position = len(self.options) - 1
+        last = self.options.pop()
+        if position < last_position:
+            self.options[position] = last
+            positions = self.positions[last]
+            positions[positions.index(last_position)] = position
+
+    def discard(self, option):
+        """
+        Removes every copy of an option from the pool, if it's in there.
+
+        :param option: The option to remove
+        :return: None
+        """
+        positions = self.positions.pop(option, None)
+        if positions is None:
+            return
+        for position in sorted(positions, reverse=True):
+            self._remove(position)
+
+    def draw(self, rng):
+        """
+        Picks a random option (weighted by how many times it's repeated) and removes it from the
+        pool.
+
+        :param rng: An object with the same interface as the built-in random module
+        :raises: ExhaustedError (if the pool is empty)
+        :return: The option picked
+        """
+        if not self.options:
+            raise ExhaustedError('Every option has already been used')
+        option = rng.choice(self.options)
+        self.discard(option)
+        return option
@@ -0,0 +1,215 @@
+"""
+Keeps track of which saved characters exist, so that looking up a character that was never saved
+(e.g. an ID made up by a bot probing for characters) can be answered without the database.
+"""
+
+import datetime
+import os
+
+import Lib.Utilities.Storage as Storage
+
+from bson import ObjectId
+from threading import Lock, Thread
+
+from ExternalServices import (SAVE_LOCATION, SAVED_ID_CAPACITY, SAVED_ID_ERROR_RATE,
+                              MISSING_ID_CACHE_SIZE, MISSING_ID_TTL)
+from Lib.Utilities.Cache import BloomFilter, ExpiringCache
+
+# Seconds between an ID being made and its record certainly being in the database. Also covers
+# the clocks of the processes making IDs not quite agreeing.
+INSERT_MARGIN = 300
+
+
+class SavedIDIndex(object):
+    """
+    A Bloom filter of the IDs of every saved character, in front of a short-lived cache of IDs
+    that weren't found. The filter is built from the database the first time it's needed and
+    kept up to date as characters are saved by this process.
+
+    Characters saved by other processes aren't added to the filter, so it's only trusted for IDs
+    made (ObjectIDs start with the time they were made) comfortably before it was built. Newer IDs
+    go to the database, but are remembered for a while if they aren't found. IDs claiming to have
+    been made in the future (more than the margin for clocks not agreeing) can't have been saved
+    by anyone, so they're ruled out straight away.
+
+    The filter is built on a background thread the first time it's needed (or up front, with
+    :meth:`build`), so no request waits for the whole collection to be read. Until it's ready,
+    IDs go to the database as if there were no filter.
+
+    :param int capacity: The number of saved characters the filter is sized for. If 0, there's no
+        filter and only the cache of missing IDs is used.
+    :param float error_rate: The chance of the filter failing to rule out an ID that wasn't saved
+    :param int cache_size: The most missing IDs to remember
+    :param float ttl: The number of seconds a missing ID is remembered for
+    :ivar int checks: The number of IDs looked up
+    :ivar int rejections: The number of IDs the filter said were never saved
+    :ivar int future: The number of IDs ruled out for being made in the future
+    :ivar int false_positives: The number of IDs the filter couldn't rule out that weren't found
+    """
+    def __init__(self, capacity=SAVED_ID_CAPACITY, error_rate=SAVED_ID_ERROR_RATE,
+                 cache_size=MISSING_ID_CACHE_SIZE, ttl=MISSING_ID_TTL):
+        self.filter = BloomFilter(capacity, error_rate) if capacity > 0 else None
+        self.missing = ExpiringCache(cache_size, ttl)
+        self.checks = 0
+        self.rejections = 0
+        self.future = 0
+        self.false_positives = 0
+        self._covers_before = None
+        self._builder = None
+        self._lock = Lock()
+
+    def build(self):
+        """
+        Adds the ID of every saved character to the filter, if that hasn't already been done.
+        This reads the whole collection, so call it at startup or leave it to
+        :meth:`start_build`; :meth:`is_missing` never waits for it.
+
+        :return: None
+        """
+        if self.filter is None or self._covers_before is not None:
+            return
+        with self._lock:
+            if self._covers_before is not None:
+                return
+            started = datetime.datetime.now(datetime.timezone.utc)
+            for object_id in Storage.storage.find_ids(SAVE_LOCATION):
+                self.filter.add(object_id)
+            margin = datetime.timedelta(seconds=INSERT_MARGIN)
+            self._covers_before = ObjectId.from_datetime(started - margin)
+
+    def start_build(self):
+        """
+        Starts building the filter on a background thread, if it isn't built and this process
+        isn't already building it.
+
+        :return: None
+        """
+        pid = os.getpid()
+        if self.filter is None or self._covers_before is not None or self._builder == pid:
+            return
+        if self._builder is not None:
+            # Forked while the parent was building, so its lock may be held by a thread that
+            # doesn't exist here
+            self._lock = Lock()
+        self._builder = pid
+        Thread(target=self._build_in_background, args=(pid,), daemon=True).start()
+
+    def _build_in_background(self, pid):
+        """
+        Builds the filter, allowing it to be tried again later if the database can't be read.
+
+        :param int pid: The process starting the build
+        :return: None
+        """
+        try:
+            self.build()
+        except Exception:
+            # The filter just isn't used until a later build succeeds
+            if self._builder == pid:
+                self._builder = None
+
+    def _covers(self, object_id):
+        """
+        Determines if the filter can be trusted to know whether an ID was saved.
+
+        :param ObjectId object_id: The ID
+        :return: True if the ID was made long enough before the filter was built
+        :rtype: bool
+        """
+        return self._covers_before is not None and object_id < self._covers_before
+
+    def is_missing(self, object_id):
+        """
+        Determines, without the database, if there's certainly no saved character with an ID.
+
+        :param ObjectId object_id: The ID
+        :return: True if there's no such character, False if there might be
+        :rtype: bool
+        """
+        self.checks += 1
+        latest = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            seconds=INSERT_MARGIN)
+        if object_id.generation_time > latest:
+            self.future += 1
+            return True
+        if self.missing.get(str(object_id)) is not None:
+            return True
+        if self.filter is None:
+            return False
+
+        if self._covers_before is None:
+            self.start_build()
+            return False
+        if self._covers(object_id) and object_id not in self.filter:
+            self.rejections += 1
+            return True
+        return False
+
+    def not_found(self, object_id):
+        """
+        Records that the database had no character with an ID, so it's answered without the
+        database for a while.
+
+        :param ObjectId object_id: The ID
+        :return: None
+        """
+        if self.filter is not None and self._covers(object_id):
+            self.false_positives += 1
+        self.missing.put(str(object_id), True)
+
+    def add(self, object_ids):
+        """
+        Records that characters have been saved.
+
+        :param list object_ids: The IDs of the characters
+        :return: None
+        """
+        for object_id in object_ids:
+            if self.filter is not None:
+                self.filter.add(object_id)
+            self.missing.discard(str(object_id))
+
+    def stats(self):
+        """
+        Gives counts of how well the filter and the cache of missing IDs are working.
+
+        :return: A dictionary with the keys **checks** (IDs looked up), **missing_hits** (IDs
+            answered by the cache of missing IDs), **rejections** (IDs answered by the filter),
+            **future** (IDs ruled out for being made in the future), **hit_rate** (the fraction of
+            IDs answered without the database), **false_positives** (IDs the filter couldn't rule
+            out that weren't found), **false_positive_rate** (the fraction of missing IDs the
+            filter couldn't rule out), **expected_false_positive_rate** (the fraction expected,
+            given how full the filter is) and **size** (the number of IDs in the filter)
+        :rtype: dict
+        """
+        answered = self.missing.hits + self.rejections + self.future
+        judged = self.rejections + self.false_positives
+        return {
+            'checks': self.checks,
+            'missing_hits': self.missing.hits,
+            'rejections': self.rejections,
+            'future': self.future,
+            'hit_rate': answered / self.checks if self.checks else 0.0,
+            'false_positives': self.false_positives,
+            'false_positive_rate': self.false_positives / judged if judged else 0.0,
+            'expected_false_positive_rate':
+                self.filter.false_positive_rate() if self.filter is not None else 0.0,
+            'size': len(self.filter) if self.filter is not None else 0
+        }
+
+    def clear(self):
+        """
+        Forgets every ID and resets the counters. The filter is built again when it's next needed.
+
+        :return: None
+        """
+        with self._lock:
+            if self.filter is not None:
+                self.filter.clear()
+            self._covers_before = None
+            self._builder = None
+        self.missing.clear()
+        self.checks = 0
+        self.rejections = 0
+        self.future = 0
+        self.false_positives = 0
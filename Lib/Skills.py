@@ -0,0 +1,192 @@
+"""
+Contains the compact stores for a character's skills and stats. Every skill name (including
+sub-skills like "Foreign Language (French)") is given a number by a :class:`SkillIndex` that is
+shared by every character generated from the same rules, so each character only needs an array of
+small integers rather than a dictionary of its own.
+"""
+
+from array import array
+from collections.abc import MutableMapping
+from threading import Lock
+
+ABSENT = -32768  # the smallest value an array('h') can hold, marking a skill a character lacks
+
+STAT_NAMES = ('Strength', 'Dexterity', 'Constitution', 'Intelligence', 'Power', 'Charisma')
+_STAT_POSITIONS = {stat: position for position, stat in enumerate(STAT_NAMES)}
+
+
+class SkillIndex(object):
+    """
+    Gives every skill name a fixed position. The default skills come first, in their original
+    order, followed by every combination of sub-skill category and option. Names that aren't known
+    yet are added the first time they're set on a character, so the index only ever grows.
+
+    :param dict defaults: A mapping of every skill to its default value
+    :param dict sub_skills: A mapping of sub-skill categories to their specific options
+    :ivar list names: The name of the skill at each position
+    :ivar dict positions: A mapping of every skill name to its position
+    :ivar int default_count: The number of default skills (which are at the start of the index)
+    :ivar array template: The starting value of every skill, with **ABSENT** for those that
+        characters don't start with
+    """
+    __slots__ = ('names', 'positions', 'default_count', 'template', '_lock')
+
+    def __init__(self, defaults, sub_skills=None):
+        self.names = list(defaults)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+        self.default_count = len(self.names)
+        self.template = array('h', (defaults[name] for name in self.names))
+        self._lock = Lock()
+        for skill, options in (sub_skills or {}).items():
+            for sub in options:
+                self.intern(skill + ' (' + sub + ')')
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """
+        Gives the position of a skill, adding it to the end of the index if it isn't there yet.
+
+        :param str name: The name of the skill
+        :return: The position of the skill
+        :rtype: int
+        """
+        position = self.positions.get(name)
+        if position is None:
+            with self._lock:
+                position = self.positions.get(name)
+                if position is None:
+                    position = len(self.names)
+                    self.names.append(name)
+                    self.template.append(ABSENT)
+                    self.positions[name] = position  # only visible once everything else is set
+        return position
+
+
+class SkillSet(MutableMapping):
+    """
+    A dictionary-like mapping of skill names to values, stored as an array of small integers with
+    one entry per skill in a shared :class:`SkillIndex`. Iterating gives the default skills in
+    their original order, followed by any other skills in the order they were added, which is the
+    same order a dictionary copied from the defaults would give.
+
+    :param SkillIndex index: The index of skill names, shared between characters
+    :ivar array values: The value of every skill in the index, or **ABSENT**
+    :ivar array extra: The positions of the skills that aren't defaults, in the order they were
+        added
+    """
+    __slots__ = ('index', 'values', 'extra')
+
+    def __init__(self, index):
+        self.index = index
+        self.values = array('h', index.template)
+        self.extra = array('I')
+
+    def _position(self, skill):
+        """
+        Gives the position of a skill the character has, or None if it doesn't have it.
+
+        :param str skill: The name of the skill
+        :return: The position of the skill
+        :rtype: int
+        """
+        position = self.index.positions.get(skill)
+        if position is None or position >= len(self.values) or self.values[position] == ABSENT:
+            return None
+        return position
+
+    def __getitem__(self, skill):
+        position = self._position(skill)
+        if position is None:
+            raise KeyError(skill)
+        return self.values[position]
+
+    def __setitem__(self, skill, value):
+        if value == ABSENT:
+            raise ValueError('{} is too small for a skill value'.format(value))
+        position = self.index.intern(skill)
+        values = self.values
+        if position >= len(values):
+            values.extend([ABSENT] * (len(self.index.template) - len(values)))
+        if values[position] == ABSENT and position >= self.index.default_count:
+            self.extra.append(position)
+        values[position] = value
+
+    def __delitem__(self, skill):
+        position = self._position(skill)
+        if position is None:
+            raise KeyError(skill)
+        self.values[position] = ABSENT
+        if position >= self.index.default_count:
+            self.extra.remove(position)
+
+    def __contains__(self, skill):
+        return self._position(skill) is not None
+
+    def __iter__(self):
+        names = self.index.names
+        values = self.values
+        for position in range(self.index.default_count):
+            if values[position] != ABSENT:
+                yield names[position]
+        for position in self.extra:
+            yield names[position]
+
+    def __len__(self):
+        default_count = self.index.default_count
+        return default_count - self.values[:default_count].count(ABSENT) + len(self.extra)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self))
+
+    def copy(self):
+        """
+        Copies the skills. The copy shares the same index.
+
+        :return: An independent set of the same skills
+        :rtype: SkillSet
+        """
+        copy = type(self)(self.index)
+        copy.values = array('h', self.values)
+        copy.extra = array('I', self.extra)
+        return copy
+
+
+class StatBlock(MutableMapping):
+    """
+    A dictionary-like mapping of the six stats (Strength, Dexterity, Constitution, Intelligence,
+    Power and Charisma) to their values, stored in a fixed size array. Stats can be changed, but
+    not added or removed.
+
+    :param dict stats: The value of every stat. If not provided, every stat starts at 0.
+    :raises: KeyError (if *stats* is missing one of the six stats)
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, stats=None):
+        if stats is None:
+            self.values = array('h', [0] * len(STAT_NAMES))
+        else:
+            self.values = array('h', [stats[stat] for stat in STAT_NAMES])
+
+    def __getitem__(self, stat):
+        return self.values[_STAT_POSITIONS[stat]]
+
+    def __setitem__(self, stat, value):
+        self.values[_STAT_POSITIONS[stat]] = value
+
+    def __delitem__(self, stat):
+        raise TypeError('Stats cannot be removed')
+
+    def __contains__(self, stat):
+        return stat in _STAT_POSITIONS
+
+    def __iter__(self):
+        return iter(STAT_NAMES)
+
+    def __len__(self):
+        return len(STAT_NAMES)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self))
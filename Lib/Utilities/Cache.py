@@ -0,0 +1,370 @@
+"""
+Caches for data that never changes once it's been written, like saved characters. There is a
+size-bounded in-process cache that throws away whatever was used least recently, a cache on local
+disk that survives restarts, and a cache that puts the first in front of the second. There's
+also a cache whose items expire, and a Bloom filter for cheaply telling that something was never
+seen.
+"""
+
+import json
+import math
+import time
+
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+
+from Lib.Utilities.Connections import SQLiteConnection
+
+
+class LRUCache(object):
+    """
+    An in-process cache holding at most *max_size* items. When it's full, adding another item
+    throws away the one that was used least recently. Counts how often items are (and aren't)
+    found, and is safe to use from many threads at once.
+
+    :param int max_size: The most items the cache can hold. If 0, nothing is ever cached.
+    :ivar int hits: The number of times an item was found in the cache
+    :ivar int misses: The number of times an item wasn't found in the cache
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """
+        Gives the cached item for a key, marking it as the most recently used.
+
+        :param key: The key of the item
+        :param default: What to give if the item isn't cached
+        :return: The cached item, or *default*
+        """
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Caches an item, throwing away the least recently used item if the cache is full.
+
+        :param key: The key of the item
+        :param value: The item
+        :return: None
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def discard(self, key):
+        """
+        Throws away the cached item for a key, if there is one.
+
+        :param key: The key of the item
+        :return: None
+        """
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        """
+        Throws away every cached item and resets the counters.
+
+        :return: None
+        """
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class ExpiringCache(LRUCache):
+    """
+    An :class:`LRUCache` whose items are also thrown away once they're older than a time to live,
+    for remembering things that are only true for a while.
+
+    :param int max_size: The most items the cache can hold. If 0, nothing is ever cached.
+    :param float ttl: The number of seconds an item is good for
+    :param function clock: A function giving the current (monotonic) time in seconds. Only
+        needs to be changed for testing.
+    """
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        super().__init__(max_size)
+        self.ttl = ttl
+        self.clock = clock
+
+    def __contains__(self, key):
+        item = self._items.get(key)
+        return item is not None and item[0] > self.clock()
+
+    def get(self, key, default=None):
+        """
+        Gives the cached item for a key, marking it as the most recently used. Expired items are
+        thrown away and count as misses.
+
+        :param key: The key of the item
+        :param default: What to give if the item isn't cached (or has expired)
+        :return: The cached item, or *default*
+        """
+        with self._lock:
+            expires, value = self._items.get(key, (None, None))
+            if expires is None or expires <= self.clock():
+                self._items.pop(key, None)
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Caches an item until its time to live has passed, throwing away the least recently used
+        item if the cache is full.
+
+        :param key: The key of the item
+        :param value: The item
+        :return: None
+        """
+        super().put(key, (self.clock() + self.ttl, value))
+
+
+class BloomFilter(object):
+    """
+    A set that can only say that an item *might* have been added, or that it definitely hasn't
+    been, using a fixed amount of memory. Until more than *capacity* items have been added, the
+    chance of wrongly saying an item might have been added stays around *error_rate*. Keys are
+    turned into strings.
+
+    :param int capacity: The number of items the filter is sized for. Must be at least 1.
+    :param float error_rate: The chance of a false positive when the filter is full
+    :ivar int count: The number of items added
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = Lock()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def _positions(self, key):
+        """
+        Works out which bits represent a key, using two halves of one hash to make all of them.
+
+        :param key: The key
+        :return: The position of each bit
+        :rtype: list
+        """
+        digest = md5(str(key).encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + index * second) % self.num_bits for index in range(self.num_hashes)]
+
+    def add(self, key):
+        """
+        Adds an item to the filter.
+
+        :param key: The item
+        :return: None
+        """
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def false_positive_rate(self):
+        """
+        Estimates the chance that an item that was never added is wrongly said to (maybe) have
+        been, given how many items have been added.
+
+        :return: The chance, from 0 to 1
+        :rtype: float
+        """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def clear(self):
+        """
+        Removes every item from the filter.
+
+        :return: None
+        """
+        with self._lock:
+            self._bits = bytearray(len(self._bits))
+            self.count = 0
+
+
+class DiskCache(object):
+    """
+    A cache stored in an SQLite database on local disk, so it survives restarts. Items are stored
+    as JSON, so they have to be things JSON can represent (e.g. dictionaries of strings and
+    numbers). Keys are turned into strings. The database isn't opened until it's first used, and
+    each process (including those forked from the one that made the cache) opens it for itself.
+
+    :param str path: The path to the database file, which is created if it doesn't exist
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = SQLiteConnection(path, self._create_table)
+
+    @staticmethod
+    def _create_table(connection):
+        """
+        Creates the table items are stored in, if it doesn't exist.
+
+        :param sqlite3.Connection connection: A newly opened connection to the database
+        :return: None
+        """
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def __len__(self):
+        with self._connection as connection:
+            return connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def get(self, key, default=None):
+        """
+        Gives the cached item for a key.
+
+        :param key: The key of the item
+        :param default: What to give if the item isn't cached
+        :return: The cached item, or *default*
+        """
+        with self._connection as connection:
+            row = connection.execute('SELECT value FROM cache WHERE key = ?',
+                                     (str(key),)).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Caches an item, replacing any item already cached for the key.
+
+        :param key: The key of the item
+        :param value: The item, which has to be representable as JSON
+        :return: None
+        """
+        data = json.dumps(value)
+        with self._connection as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)',
+                               (str(key), data))
+
+    def clear(self):
+        """
+        Throws away every cached item.
+
+        :return: None
+        """
+        with self._connection as connection, connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self):
+        """
+        Closes the database file. It's opened again if the cache is used afterwards.
+
+        :return: None
+        """
+        self._connection.close()
+
+
+class TieredCache(object):
+    """
+    An in-process cache in front of an (optional) cache on disk. Items found on disk are copied
+    into memory, and items added go into both.
+
+    :param LRUCache memory: The in-process cache
+    :param DiskCache disk: The cache on disk, or None to only cache in memory
+    :ivar int disk_hits: The number of times an item wasn't in memory, but was found on disk
+    """
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.disk_hits = 0
+
+    def get(self, key, default=None):
+        """
+        Gives the cached item for a key, looking in memory and then on disk.
+
+        :param key: The key of the item
+        :param default: What to give if the item isn't cached
+        :return: The cached item, or *default*
+        """
+        missing = object()
+        value = self.memory.get(key, missing)
+        if value is not missing:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, missing)
+            if value is not missing:
+                self.disk_hits += 1
+                self.memory.put(key, value)
+                return value
+        return default
+
+    def put(self, key, value):
+        """
+        Caches an item in memory and on disk.
+
+        :param key: The key of the item
+        :param value: The item
+        :return: None
+        """
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self):
+        """
+        Gives counts of how well the cache is working.
+
+        :return: A dictionary with the keys **hits** (items found in memory), **disk_hits** (items
+            found on disk instead), **misses** (items not found at all) and **size** (the number
+            of items in memory)
+        :rtype: dict
+        """
+        return {
+            'hits': self.memory.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.memory.misses - self.disk_hits,
+            'size': len(self.memory)
+        }
+
+    def clear(self):
+        """
+        Throws away every cached item, both in memory and on disk, and resets the counters.
+
+        :return: None
+        """
+        self.memory.clear()
+        self.disk_hits = 0
+        if self.disk is not None:
+            self.disk.clear()
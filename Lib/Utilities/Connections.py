@@ -0,0 +1,104 @@
+"""
+Connections to SQLite databases on local disk that are safe to share between the threads of a
+process and to have around when the process forks (e.g. under a pre-fork server like gunicorn).
+"""
+
+import os
+import sqlite3
+
+from threading import Lock, RLock
+
+# Guards working out whether a connection belongs to this process. Only held for a moment, and
+# replaced in the child after a fork where Python can do that.
+_guard = Lock()
+
+
+def _reset_guard():
+    global _guard
+    _guard = Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_guard)
+
+
+class SQLiteConnection(object):
+    """
+    An SQLite connection that isn't opened until it's first used, and is opened again in any
+    process forked from the one that opened it, since SQLite connections can't be shared across a
+    fork. The threads of a process share one connection, taking turns through a (re-entrant) lock,
+    so it's used as a context manager::
+
+        with sqlite_connection as connection:
+            connection.execute(...)
+
+    :param str path: The path to the database file, which is created if it doesn't exist. With
+        `":memory:"`, each process gets its own empty database.
+    :param function setup: Called with each new connection once it's opened (e.g. to create
+        tables)
+    :ivar int connects: The number of connections opened, including those opened again after a
+        fork
+    """
+    def __init__(self, path, setup=None):
+        self.path = path
+        self.setup = setup
+        self.connects = 0
+        self._connection = None
+        self._pid = os.getpid()
+        self._lock = RLock()
+
+    def _own(self):
+        """
+        Forgets the connection and lock of the process this was forked from, if it was.
+
+        :return: The lock for this process
+        :rtype: threading.RLock
+        """
+        with _guard:
+            pid = os.getpid()
+            if self._pid != pid:
+                # Anything from before the fork (including a lock another thread was holding)
+                # belongs to the parent, so it's dropped rather than closed
+                self._connection = None
+                self._lock = RLock()
+                self._pid = pid
+            return self._lock
+
+    def __enter__(self):
+        lock = self._own()
+        lock.acquire()
+        try:
+            if self._connection is None:
+                connection = sqlite3.connect(self.path, check_same_thread=False)
+                if self.setup is not None:
+                    self.setup(connection)
+                self._connection = connection
+                self.connects += 1
+            return self._connection
+        except BaseException:
+            lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._lock.release()
+
+    @property
+    def connected(self):
+        """
+        Whether this process has opened its connection.
+
+        :rtype: bool
+        """
+        return self._connection is not None and self._pid == os.getpid()
+
+    def close(self):
+        """
+        Closes this process's connection, if it's open. A new one is opened when it's next used.
+
+        :return: None
+        """
+        lock = self._own()
+        with lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
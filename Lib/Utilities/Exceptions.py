@@ -42,3 +42,23 @@ class MalformedError(Error):
 
     def __int__(self):
         return 400
+
+
+class ExhaustedError(Error):
+    """
+    Exception raised when something needs more random choices than there are options to choose
+    from (e.g. a class with more bonds than there are bonds available to it). This is a problem
+    with the game data rather than with any request, so we give this the integer representation of
+    500, for easy use with the API.
+
+    :ivar str message: Gives context as to what exactly ran out.
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+    def __int__(self):
+        return 500
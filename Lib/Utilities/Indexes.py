@@ -0,0 +1,83 @@
+"""
+The indexes the collections should have, and the queries they're there for. The indexes are
+created (if they don't already exist) whenever the database is seeded and whenever the server is
+started with ``python server.py``, and the queries can be checked to make sure none of them read
+a whole collection, so a change to the content or the indexes can't quietly make them slow.
+
+Nothing here runs when the app is imported, so a pre-fork server (e.g. gunicorn) doesn't connect
+to the database before forking. When deploying that way, run ``python -m Lib.Utilities.Indexes``
+to create the indexes, or ``python -m Lib.Utilities.Indexes --check`` to check the queries
+(exiting with an error if any of them read a whole collection).
+"""
+
+import sys
+
+import Lib.Utilities.Storage as Storage
+
+from bson import ObjectId
+
+from ExternalServices import SAVE_LOCATION
+
+ASCENDING = 1
+
+# The collection and keys of each index. Saved characters are only ever looked up by their _id,
+# which every collection is already indexed on, and bonds are all loaded at once (then split up
+# by what they require in memory), so neither needs any more.
+INDEXES = [
+    ('classes', [('open', ASCENDING)]),
+    ('packages', [('open', ASCENDING)]),
+    ('disorders', [('Violence', ASCENDING)]),
+    ('disorders', [('Helplessness', ASCENDING)]),
+    ('disorders', [('Unnatural', ASCENDING)])
+]
+
+# The collection and an example of each query that has to use an index
+QUERIES = [
+    ('classes', {'open': True}),
+    ('packages', {'open': True}),
+    ('disorders', {'Violence': True}),
+    ('disorders', {'Helplessness': True}),
+    ('disorders', {'Unnatural': True}),
+    (SAVE_LOCATION, {'_id': ObjectId('0' * 24)}),
+    (SAVE_LOCATION, {'_id': {'$in': [ObjectId('0' * 24), ObjectId('f' * 24)]}})
+]
+
+
+def ensure_indexes(storage=None):
+    """
+    Creates every index in **INDEXES** that doesn't already exist.
+
+    :param Storage.Storage storage: Where to create the indexes. If not provided, the process-wide
+        storage is used.
+    :return: The name of each index
+    :rtype: list
+    """
+    storage = storage or Storage.storage
+    return [storage.ensure_index(collection, keys) for collection, keys in INDEXES]
+
+
+def check_queries(storage=None):
+    """
+    Finds the queries in **QUERIES** that would read every record in their collection.
+
+    :param Storage.Storage storage: Where to check the queries. If not provided, the process-wide
+        storage is used.
+    :return: The collection and query of each query that doesn't use an index
+    :rtype: list
+    """
+    storage = storage or Storage.storage
+    return [(collection, query) for collection, query in QUERIES
+            if storage.scans(collection, query)]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    if len(sys.argv) > 1 and sys.argv[1] == '--check':
+        scans = check_queries()
+        for collection, query in scans:
+            print('Collection scan: {} {}'.format(collection, query))
+        if scans:
+            sys.exit(1)
+        print('Every query uses an index')
+    else:
+        for name in ensure_indexes():
+            print('Index: {}'.format(name))
@@ -4,17 +4,224 @@ don't have to write the same simple code (e.g. for turning a Mongo cursor object
 over and over again.
 """
 
+import os
+
 from pymongo import MongoClient
 from bson import ObjectId
+from bson.codec_options import CodecOptions
 from bson.errors import InvalidId
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
 
-from copy import deepcopy
+from threading import Lock
 
 from Lib.Utilities.Exceptions import MalformedError
-from ExternalServices import DATABASE, MONGO_STRING
+from ExternalServices import (DATABASE, MONGO_STRING, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+                              MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+                              MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_WRITE_CONCERN)
+
+try:
+    from pymongo.monitoring import ConnectionPoolListener
+except ImportError:  # pymongo before 3.9 can't report on its connection pool
+    ConnectionPoolListener = None
+
+
+class PoolCounter(ConnectionPoolListener or object):
+    """
+    Counts what a client's connection pool does, as reported by pymongo.
+
+    :ivar int created: The number of connections opened
+    :ivar int closed: The number of connections closed
+    :ivar int checked_out: The number of times a connection was taken from the pool
+    :ivar int checked_in: The number of times a connection was given back to the pool
+    :ivar int failures: The number of times a connection couldn't be taken from the pool
+    :ivar int clears: The number of times the pool was emptied (e.g. after a network error)
+    """
+    def __init__(self):
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.failures = 0
+        self.clears = 0
+
+    def connection_created(self, event):
+        self.created += 1
+
+    def connection_closed(self, event):
+        self.closed += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_in += 1
+
+    def connection_check_out_failed(self, event):
+        self.failures += 1
+
+    def pool_cleared(self, event):
+        self.clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+class ClientManager(object):
+    """
+    Owns the client used to talk to Mongo. The client isn't made until it's first needed, so
+    importing this module doesn't connect to anything, and it's made again in any process that
+    was forked from the one that made it (e.g. by a pre-fork server like gunicorn), since
+    pymongo clients can't be shared across a fork.
+
+    :param str uri: The Mongo connection string
+    :param str database_name: The name of the database to use
+    :param type client_class: What to make the client with
+    :param options: Options for the client (e.g. **maxPoolSize** or **w**). Options that are None
+        are left out, so the client's defaults are used.
+    :ivar int connects: The number of clients made, including those made again after a fork
+    """
+    def __init__(self, uri, database_name, client_class=MongoClient, **options):
+        self.uri = uri
+        self.database_name = database_name
+        self.client_class = client_class
+        self.options = {name: value for name, value in options.items() if value is not None}
+        self.connects = 0
+        self._client = None
+        self._counter = None
+        self._pid = None
+        self._lock = Lock()
+
+    @property
+    def client(self):
+        """
+        The client for this process, made if there isn't one yet.
+
+        :rtype: MongoClient
+        """
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    # A client left over from before a fork belongs to the parent, so it's
+                    # dropped rather than closed
+                    options = dict(self.options)
+                    counter = None
+                    if ConnectionPoolListener is not None:
+                        counter = PoolCounter()
+                        options['event_listeners'] = [counter]
+                    self._client = self.client_class(self.uri, **options)
+                    self._counter = counter
+                    self._pid = pid
+                    self.connects += 1
+        return self._client
 
-client = MongoClient(MONGO_STRING + DATABASE)
-database = client[DATABASE]
+    @property
+    def database(self):
+        """
+        The database to use, from the client for this process.
+
+        :rtype: pymongo.database.Database
+        """
+        return self.client[self.database_name]
+
+    def close(self):
+        """
+        Closes this process's client, if it has one. A new one is made when it's next needed.
+
+        :return: None
+        """
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._counter = None
+            self._pid = None
+
+    def stats(self):
+        """
+        Gives the size limits of the connection pool and, if pymongo can report them, counts of
+        what it has done in this process. Useful for checking that the number of server processes
+        times **max_pool_size** stays within the number of connections Mongo allows.
+
+        :return: A dictionary with the keys **pid** (this process), **connected** (whether this
+            process has a client), **connects** (clients made), **max_pool_size** and
+            **min_pool_size** (as configured, or None for pymongo's defaults) and, once there's a
+            client and if pymongo supports it, **open** (connections open now), **in_use**
+            (connections taken from the pool now), **created**, **closed**, **checked_out**,
+            **failures** and **clears**
+        :rtype: dict
+        """
+        connected = self._client is not None and self._pid == os.getpid()
+        stats = {
+            'pid': os.getpid(),
+            'connected': connected,
+            'connects': self.connects,
+            'max_pool_size': self.options.get('maxPoolSize'),
+            'min_pool_size': self.options.get('minPoolSize')
+        }
+        counter = self._counter
+        if connected and counter is not None:
+            stats.update({
+                'open': counter.created - counter.closed,
+                'in_use': counter.checked_out - counter.checked_in,
+                'created': counter.created,
+                'closed': counter.closed,
+                'checked_out': counter.checked_out,
+                'failures': counter.failures,
+                'clears': counter.clears
+            })
+        return stats
+
+
+manager = ClientManager(MONGO_STRING + DATABASE, DATABASE, maxPoolSize=MONGO_MAX_POOL_SIZE,
+                        minPoolSize=MONGO_MIN_POOL_SIZE, connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                        w=MONGO_WRITE_CONCERN)
+
+# Set this to use a particular database (e.g. a mock) instead of the one from the manager
+database = None
+
+
+def _database():
+    """
+    Gives the database to use: the one set as **database**, if any, or else the manager's.
+
+    :rtype: pymongo.database.Database
+    """
+    if database is not None:
+        return database
+    return manager.database
+
+
+def _with_id(document):
+    """
+    Makes a shallow copy of a document with an **_id**, giving it a new ObjectID if it doesn't
+    already have one. Since pymongo only adds a top level **_id**, and only to documents that don't
+    have one, this is all that's needed to stop it changing the original, without copying anything
+    nested inside it.
+
+    :param dict document: The document
+    :return: The copy
+    :rtype: dict
+    """
+    document = dict(document)
+    if '_id' not in document:
+        document['_id'] = ObjectId()
+    return document
 
 
 def insert(json_doc, collection):
@@ -23,9 +230,9 @@ def insert(json_doc, collection):
 
     :note: It appears that pymongo does something incredibly *vile* here; it silently modifies
         the original object with an **_id** field. I get why it needs to add one, but HAVING A
-        FUNCTION WITH SUCH A SERIOUS SIDE EFFECT AND NO WARNING IS TERRIBLE. Because of this, I've
-        added a deepcopy step, which protects the original document and added this to my test
-        cases.
+        FUNCTION WITH SUCH A SERIOUS SIDE EFFECT AND NO WARNING IS TERRIBLE. Because of this, each
+        document is given its **_id** in a shallow copy (see :func:`_with_id`) before it's
+        inserted, which protects the original document, and I've added this to my test cases.
     :note: ObjectID is not a serializable property. So anything saved can no longer be serialized
         by json.dumps, which is, uh, problematic for an API!
 
@@ -35,13 +242,38 @@ def insert(json_doc, collection):
     :return: The unique ID or IDs given to the inserted item
     :rtype: string_or_list
     """
-    json_doc = deepcopy(json_doc)
     if isinstance(json_doc, dict):
-        return database[collection].insert_one(json_doc).inserted_id
+        return _database()[collection].insert_one(_with_id(json_doc)).inserted_id
     elif len(json_doc) == 1:
-        return database[collection].insert_one(json_doc[0]).inserted_id
+        return _database()[collection].insert_one(_with_id(json_doc[0])).inserted_id
     else:
-        return database[collection].insert_many(json_doc).inserted_ids
+        documents = [_with_id(document) for document in json_doc]
+        return _database()[collection].insert_many(documents).inserted_ids
+
+
+def insert_many(documents, collection):
+    """
+    Function for inserting many documents into a Mongo database with a single, unordered bulk
+    write. Because the write is unordered, one document failing (e.g. because of a duplicate
+    **_id**) doesn't stop the others from being inserted. The documents are given their **_id** in
+    shallow copies (see :func:`_with_id`), so the originals aren't modified.
+
+    :param list documents: Valid python dictionaries, which will be converted to the MongoDB BSON
+        format as they are inserted into the database.
+    :param str collection: The collection to insert the documents into
+    :return: The unique ID given to each document, in the same order as the documents, with None
+        for any document that couldn't be inserted
+    :rtype: list
+    """
+    documents = [_with_id(document) for document in documents]
+    if not documents:
+        return []
+    try:
+        return _database()[collection].insert_many(documents, ordered=False).inserted_ids
+    except BulkWriteError as e:
+        failed = {error['index'] for error in e.details.get('writeErrors', [])}
+        return [None if index in failed else document['_id']
+                for index, document in enumerate(documents)]
 
 
 def find_all(collection):
@@ -52,8 +284,7 @@ def find_all(collection):
     :return: A list containing all records in the collection
     :rtype: list
     """
-    pointer = database[collection].find()
-    return [obj for obj in pointer]
+    return list(iter_subset(collection))
 
 
 def find_subset(collection, query):
@@ -66,11 +297,87 @@ def find_subset(collection, query):
     :return: A list of all records in the collection that matched the query
     :rtype: list
     """
-    pointer = database[collection].find(query)
-    return [obj for obj in pointer]
+    return list(iter_subset(collection, query))
+
+
+def iter_all(collection, fields=None, sort=None, limit=0, batch_size=None, raw=False):
+    """
+    Generator function going through all records in the provided collection, one at a time,
+    without holding them all in memory. See :func:`iter_subset` for the arguments.
+
+    :param string collection: The name of the database collection
+    :return: A generator of all records in the collection
+    :rtype: generator
+    """
+    return iter_subset(collection, None, fields, sort, limit, batch_size, raw)
 
 
-def find_one(collection, query=None):
+def iter_subset(collection, query=None, fields=None, sort=None, limit=0, batch_size=None,
+                raw=False):
+    """
+    Generator function going through a subset of the records in the collection, one at a time,
+    with the subset determined by the query. Records are fetched from Mongo in batches as they're
+    needed, so going through a whole collection only ever holds one batch in memory. Nothing is
+    fetched until the first record is asked for, and the cursor is closed once the generator is
+    finished with (even if it wasn't gone through completely).
+
+    :param string collection: The name of the database collection
+    :param dict query: A query, potentially limiting the returned records
+    :param list fields: The top level fields of the records to fetch (along with **_id**). If not
+        provided, the whole records are fetched.
+    :param list sort: The order to give records in, as a list of (field, direction) pairs, with
+        directions of 1 (ascending) or -1 (descending). If not provided, the natural order is used.
+    :param int limit: The most records to give, or 0 for no limit
+    :param int batch_size: The number of records fetched from Mongo at once. If not provided,
+        Mongo's default is used.
+    :param bool raw: If true, records are given as undecoded RawBSONDocuments, so only the fields
+        that are actually used get decoded
+    :return: A generator of the records that matched the query
+    :rtype: generator
+    """
+    target = _database()[collection]
+    if raw:
+        target = target.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    cursor = target.find(query, _projection(fields), sort=sort, limit=limit)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    try:
+        for record in cursor:
+            yield record
+    finally:
+        cursor.close()
+
+
+def find_ids(collection):
+    """
+    Function to find the unique IDs (**_id**) of all records in the provided collection, without
+    fetching anything else. The IDs are fetched in batches as they're needed, so they're never all
+    held in memory at once.
+
+    :param string collection: The name of the database collection
+    :return: A generator of the **_id** of every record in the collection
+    :rtype: generator
+    """
+    for obj in _database()[collection].find({}, {'_id': True}):
+        yield obj['_id']
+
+
+def _projection(fields):
+    """
+    Turns a list of fields into a Mongo projection that only includes those fields (and **_id**).
+
+    :param list fields: The names of the top level fields to include, or None for every field
+    :return: The projection, or None if every field should be included
+    :rtype: dict
+    """
+    if fields is None:
+        return None
+    projection = {field: True for field in fields}
+    projection['_id'] = True  # an empty projection would include every field
+    return projection
+
+
+def find_one(collection, query=None, fields=None):
     """
     Function to find a single record in a collection. If no query is provided, it will return the
     first record based on the natural sort order. Otherwise, it will find the first record based
@@ -79,14 +386,16 @@ def find_one(collection, query=None):
 
     :param string collection: The name of the database collection
     :param dict query: A query, potentially changing the returned record
+    :param list fields: The top level fields of the record to fetch. If not provided, the whole
+        record is fetched.
     :return: A dict containing the first record in the natural ordering based on the search
         criteria. If nothing is found, an empty dict will be returned.
     :rtype: dict
     """
     if query:
-        res = database[collection].find_one(query)
+        res = _database()[collection].find_one(query, _projection(fields))
     else:
-        res = database[collection].find_one()
+        res = _database()[collection].find_one(None, _projection(fields))
 
     if res:
         del res['_id']
@@ -95,7 +404,7 @@ def find_one(collection, query=None):
         return {}
 
 
-def find_by_id(collection, object_id, literal=False):
+def find_by_id(collection, object_id, literal=False, fields=None):
     """
     Function to find an object in the database by its unique MongoDB identifier. If you're using
     your own thing as the **_id** of a record, you need to set the literal property to True.
@@ -106,14 +415,93 @@ def find_by_id(collection, object_id, literal=False):
     :param str_or_int object_id: The unique ID (**_id**) of the record you're looking for
     :param bool literal: If true, the *object_id* argument is kept as a whatever it's passed in as.
         Otherwise it is cast to the BSON ObjectID type
+    :param list fields: The top level fields of the record to fetch. If not provided, the whole
+        record is fetched.
 
     :return: A dict containing the results of the query (if any). If nothing is found, an empty
         dict is returned
     :rtype: dict
     """
     if not literal:
-        try:
-            object_id = ObjectId(str(object_id))
-        except InvalidId:
-            raise MalformedError("{} is not a valid literal ObjectID".format(object_id))
-    return find_one(collection, {"_id": object_id})
+        object_id = to_object_id(object_id)
+    return find_one(collection, {"_id": object_id}, fields)
+
+
+def find_by_ids(collection, object_ids, literal=False, fields=None):
+    """
+    Function to find many objects in the database by their unique MongoDB identifiers, with a
+    single query. The **literal** argument works the same way as for :func:`find_by_id`. Deletes
+    the **_id** property of the returned dictionaries.
+
+    :param str collection: The name of the database collection
+    :param list object_ids: The unique IDs (**_id**) of the records you're looking for
+    :param bool literal: If true, the *object_ids* are kept as whatever they're passed in as.
+        Otherwise they are cast to the BSON ObjectID type
+    :param list fields: The top level fields of the records to fetch. If not provided, the whole
+        records are fetched.
+    :raises: MalformedError (if any of the IDs isn't a valid ObjectID)
+    :return: A dict for each ID, in the same order as the IDs, containing the record with that ID.
+        If a record isn't found, an empty dict is given in its place.
+    :rtype: list
+    """
+    if not literal:
+        object_ids = [to_object_id(object_id) for object_id in object_ids]
+    records = {}
+    if object_ids:
+        query = {"_id": {"$in": list(set(object_ids))}}
+        for record in _database()[collection].find(query, _projection(fields)):
+            records[record.pop('_id')] = record
+    return [dict(records.get(object_id, {})) for object_id in object_ids]
+
+
+def ensure_index(collection, keys):
+    """
+    Function to create an index on a collection, if it doesn't already have one with the same
+    keys. Safe to call as often as you like.
+
+    :param str collection: The name of the database collection
+    :param list keys: The fields to index, as a list of (field, direction) pairs, with directions
+        of 1 (ascending) or -1 (descending)
+    :return: The name of the index
+    :rtype: str
+    """
+    return _database()[collection].create_index(list(keys))
+
+
+def plan_stages(collection, query):
+    """
+    Function to find out how Mongo would run a query, by explaining it.
+
+    :param str collection: The name of the database collection
+    :param dict query: The query
+    :return: The name of every stage in the plan Mongo picked (e.g. **IXSCAN** when an index is
+        used, or **COLLSCAN** when every record has to be read)
+    :rtype: list
+    """
+    explanation = _database()[collection].find(query).explain()
+    stages = []
+    pending = [explanation.get('queryPlanner', {}).get('winningPlan', {})]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.append(node['stage'])
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+    return stages
+
+
+def to_object_id(object_id):
+    """
+    Function to cast an ID to the BSON ObjectId type, as used for the **_id** of most records.
+
+    :param str_or_ObjectId object_id: The ID to cast
+    :raises: MalformedError (if it isn't a valid ObjectID)
+    :return: The ID as an ObjectId
+    :rtype: ObjectId
+    """
+    try:
+        return ObjectId(str(object_id))
+    except InvalidId:
+        raise MalformedError("{} is not a valid literal ObjectID".format(object_id))
@@ -0,0 +1,61 @@
+"""
+Turns things into compact JSON, as bytes ready to be sent in a response. If
+`orjson <https://github.com/ijl/orjson>`_ is installed it's used, as it's much faster; otherwise
+the standard library's encoder is used (without any indenting or key sorting). Either way the
+result is the same JSON.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(value):
+    """
+    Encodes a value as compact JSON.
+
+    :param value: Anything JSON can represent (dictionaries must have string keys)
+    :return: The encoded JSON
+    :rtype: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _encoder.encode(value).encode('utf-8')
+
+
+def key(name):
+    """
+    Encodes a dictionary key once, so it can be reused by :func:`join_object`.
+
+    :param str name: The key
+    :return: The encoded key, followed by the colon separating it from its value
+    :rtype: bytes
+    """
+    return dumps(name) + b':'
+
+
+def join_object(members):
+    """
+    Builds a JSON object from keys (from :func:`key`) and values that are already encoded.
+
+    :param members: An iterable of encoded (key, value) pairs
+    :return: The encoded object
+    :rtype: bytes
+    """
+    return b'{' + b','.join(encoded_key + value for encoded_key, value in members) + b'}'
+
+
+def join_array(values):
+    """
+    Builds a JSON array from values that are already encoded.
+
+    :param values: An iterable of encoded values
+    :return: The encoded array
+    :rtype: bytes
+    """
+    return b'[' + b','.join(values) + b']'
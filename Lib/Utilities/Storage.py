@@ -0,0 +1,626 @@
+"""
+Where records are stored. Everything that reads or writes records goes through the process-wide
+**storage**, which is either Mongo (see :mod:`Lib.Utilities.Mongo`) or, for small installations
+and testing, a single SQLite file that doesn't need a database server at all.
+"""
+
+import json
+import sqlite3
+
+from bson import ObjectId
+
+import Lib.Utilities.Mongo as Mongo
+
+from Lib.Utilities.Connections import SQLiteConnection
+
+from ExternalServices import STORAGE_PATH
+from Lib.Utilities.Exceptions import MalformedError
+
+
+class Storage(object):
+    """
+    The operations every way of storing records has to support. Records are dictionaries, kept in
+    named collections, each with a unique **_id**.
+    """
+    def insert(self, json_doc, collection):
+        """
+        Inserts one or more records. Records without an **_id** are given a new ObjectID. The
+        records passed in aren't changed.
+
+        :param dict_or_list json_doc: A dictionary, or a list of dictionaries
+        :param str collection: The collection to insert the records into
+        :return: The unique ID or IDs given to the inserted records
+        :rtype: string_or_list
+        """
+        raise NotImplementedError
+
+    def insert_many(self, documents, collection):
+        """
+        Inserts many records at once. One record failing (e.g. because of a duplicate **_id**)
+        doesn't stop the others from being inserted.
+
+        :param list documents: The records, as dictionaries
+        :param str collection: The collection to insert the records into
+        :return: The unique ID given to each record, in the same order, with None for any record
+            that couldn't be inserted
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def find_all(self, collection):
+        """
+        Finds every record in a collection.
+
+        :param str collection: The name of the collection
+        :return: Every record, including their **_id**
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def find_subset(self, collection, query):
+        """
+        Finds the records in a collection that match a query.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :return: The matching records, including their **_id**
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def iter_all(self, collection, fields=None, sort=None, limit=0, batch_size=None):
+        """
+        Goes through every record in a collection, one at a time, without holding them all in
+        memory. See :meth:`iter_subset` for the arguments.
+
+        :param str collection: The name of the collection
+        :return: A generator of every record, including their **_id**
+        :rtype: generator
+        """
+        return self.iter_subset(collection, None, fields, sort, limit, batch_size)
+
+    def iter_subset(self, collection, query=None, fields=None, sort=None, limit=0,
+                    batch_size=None):
+        """
+        Goes through the records in a collection that match a query, one at a time, fetching
+        them in batches as they're needed.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :param list fields: The top level fields of the records to fetch (along with **_id**). If
+            not provided, the whole records are fetched.
+        :param list sort: The order to give records in, as a list of (field, direction) pairs,
+            with directions of 1 (ascending) or -1 (descending). If not provided, records are
+            given in the order they were inserted.
+        :param int limit: The most records to give, or 0 for no limit
+        :param int batch_size: The number of records fetched at once
+        :return: A generator of the matching records, including their **_id**
+        :rtype: generator
+        """
+        raise NotImplementedError
+
+    def find_one(self, collection, query=None, fields=None):
+        """
+        Finds the first record in a collection (that matches a query, if one is given), without
+        its **_id**.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :param list fields: The top level fields of the record to fetch. If not provided, the
+            whole record is fetched.
+        :return: The record, or an empty dict if nothing was found
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def find_by_id(self, collection, object_id, literal=False, fields=None):
+        """
+        Finds a record by its **_id**, without the **_id** itself.
+
+        :param str collection: The name of the collection
+        :param str_or_int object_id: The unique ID of the record
+        :param bool literal: If true, *object_id* is used as it is. Otherwise it is cast to an
+            ObjectID.
+        :param list fields: The top level fields of the record to fetch. If not provided, the
+            whole record is fetched.
+        :raises: MalformedError (if the ID isn't a valid ObjectID)
+        :return: The record, or an empty dict if it wasn't found
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def find_by_ids(self, collection, object_ids, literal=False, fields=None):
+        """
+        Finds many records by their **_id**, with a single query, without the **_id** itself.
+
+        :param str collection: The name of the collection
+        :param list object_ids: The unique IDs of the records
+        :param bool literal: If true, the IDs are used as they are. Otherwise they're cast to
+            ObjectIDs.
+        :param list fields: The top level fields of the records to fetch. If not provided, the
+            whole records are fetched.
+        :raises: MalformedError (if any of the IDs isn't a valid ObjectID)
+        :return: A dict for each ID, in the same order, with an empty dict for any record that
+            wasn't found
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def find_ids(self, collection):
+        """
+        Goes through the **_id** of every record in a collection, without fetching anything else
+        or holding them all in memory.
+
+        :param str collection: The name of the collection
+        :return: A generator of the unique IDs
+        :rtype: generator
+        """
+        raise NotImplementedError
+
+    def ensure_index(self, collection, keys):
+        """
+        Indexes a collection on some fields, if it isn't already. Safe to call as often as you
+        like.
+
+        :param str collection: The name of the collection
+        :param list keys: The fields to index, as a list of (field, direction) pairs, with
+            directions of 1 (ascending) or -1 (descending)
+        :return: The name of the index
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def scans(self, collection, query):
+        """
+        Determines if a query would have to read every record in a collection, rather than using
+        an index.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :return: True if every record would be read
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def to_object_id(object_id):
+        """
+        Casts an ID to the ObjectID type, as used for the **_id** of most records.
+
+        :param str_or_ObjectId object_id: The ID to cast
+        :raises: MalformedError (if it isn't a valid ObjectID)
+        :return: The ID as an ObjectId
+        :rtype: ObjectId
+        """
+        return Mongo.to_object_id(object_id)
+
+
+class MongoStorage(Storage):
+    """
+    Stores records in Mongo, by calling the function of the same name in
+    :mod:`Lib.Utilities.Mongo` for each operation.
+    """
+    def insert(self, json_doc, collection):
+        return Mongo.insert(json_doc, collection)
+
+    def insert_many(self, documents, collection):
+        return Mongo.insert_many(documents, collection)
+
+    def find_all(self, collection):
+        return Mongo.find_all(collection)
+
+    def find_subset(self, collection, query):
+        return Mongo.find_subset(collection, query)
+
+    def iter_all(self, collection, fields=None, sort=None, limit=0, batch_size=None, raw=False):
+        """
+        See :meth:`Storage.iter_all`.
+
+        :param bool raw: If true, records are given as undecoded RawBSONDocuments
+        """
+        return Mongo.iter_all(collection, fields, sort, limit, batch_size, raw)
+
+    def iter_subset(self, collection, query=None, fields=None, sort=None, limit=0,
+                    batch_size=None, raw=False):
+        """
+        See :meth:`Storage.iter_subset`.
+
+        :param bool raw: If true, records are given as undecoded RawBSONDocuments
+        """
+        return Mongo.iter_subset(collection, query, fields, sort, limit, batch_size, raw)
+
+    def find_one(self, collection, query=None, fields=None):
+        return Mongo.find_one(collection, query, fields)
+
+    def find_by_id(self, collection, object_id, literal=False, fields=None):
+        return Mongo.find_by_id(collection, object_id, literal, fields)
+
+    def find_by_ids(self, collection, object_ids, literal=False, fields=None):
+        return Mongo.find_by_ids(collection, object_ids, literal, fields)
+
+    def find_ids(self, collection):
+        return Mongo.find_ids(collection)
+
+    def ensure_index(self, collection, keys):
+        return Mongo.ensure_index(collection, keys)
+
+    def scans(self, collection, query):
+        return 'COLLSCAN' in Mongo.plan_stages(collection, query)
+
+
+# The comparisons find_subset understands, and the SQL for each
+_OPERATORS = {'$eq': '=', '$ne': '!=', '$lt': '<', '$lte': '<=', '$gt': '>', '$gte': '>='}
+
+
+class SQLiteStorage(Storage):
+    """
+    Stores records in a single SQLite file. Each collection is a table, with the **_id** of each
+    record as its primary key and the rest of the record stored as JSON. Whenever a top level
+    field is queried by :meth:`find_subset`, an index on that field is created (if it doesn't
+    already exist), so later queries don't have to scan the whole table.
+
+    Queries can compare top level fields to values, either directly (as in
+    `{"Violence": True}`) or with the operators `$eq`, `$ne`, `$lt`, `$lte`, `$gt`, `$gte` and
+    `$in`. The **_id** is stored as text, so ordering comparisons on it only make sense between
+    ObjectIDs. Apart from **_id**, values in records are limited to what JSON can represent.
+
+    The database isn't opened until it's first used, and each process (including those forked
+    from the one that made the storage) opens it for itself (see
+    :class:`~Lib.Utilities.Connections.SQLiteConnection`).
+
+    :param str path: The path to the database file, which is created if it doesn't exist. Use
+        `":memory:"` for a database that only lasts as long as the process.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = SQLiteConnection(path, self._opened)
+        self._tables = set()
+        self._indexes = set()
+
+    def _opened(self, connection):
+        """
+        Forgets which tables and indexes exist whenever a new connection is opened, since it may
+        be to a different database (e.g. a new one in memory).
+
+        :param sqlite3.Connection connection: The new connection
+        :return: None
+        """
+        self._tables.clear()
+        self._indexes.clear()
+
+    @staticmethod
+    def _quote(name):
+        """
+        Quotes the name of a table or index for use in SQL.
+
+        :param str name: The name
+        :return: The quoted name
+        :rtype: str
+        """
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def _key(object_id):
+        """
+        Turns an **_id** into the text stored as the primary key, keeping track of its type.
+
+        :param object_id: The **_id**
+        :return: The key
+        :rtype: str
+        """
+        if isinstance(object_id, ObjectId):
+            return 'ObjectId:' + str(object_id)
+        return json.dumps(object_id)
+
+    @staticmethod
+    def _from_key(key):
+        """
+        Turns a stored primary key back into an **_id**.
+
+        :param str key: The key
+        :return: The **_id**
+        """
+        if key.startswith('ObjectId:'):
+            return ObjectId(key[len('ObjectId:'):])
+        return json.loads(key)
+
+    @staticmethod
+    def _record(key, document, fields=None, with_id=True):
+        """
+        Turns a stored row back into a record.
+
+        :param str key: The stored primary key
+        :param str document: The rest of the record, as JSON
+        :param list fields: The top level fields to keep, or None for every field
+        :param bool with_id: If true, the record includes its **_id**
+        :return: The record
+        :rtype: dict
+        """
+        record = {'_id': SQLiteStorage._from_key(key)} if with_id else {}
+        values = json.loads(document)
+        if fields is None:
+            record.update(values)
+        else:
+            record.update((field, values[field]) for field in fields if field in values)
+        return record
+
+    def _table(self, collection):
+        """
+        Gives the quoted name of the table for a collection, creating it if it doesn't exist.
+
+        :param str collection: The name of the collection
+        :return: The quoted name of the table
+        :rtype: str
+        """
+        table = self._quote(collection)
+        with self._connection as connection:
+            if collection not in self._tables:
+                connection.execute('CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, '
+                                   'document TEXT NOT NULL)'.format(table))
+                self._tables.add(collection)
+        return table
+
+    def _field(self, collection, field):
+        """
+        Gives the SQL for reading a top level field, creating an index on the field if there
+        isn't one.
+
+        :param str collection: The name of the collection
+        :param str field: The name of the field
+        :raises: MalformedError (if the field can't be queried)
+        :return: The SQL expression
+        :rtype: str
+        """
+        if not field or any(character in field for character in '"\'.$[]'):
+            raise MalformedError('Cannot query the field {}'.format(field))
+        expression = 'json_extract(document, \'$."{}"\')'.format(field)
+        with self._connection as connection:
+            if (collection, field) not in self._indexes:
+                connection.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+                    self._quote('{}.{}'.format(collection, field)), self._table(collection),
+                    expression))
+                self._indexes.add((collection, field))
+        return expression
+
+    @staticmethod
+    def _value(value):
+        """
+        Turns a value from a query into what SQLite's `json_extract` would give for it.
+
+        :param value: The value
+        :return: The value to compare against
+        """
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, separators=(',', ':'))
+        return value
+
+    def _where(self, collection, query):
+        """
+        Builds the SQL condition (and its parameters) for a query.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :raises: MalformedError (if the query uses anything that isn't supported)
+        :return: The condition and its parameters
+        :rtype: tuple
+        """
+        conditions = []
+        parameters = []
+        for field, condition in (query or {}).items():
+            if field == '_id':
+                expression, convert = 'key', self._key
+            else:
+                expression, convert = self._field(collection, field), self._value
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            for operator, value in condition.items():
+                if operator == '$in':
+                    values = [convert(item) for item in value if item is not None]
+                    options = ['{} IN ({})'.format(expression, ', '.join('?' * len(values)))]
+                    if len(values) < len(value):
+                        options.append('{} IS NULL'.format(expression))
+                    conditions.append('(' + ' OR '.join(options) + ')')
+                    parameters.extend(values)
+                elif operator in ('$eq', '$ne') and value is None:
+                    conditions.append('{} IS {}NULL'.format(
+                        expression, 'NOT ' if operator == '$ne' else ''))
+                elif operator in _OPERATORS:
+                    conditions.append('{} {} ?'.format(expression, _OPERATORS[operator]))
+                    parameters.append(convert(value))
+                else:
+                    raise MalformedError('Unsupported query operator {}'.format(operator))
+        return ' AND '.join(conditions) or '1', parameters
+
+    def _order(self, collection, sort):
+        """
+        Builds the SQL ordering for a sort, ending with the order records were inserted in.
+
+        :param str collection: The name of the collection
+        :param list sort: (field, direction) pairs, with directions of 1 or -1
+        :raises: MalformedError (if a direction isn't 1 or -1)
+        :return: The ordering
+        :rtype: str
+        """
+        terms = []
+        for field, direction in sort or ():
+            if direction not in (1, -1):
+                raise MalformedError('Unsupported sort direction {}'.format(direction))
+            expression = 'key' if field == '_id' else self._field(collection, field)
+            terms.append('{} {}'.format(expression, 'ASC' if direction == 1 else 'DESC'))
+        return ', '.join(terms + ['rowid'])
+
+    def _execute(self, collection, query=None, sort=None, limit=0):
+        """
+        Starts finding the stored rows matching a query. The rows should only be fetched from the
+        cursor while holding the connection's lock.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :param list sort: (field, direction) pairs to order the rows by. If not provided, the rows
+            are in the order they were inserted.
+        :param int limit: The most rows to find, or 0 for every row
+        :return: A cursor giving the primary key and JSON document of each row
+        :rtype: sqlite3.Cursor
+        """
+        with self._connection as connection:
+            table = self._table(collection)
+            where, parameters = self._where(collection, query)
+            sql = 'SELECT key, document FROM {} WHERE {} ORDER BY {}'.format(
+                table, where, self._order(collection, sort))
+            if limit:
+                sql += ' LIMIT {:d}'.format(limit)
+            return connection.execute(sql, parameters)
+
+    def _select(self, collection, query=None, limit=0):
+        """
+        Finds the stored rows matching a query, in the order they were inserted.
+
+        :param str collection: The name of the collection
+        :param dict query: A Mongo-style query
+        :param int limit: The most rows to find, or 0 for every row
+        :return: The primary key and JSON document of each row
+        :rtype: list
+        """
+        with self._connection:
+            return self._execute(collection, query, limit=limit).fetchall()
+
+    def _insert(self, documents, collection):
+        """
+        Inserts records, each in its own statement, within one transaction.
+
+        :param list documents: The records
+        :param str collection: The collection to insert the records into
+        :return: The **_id** of each record, with None for any record that couldn't be inserted
+        :rtype: list
+        """
+        ids = []
+        with self._connection as connection, connection:
+            table = self._table(collection)
+            for document in documents:
+                document = dict(document)
+                object_id = document.pop('_id', None)
+                if object_id is None:
+                    object_id = ObjectId()
+                try:
+                    connection.execute(
+                        'INSERT INTO {} (key, document) VALUES (?, ?)'.format(table),
+                        (self._key(object_id), json.dumps(document)))
+                    ids.append(object_id)
+                except sqlite3.IntegrityError:
+                    ids.append(None)
+        return ids
+
+    def insert(self, json_doc, collection):
+        """
+        See :meth:`Storage.insert`.
+
+        :raises: MalformedError (if a record has an **_id** that's already used)
+        """
+        documents = [json_doc] if isinstance(json_doc, dict) else json_doc
+        ids = self._insert(documents, collection)
+        if None in ids:
+            raise MalformedError('A record with that _id already exists')
+        return ids[0] if len(ids) == 1 else ids
+
+    def insert_many(self, documents, collection):
+        return self._insert(documents, collection)
+
+    def find_all(self, collection):
+        return [self._record(key, document) for key, document in self._select(collection)]
+
+    def find_subset(self, collection, query):
+        return [self._record(key, document) for key, document in self._select(collection, query)]
+
+    def iter_subset(self, collection, query=None, fields=None, sort=None, limit=0,
+                    batch_size=None):
+        cursor = self._execute(collection, query, sort, limit)
+        try:
+            while True:
+                with self._connection:
+                    rows = cursor.fetchmany(batch_size or 100)
+                if not rows:
+                    break
+                for key, document in rows:
+                    yield self._record(key, document, fields)
+        finally:
+            cursor.close()
+
+    def find_one(self, collection, query=None, fields=None):
+        rows = self._select(collection, query, 1)
+        if not rows:
+            return {}
+        return self._record(rows[0][0], rows[0][1], fields, with_id=False)
+
+    def find_by_id(self, collection, object_id, literal=False, fields=None):
+        if not literal:
+            object_id = self.to_object_id(object_id)
+        return self.find_one(collection, {'_id': object_id}, fields)
+
+    def find_by_ids(self, collection, object_ids, literal=False, fields=None):
+        if not literal:
+            object_ids = [self.to_object_id(object_id) for object_id in object_ids]
+        records = {}
+        if object_ids:
+            for key, document in self._select(collection, {'_id': {'$in': list(set(object_ids))}}):
+                records[key] = self._record(key, document, fields, with_id=False)
+        return [dict(records.get(self._key(object_id), {})) for object_id in object_ids]
+
+    def find_ids(self, collection):
+        with self._connection as connection:
+            cursor = connection.execute(
+                'SELECT key FROM {} ORDER BY rowid'.format(self._table(collection)))
+        try:
+            while True:
+                with self._connection:
+                    rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for key, in rows:
+                    yield self._from_key(key)
+        finally:
+            cursor.close()
+
+    def ensure_index(self, collection, keys):
+        """
+        See :meth:`Storage.ensure_index`. SQLite indexes each field on its own (in ascending
+        order), and the **_id** is already the primary key, so the directions are ignored. Fields
+        are also indexed as soon as they're queried, so this only saves the first query the work.
+        """
+        with self._connection:
+            for field, direction in keys:
+                if field != '_id':
+                    self._field(collection, field)
+        return '_'.join('{}_{}'.format(field, direction) for field, direction in keys)
+
+    def scans(self, collection, query):
+        with self._connection as connection:
+            where, parameters = self._where(collection, query)
+            plan = connection.execute(
+                'EXPLAIN QUERY PLAN SELECT key, document FROM {} WHERE {}'.format(
+                    self._table(collection), where), parameters).fetchall()
+        return any(row[-1].startswith('SCAN') for row in plan)
+
+    def close(self):
+        """
+        Closes the database file. It's opened again if the storage is used afterwards.
+
+        :return: None
+        """
+        self._connection.close()
+
+
+def open_storage(path=STORAGE_PATH):
+    """
+    Opens the configured way of storing records.
+
+    :param str path: The path to an SQLite file to store records in. If not provided, records are
+        stored in Mongo.
+    :return: The storage
+    :rtype: Storage
+    """
+    if path:
+        return SQLiteStorage(path)
+    return MongoStorage()
+
+
+storage = open_storage()
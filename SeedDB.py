@@ -1,5 +1,6 @@
 """
-Script to get all of the JSON files into the Mongo Database
+Script to get all of the JSON files into the database (see :mod:`Lib.Utilities.Storage`), then
+index them (see :mod:`Lib.Utilities.Indexes`)
 """
 
 import sys
@@ -9,7 +10,8 @@ from glob import glob
 from queue import Queue
 from threading import Thread
 
-import Lib.Utilities.Mongo as Mongo
+import Lib.Utilities.Indexes as Indexes
+import Lib.Utilities.Storage as Storage
 
 from Lib.Utilities.Workspace import parse_json
 
@@ -27,7 +29,7 @@ def worker():
         if item is None:
             break
         json_obj, collection_name = parse_json(item)
-        Mongo.insert(json_obj, collection_name)
+        Storage.storage.insert(json_obj, collection_name)
         q.task_done()
 
 
@@ -55,3 +57,5 @@ if __name__ == '__main__':  # pragma: no cover
         q.put(None)
     for t in threads:
         t.join()
+
+    Indexes.ensure_indexes()
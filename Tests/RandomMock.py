@@ -2,6 +2,8 @@
 Package that provides a deterministic mock of the functions from the built-in  random module I use
 """
 
+from Lib.Sampling import stat_sampler
+
 
 class RandomMock(object):
     """
@@ -10,11 +12,9 @@ class RandomMock(object):
     def __init__(self):
         self.range_state = -1
         self.choice_state = -1
-        self.sample_state = -1
 
         self.range_list = []
         self.choice_list = []
-        self.sample_list = []
 
     def randrange(self, *_):
         self.range_state += 1
@@ -24,10 +24,38 @@ class RandomMock(object):
         self.choice_state += 1
         return self.choice_list[self.choice_state % len(self.choice_list)]
 
-    def sample(self, *_):
-        self.sample_state += 1
-        return self.sample_list[self.sample_state % len(self.sample_list)]
 
-    def shuffle(self, input_list):
-        input_list.sort()
-        pass
+def stat_range_list(rolls, floor=68):
+    """
+    Gives the values the mock's randrange needs to return for
+    :meth:`Lib.Character.RandomCharacter.apply_stats` to come up with a particular set of stats.
+
+    :param tuple rolls: The six stats, from best to worst
+    :param int floor: The floor passed to apply_stats
+    :return: The values to put at that point in the mock's **range_list**
+    :rtype: list
+    """
+    sampler = stat_sampler(floor)
+    index = sampler.outcomes.index(tuple(rolls))
+    if sampler.thresholds[index] < sampler.total:
+        return [index, 0]
+    return [index]
+
+
+def sample_range_list(population, picks):
+    """
+    Gives the values the mock's randrange needs to return for :func:`Lib.Sampling.sample` to pick
+    particular items.
+
+    :param list population: Everything being picked from, in order
+    :param list picks: The items that should be picked, in the order they should be picked
+    :return: The values to put at that point in the mock's **range_list**
+    :rtype: list
+    """
+    positions = list(range(len(population)))
+    values = []
+    for step, pick in enumerate(picks):
+        index = positions.index(population.index(pick), step)
+        values.append(index)
+        positions[step], positions[index] = positions[index], positions[step]
+    return values
@@ -1,4 +1,33 @@
 MONGO_STRING = 'mongodb://'
 DATABASE = 'deltagreen'
 
+MONGO_MAX_POOL_SIZE = 100  # most connections each process keeps open to Mongo
+MONGO_MIN_POOL_SIZE = 0  # connections each process keeps open to Mongo even when idle
+MONGO_CONNECT_TIMEOUT_MS = 20000  # milliseconds to wait while opening a connection
+MONGO_SOCKET_TIMEOUT_MS = None  # milliseconds to wait for a reply (None waits forever)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 30000  # milliseconds to wait for a usable server
+MONGO_WRITE_CONCERN = 1  # Mongo servers that must acknowledge each write
+
 SAVE_LOCATION = 'SavedCharacters'
+STORAGE_PATH = None  # path to an SQLite file to store everything in, instead of Mongo
+
+RULES_TTL = 300  # seconds before cached rule data (classes, packages, etc.) is reloaded
+
+MAX_BATCH_COUNT = 1000  # most characters that can be generated by a single request
+SAVE_CHUNK_SIZE = 500  # most characters saved by a single bulk insert
+
+CHARACTER_POOL_HIGH = 0  # most ready-made characters kept by each process (0 disables the pool)
+CHARACTER_POOL_LOW = 0  # the pool is refilled once it has this many characters or fewer
+CHARACTER_POOL_WORKERS = 1  # background threads refilling the pool
+
+COALESCE_WINDOW = 0  # seconds to collect concurrent character requests into a batch (0 disables)
+COALESCE_MAX_BATCH = 64  # most concurrent character requests generated as one batch
+
+CHARACTER_CACHE_SIZE = 1024  # most saved characters kept in memory by each process
+CHARACTER_CACHE_PATH = None  # path to an SQLite file to also cache saved characters on disk
+SAVED_ID_CAPACITY = 1000000  # saved characters the filter of known IDs is sized for (0 disables)
+SAVED_ID_ERROR_RATE = 0.01  # chance of the filter failing to rule out an ID that wasn't saved
+MISSING_ID_CACHE_SIZE = 4096  # most IDs that weren't found remembered by each process
+MISSING_ID_TTL = 60  # seconds an ID that wasn't found is remembered as missing
+
+VIEW_MAX_AGE = 3600  # seconds browsers and proxies may reuse a page before revalidating it
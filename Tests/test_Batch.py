@@ -0,0 +1,180 @@
+import unittest
+import random
+import warnings
+
+import mongomock
+import numpy as np
+
+from collections import Counter
+from os import path
+
+import Lib.Batch as Batch
+import Lib.Generator as Generator
+import Lib.RuleSet as RuleSet
+import Lib.Utilities.Mongo as Mongo
+
+from Lib.Skills import ABSENT, STAT_NAMES
+from Lib.Utilities.Exceptions import ExhaustedError
+from Lib.Utilities.Workspace import parse_json
+from Tests.TestData import data_path
+from Tests.test_Sampling import chi_squared
+
+
+class TestBatchGenerator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Mongo.database = mongomock.MongoClient()['Test']
+        RuleSet.cache.clear()
+        for name, collection in (('bonds', 'bonds'), ('classes', 'classes'),
+                                 ('default_stats', 'default_stats'), ('packages', 'packages'),
+                                 ('skill_mapping', 'skill_mapping'), ('sub_skills', 'sub_skills'),
+                                 ('helplessness_disorders', 'disorders'),
+                                 ('unnatural_disorders', 'disorders'),
+                                 ('violence_disorders', 'disorders')):
+            Mongo.insert(parse_json(path.join(data_path, name + '.json'))[0], collection)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.generator = Batch.BatchGenerator()
+        cls.batch = cls.generator.generate(4000, seed=1)
+
+    def test_shapes(self):
+        """Every character should be a row of each array"""
+        skills = len(self.generator.skill_names)
+
+        self.assertEqual(len(self.batch), 4000)
+        self.assertEqual(self.batch.skills.shape, (4000, skills))
+        self.assertEqual(self.batch.stats.shape, (4000, len(STAT_NAMES)))
+        self.assertEqual(self.batch.attributes.shape, (4000, len(Batch.ATTRIBUTE_NAMES)))
+
+    def test_character_format(self):
+        """A character from a batch should look just like one from the generator"""
+        expected = Generator.Generator(rules=self.generator.rules).generate(random.Random(1))
+        character = self.batch[0]
+
+        self.assertEqual(list(character.keys()), list(expected.keys()))
+        self.assertEqual(list(character['Stats']), list(STAT_NAMES))
+        self.assertEqual(list(character['Attributes']), list(expected['Attributes']))
+        default_count = self.generator.rules.skill_index.default_count
+        self.assertEqual(list(character['Skills'])[:default_count],
+                         list(self.generator.rules.defaults))
+        self.assertEqual(len(character['Bonds']), character['Number_Bonds'])
+
+    def test_indexing(self):
+        """Characters should be built when they're asked for, however they're asked for"""
+        self.assertEqual(self.batch[-1], self.batch[len(self.batch) - 1])
+        self.assertEqual(self.batch[2:4], [self.batch[2], self.batch[3]])
+        self.assertEqual(self.batch[5]['Skills'], self.batch.get_skills(5))
+        with self.assertRaises(IndexError):
+            self.batch[len(self.batch)]
+
+    def test_seed(self):
+        """The same seed should always give the same characters"""
+        first = self.generator.generate(20, seed=5)
+        second = self.generator.generate(20, seed=np.random.RandomState(5))
+
+        self.assertEqual(list(first), list(second))
+        self.assertNotEqual(list(first), list(self.generator.generate(20, seed=6)))
+
+    def test_floor(self):
+        """Stats should meet the floor, other than those lowered by being a veteran"""
+        lowered = np.isin(self.batch.veterans, (Batch.VIOLENCE, Batch.HELPLESSNESS))
+        totals = self.batch.stats.sum(axis=1)
+
+        self.assertTrue((totals[~lowered] >= 68).all())
+        self.assertTrue((totals[lowered] >= 65).all())
+
+    def test_no_stat_floor(self):
+        """With no floor, stats can be anything 4d6 drop lowest gives"""
+        stats = self.generator.generate(2000, seed=2, floor=0).stats
+
+        self.assertLess(stats.sum(axis=1).min(), 68)
+        self.assertTrue(((stats >= 3) & (stats <= 18)).all())
+
+    def test_absent_skills(self):
+        """Sub-skills a character doesn't have should be marked as absent"""
+        for position in range(20):
+            skills = self.batch.get_skills(position)
+            absent = [name for name, value in zip(self.batch.skill_names,
+                                                  self.batch.skills[position])
+                      if value == ABSENT]
+            self.assertFalse(set(absent) & set(skills))
+            self.assertEqual(len(absent) + len(skills), len(self.batch.skill_names))
+
+    def test_matches_generator(self):
+        """Characters from a batch should follow the same distribution as those generated one at
+            a time"""
+        rng = random.Random(3)
+        generator = Generator.Generator(rules=self.generator.rules)
+        single = [generator.generate(rng) for _ in range(len(self.batch))]
+        batch = list(self.batch)
+
+        summaries = [
+            ('class', lambda character: character['Class']),
+            ('package', lambda character: character['Package']),
+            ('veteran type', lambda character: character['Veteran']),
+            ('number of bonds', lambda character: character['Number_Bonds']),
+            ('number of skills', lambda character: len(character['Skills'])),
+            ('Occult', lambda character: character['Skills']['Occult']),
+            ('Hit Points', lambda character: character['Attributes']['Hit Points'])
+        ]
+        summaries += [(stat, lambda character, stat=stat: character['Stats'][stat])
+                      for stat in STAT_NAMES]
+        for name, summary in summaries:
+            with self.subTest(msg='Testing the {}'.format(name)):
+                statistic, freedom = chi_squared(Counter(map(summary, single)),
+                                                 Counter(map(summary, batch)))
+                # far beyond the 99.9th percentile of the chi-squared distribution
+                self.assertLess(statistic, freedom + 5 * (2 * freedom) ** 0.5)
+
+        # How often each sub-skill is picked, including those repeated in the options (e.g.
+        # Science (Engineering)), which should be picked more often
+        for skill in self.generator.rules.sub_skills:
+            prefix = skill + ' ('
+            with self.subTest(msg='Testing the {} sub-skills'.format(skill)):
+                counts = [Counter(name for character in characters for name in character['Skills']
+                                  if name.startswith(prefix))
+                          for characters in (single, batch)]
+                if not any(counts):
+                    continue
+                statistic, freedom = chi_squared(*counts)
+                self.assertLess(statistic, freedom + 5 * (2 * freedom) ** 0.5)
+
+    def test_repeated_sub_skills(self):
+        """New sub-skills should be picked as often as they're repeated in the options"""
+        generator = self.generator
+        template = generator._template
+        skills = Batch._SkillMatrix(template, generator.rules.skill_index.default_count, 13000)
+        rows = np.arange(13000)
+        picks = generator._novel_sub_skills(skills, rows, 'Science', np.random.RandomState(4))
+        counts = Counter(generator.skill_names[column] for column in picks)
+
+        # Engineering is one of 13 options twice, so should be picked about 2000 times
+        self.assertAlmostEqual(counts['Science (Engineering)'], 2000, delta=250)
+        self.assertAlmostEqual(counts['Science (Physics)'], 1000, delta=200)
+
+    def test_shared_generator(self):
+        """One batch generator should be kept for each snapshot of the rules, and replaced when
+            the snapshot is"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            generator = Batch.get_batch_generator()
+            self.assertIs(Batch.get_batch_generator(), generator)
+            self.assertIs(generator.rules, RuleSet.get_rule_set())
+
+            RuleSet.refresh(False)
+            refreshed = Batch.get_batch_generator()
+
+        self.assertIsNot(refreshed, generator)
+        self.assertIs(refreshed.rules, RuleSet.get_rule_set())
+
+    def test_not_enough_bonds(self):
+        """A batch should fail up front if a class needs more bonds than there are"""
+        rules = self.generator.rules
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            rules = RuleSet.RuleSet(rules.classes, rules.packages, rules.defaults,
+                                    rules.disorders, rules.sub_skills, rules.skill_mapping)
+
+        with self.assertRaises(ExhaustedError):
+            Batch.BatchGenerator(rules=rules).generate(10, seed=1)
@@ -0,0 +1,135 @@
+import unittest
+import random
+import operator
+
+from collections import Counter
+from os import path
+
+from Lib.Bonds import BondCatalog, Bond, bond_mask, make_bond, BOND_TYPES, ALL_TYPES
+from Lib.Utilities.Exceptions import ExhaustedError
+from Lib.Utilities.Workspace import parse_json
+from Tests.TestData import data_path
+
+
+def rejection_select(bonds, number, rng):
+    """The original way of picking bonds: propose random bonds until one fits"""
+    picked = []
+    if number:
+        picked.append(rng.choice(bonds))
+        number -= 1
+
+    for _ in range(number):
+        types = {bond_type: any(bond.get(bond_type, False) for bond in picked)
+                 for bond_type in BOND_TYPES}
+        all_types = all(types.values())
+        while True:
+            proposed_bond = rng.choice(bonds)
+            if proposed_bond in picked:
+                continue
+
+            if all_types:
+                picked.append(proposed_bond)
+                break
+
+            for bond_type in BOND_TYPES:
+                if proposed_bond.get(bond_type, False):
+                    proposed_bond_type = bond_type
+                    break
+            else:
+                continue
+
+            if not types[proposed_bond_type]:
+                picked.append(proposed_bond)
+                break
+    return picked
+
+
+class TestBondRecords(unittest.TestCase):
+    def test_bond_mask(self):
+        """Each type should get its own bit"""
+        self.assertEqual(bond_mask(['Family']), 1)
+        self.assertEqual(bond_mask(['Romantic', 'Therapy']), 2 + 16)
+        self.assertEqual(bond_mask(BOND_TYPES), ALL_TYPES)
+
+    def test_make_bond(self):
+        """The record should have the name, the type mask and the first type of the bond"""
+        document = {'_id': 'Partner', 'Romantic': True, 'Work': True, 'Family': False}
+
+        self.assertEqual(make_bond(document), Bond('Partner', bond_mask(['Romantic', 'Work']), 1,
+                                                   document))
+
+    def test_make_bond_no_types(self):
+        """Missing types should be treated as not being set"""
+        self.assertEqual(make_bond({'_id': 'Fake'}), Bond('Fake', 0, None, {'_id': 'Fake'}))
+
+
+class TestBondCatalog(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.bonds = parse_json(path.join(data_path, 'bonds.json'))[0]
+        cls.bonds = sorted(cls.bonds, key=operator.itemgetter('Work'), reverse=True)
+
+    def setUp(self):
+        self.catalog = BondCatalog(self.bonds)
+
+    def test_iter(self):
+        """Iterating should give the original bonds, in order"""
+        self.assertEqual(list(self.catalog), self.bonds)
+        self.assertEqual(len(self.catalog), len(self.bonds))
+
+    def test_buckets(self):
+        """Bonds should be bucketed by their first type"""
+        work = BOND_TYPES.index('Work')
+        self.assertEqual(self.catalog.buckets[work], (0, 1))
+        self.assertEqual(self.catalog.types, ALL_TYPES)
+
+    def test_select_none(self):
+        """Picking no bonds shouldn't use any random numbers"""
+        self.assertEqual(self.catalog.select(0, None), [])
+
+    def test_select_too_many(self):
+        """Picking more bonds than exist should fail before picking anything"""
+        with self.assertRaises(ExhaustedError):
+            self.catalog.select(len(self.bonds) + 1, random.Random(0))
+
+    def test_select_covers_types(self):
+        """As long as there's a type left to cover, every new bond should cover a new type"""
+        rng = random.Random(0)
+        for _ in range(200):
+            picked = self.catalog.select(5, rng)
+            primaries = [record.primary for record in picked[1:]]
+            with self.subTest(msg='Testing {}'.format([record.name for record in picked])):
+                self.assertEqual(len(set(record.name for record in picked)), 5)
+                self.assertNotIn(picked[0].primary, primaries)
+                self.assertEqual(len(set(primaries)), len(primaries))
+
+    def test_select_random_draws(self):
+        """Picking bonds should take exactly one random draw per bond"""
+        class CountingRandom(random.Random):
+            draws = 0
+
+            def randrange(self, *args):
+                self.draws += 1
+                return random.Random.randrange(self, *args)
+
+        rng = CountingRandom(0)
+        self.catalog.select(len(self.bonds), rng)
+        self.assertEqual(rng.draws, len(self.bonds))
+
+    def test_select_same_distribution(self):
+        """Picking bonds should give the same distribution as proposing random bonds and
+            rejecting the ones that don't fit"""
+        trials = 20000
+        for number in (2, 3):
+            with self.subTest(msg='Testing {} bonds'.format(number)):
+                old = Counter(frozenset(bond['_id'] for bond in
+                                        rejection_select(self.bonds, number, random.Random(seed)))
+                              for seed in range(trials))
+                rng = random.Random(trials)
+                new = Counter(frozenset(record.name for record in self.catalog.select(number, rng))
+                              for _ in range(trials))
+
+                self.assertEqual(set(new.keys()), set(old.keys()))
+                for key in old:
+                    # more than five standard deviations of the difference of two proportions
+                    self.assertLess(abs(new[key] - old[key]) / trials, 0.02)
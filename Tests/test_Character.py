@@ -1,14 +1,18 @@
 import unittest
 import math
+import json
 
 import mongomock
 
+from unittest import mock
+
 import Lib.Utilities.Mongo as Mongo
 import Lib.Character as Character
 
 from Lib.Character import RandomCharacter, BaseCharacter
-from Lib.Utilities.Exceptions import NotFoundError
-from Tests.RandomMock import RandomMock
+from Lib.Skills import StatBlock
+from Lib.Utilities.Exceptions import NotFoundError, ExhaustedError, MalformedError
+from Tests.RandomMock import RandomMock, stat_range_list, sample_range_list
 from ExternalServices import SAVE_LOCATION
 
 
@@ -327,11 +331,35 @@ class TestRandomCharacter(unittest.TestCase):
     def tearDown(self):
         self.random_mock.range_state = -1
         self.random_mock.choice_state = -1
-        self.random_mock.sample_state = -1
 
         self.random_mock.range_list = []
         self.random_mock.choice_list = []
-        self.random_mock.sample_list = []
+
+    def test_skills_share_defaults(self):
+        """Tests that changing a character's skills leaves the shared defaults alone, and that the
+            character's dictionary form has a plain dictionary of skills"""
+        defaults = dict(self.skills)
+        self.character.skills[self.skill_names[0]] = 99
+        self.character._add_sub_skill('Foreign Language', 'Spanish')
+        skills = self.character.get_character()['Skills']
+
+        with self.subTest(msg='Testing that the defaults are unchanged'):
+            self.assertEqual(self.skills, defaults)
+
+        with self.subTest(msg='Testing that the dictionary form has every skill'):
+            self.assertIs(type(skills), dict)
+            self.assertEqual(skills, dict(defaults, **{self.skill_names[0]: 99,
+                                                       'Foreign Language (Spanish)': 0}))
+
+    def test_compact(self):
+        """Tests that characters don't carry a dictionary of attributes around and keep their
+            stats in a fixed size block"""
+        with self.subTest(msg='Testing that there is no attribute dictionary'):
+            with self.assertRaises(AttributeError):
+                self.character.__dict__
+
+        with self.subTest(msg='Testing that stats are given as a plain dictionary'):
+            self.assertIs(type(self.character.get_character()['Stats']), dict)
 
     def test_private_get_subskill_str(self):
         """Test that sub-skill names are properly formatted"""
@@ -477,33 +505,55 @@ class TestRandomCharacter(unittest.TestCase):
         with self.subTest(msg='Tests that it does not edit the already existing sub-skill'):
             self.assertEqual(self.character.skills[expected_str], starting_value)
 
-    def test_private_add_random_sub_skill_retry_needed(self):
-        """Tests that this will try as many times as are necessary to get a new sub-skill if it picks
-            one that already exists (as long as novel is true)"""
-        self.random_mock.choice_list = [
-            self.sub_skills[self.sub_skill_names[0]][0],
-            self.sub_skills[self.sub_skill_names[0]][0],
-            self.sub_skills[self.sub_skill_names[0]][0],
-            self.sub_skills[self.sub_skill_names[0]][1],
-        ]
-        existing_str = self.sub_skill_names[0] + ' (' + self.random_mock.choice_list[0] + ')'
-        new_str = self.sub_skill_names[0] + ' (' + self.random_mock.choice_list[-1] + ')'
-        starting_value = 50
-        self.character.skills[existing_str] = starting_value
+    def test_private_add_random_sub_skill_only_new_options(self):
+        """Tests that when novel is true, the sub-skill is picked in a single draw from only those
+            the character doesn't already have"""
+        skill = self.sub_skill_names[0]
+        existing, new = self.sub_skills[skill][0], self.sub_skills[skill][1]
+        existing_str = skill + ' (' + existing + ')'
+        new_str = skill + ' (' + new + ')'
+        offered = []
+
+        def choice(options):
+            offered.extend(options)
+            return new
+
+        self.character.random = RandomMock()
+        self.character.random.choice = choice
+        self.character.skills[existing_str] = 50
 
-        with self.subTest(msg='Test that it returns the string of the eventually chosen sub-skill'):
-            self.assertEqual(self.character._add_random_sub_skill(self.sub_skill_names[0]), new_str)
+        with self.subTest(msg='Test that it returns the string of the chosen sub-skill'):
+            self.assertEqual(self.character._add_random_sub_skill(skill), new_str)
 
-        with self.subTest(msg='Test that is does not alter any of the values of the rejected '
-                              'choices'):
-            self.assertEqual(self.character.skills[existing_str], starting_value)
+        with self.subTest(msg='Test that sub-skills the character has are not offered'):
+            self.assertEqual(sorted(offered),
+                             sorted(sub for sub in set(self.sub_skills[skill]) if sub != existing))
+
+        with self.subTest(msg='Test that it does not alter the existing sub-skill'):
+            self.assertEqual(self.character.skills[existing_str], 50)
 
         with self.subTest(msg='Tests that it sets the new skill to 0'):
             self.assertEqual(self.character.skills[new_str], 0)
 
-        with self.subTest(msg='Test that it retried finding a sub-skill the correct number of '
-                              'times'):
-            self.assertEqual(self.random_mock.choice_state, len(self.random_mock.choice_list) - 1)
+    def test_private_add_random_sub_skill_pool_kept_up_to_date(self):
+        """Tests that sub-skills added by name after the first random one are not offered again"""
+        skill = 'Foreign Language'
+        self.random_mock.choice_list = ['Spanish', 'Arabic']
+        self.character._add_random_sub_skill(skill)
+        self.character._add_sub_skill(skill, 'French')
+
+        self.assertEqual(self.character._add_random_sub_skill(skill), skill + ' (Arabic)')
+        self.assertEqual(len(self.character._remaining_sub_skills(skill)), 0)
+
+    def test_private_add_random_sub_skill_exhausted(self):
+        """Tests that asking for a new sub-skill when the character has all of them fails instead
+            of trying forever"""
+        skill = 'Art'
+        for sub in self.sub_skills[skill]:
+            self.character._add_sub_skill(skill, sub)
+
+        with self.assertRaises(ExhaustedError):
+            self.character._add_random_sub_skill(skill)
 
     def test_private_safe_set_skill(self):
         """Test that it can set an ordinary skill still at its default value to another value"""
@@ -621,29 +671,26 @@ class TestRandomCharacter(unittest.TestCase):
             self.assertEqual(self.character.skills[expected_str], 40)
 
     def test_private_add_to_skill_with_sub_skill_existing_and_novel(self):
-        """Tests that it will try as many times as it needs to in order to add to a novel
-            sub-skill"""
+        """Tests that it will only pick from novel sub-skills"""
         skill = self.sub_skill_names[0]
         sub1 = self.sub_skills[skill][0]
         sub2 = self.sub_skills[skill][1]
         original_string = skill + ' (' + sub1 + ')'
         new_string = skill + ' (' + sub2 + ')'
         self.character.skills[original_string] = 20
-        self.random_mock.choice_list = [sub1, sub1, sub1, sub1, sub2]
+        self.random_mock.choice_list = [sub2]
 
         with self.subTest(msg='Tests that it returns True'):
             self.assertEqual(self.character._add_to_skill(skill, 20), True)
 
-        with self.subTest(msg='Tests that it will not add to non-novel skills, even when they are'
-                              'picked in intermediate steps'):
+        with self.subTest(msg='Tests that it will not add to non-novel skills'):
             self.assertEqual(self.character.skills[original_string], 20)
 
         with self.subTest(msg='Tests that it adds the appropriate amount to the sub-skill'):
             self.assertEqual(self.character.skills[new_string], 20)
 
-        with self.subTest(msg='Tests that it took the expected number of tries to find a novel '
-                              'sub-skill'):
-            self.assertEqual(self.random_mock.choice_state, len(self.random_mock.choice_list) - 1)
+        with self.subTest(msg='Tests that it found a novel sub-skill in one try'):
+            self.assertEqual(self.random_mock.choice_state, 0)
 
     def test_private_add_to_sub_skill(self):
         """Tests that it can add to an already existing sub-skill"""
@@ -690,15 +737,14 @@ class TestRandomCharacter(unittest.TestCase):
             self.assertEqual(self.random_mock.choice_state, 0)
 
     def test_private_add_to_sub_skill_with_sub_skill_existing_and_novel(self):
-        """Tests that it will try as many times as it needs to in order to add to a novel
-            sub-skill"""
+        """Tests that it will only pick from novel sub-skills"""
         skill = self.sub_skill_names[0]
         sub1 = self.sub_skills[skill][0]
         sub2 = self.sub_skills[skill][1]
         original_string = skill + ' (' + sub1 + ')'
         new_string = skill + ' (' + sub2 + ')'
         self.character.skills[original_string] = 20
-        self.random_mock.choice_list = [sub1, sub1, sub1, sub1, sub2]
+        self.random_mock.choice_list = [sub2]
 
         with self.subTest(msg='Tests that it returns True'):
             self.assertEqual(self.character._add_to_sub_skill(skill, '', 20, True), True)
@@ -706,11 +752,11 @@ class TestRandomCharacter(unittest.TestCase):
         with self.subTest(msg='Tests that it leaves the original sub-skill alone'):
             self.assertEqual(self.character.skills[original_string], 20)
 
-        with self.subTest(msg='Tests that it adds 20 to the eventually chosen sub-skill'):
+        with self.subTest(msg='Tests that it adds 20 to the chosen sub-skill'):
             self.assertEqual(self.character.skills[new_string], 20)
 
-        with self.subTest(msg='Tests that it  calls random.choice as many times as is necessary'):
-            self.assertEqual(self.random_mock.choice_state, len(self.random_mock.choice_list) - 1)
+        with self.subTest(msg='Tests that it only calls random.choice once'):
+            self.assertEqual(self.random_mock.choice_state, 0)
 
     def test_roll_stat(self):
         """Test that roll stat correctly grabs the top three results"""
@@ -803,7 +849,8 @@ class TestRandomCharacter(unittest.TestCase):
         }
         language_choices = ['Spanish', 'Arabic']
         self.random_mock.choice_list = language_choices
-        self.random_mock.sample_list = [['Artillery']]
+        self.random_mock.range_list = sample_range_list(list(class_obj['Choices']['Skills']),
+                                                        ['Artillery'])
         self.character.apply_class(class_obj)
 
         with self.subTest(msg='Test that the correct number of bonds are added to the character'):
@@ -831,8 +878,7 @@ class TestRandomCharacter(unittest.TestCase):
 
     def test_apply_class_repeated_choices(self):
         """Tests that applying a class with overlap between set sub-skills and random sub-skills
-            chosen as a choice will result in repeated attempts to find a workable random
-            sub-skill"""
+            chosen as a choice will pick a random sub-skill the character doesn't already have"""
         class_obj = {
             "_id": "Test",
             "Skills": {
@@ -861,9 +907,10 @@ class TestRandomCharacter(unittest.TestCase):
             ],
             "Bonds": 4
         }
-        language_choices = ['Spanish', 'Arabic', 'Spanish', 'Arabic', 'French']
+        language_choices = ['Spanish', 'Arabic', 'French']
         self.random_mock.choice_list = language_choices
-        self.random_mock.sample_list = [['Artillery', 'Foreign Language']]
+        self.random_mock.range_list = sample_range_list(list(class_obj['Choices']['Skills']),
+                                                        ['Artillery', 'Foreign Language'])
         self.character.apply_class(class_obj)
 
         with self.subTest(msg='Test that the correct number of bonds are added to the character'):
@@ -890,7 +937,7 @@ class TestRandomCharacter(unittest.TestCase):
                 self.character.skills['Foreign Language (' + language_choices[1] + ')'], 40)
 
         with self.subTest(msg='Test that the randomly chosen sub-skill is added correctly'):
-            self.assertEqual(self.random_mock.choice_state, len(language_choices)-1)
+            self.assertEqual(self.character.skills['Foreign Language (French)'], 60)
 
     def test_apply_class_no_sub_skills_chosen(self):
         """Tests that applying a class with skill choices and sub-skill choices will still
@@ -931,7 +978,9 @@ class TestRandomCharacter(unittest.TestCase):
         }
         language_choices = ['Spanish', 'Arabic']
         self.random_mock.choice_list = language_choices
-        self.random_mock.sample_list = [[False], ['Artillery']]
+        self.random_mock.range_list = sample_range_list(
+            list(class_obj['Choices']['Skills']) + class_obj['Choices']['Subskills'],
+            ['Artillery'])
         self.character.apply_class(class_obj)
 
         with self.subTest(msg='Test that the correct number of bonds are added to the character'):
@@ -996,7 +1045,9 @@ class TestRandomCharacter(unittest.TestCase):
         }
         language_choices = ['Spanish', 'Arabic']
         self.random_mock.choice_list = language_choices
-        self.random_mock.sample_list = [[class_obj['Choices']['Subskills'][0]]]
+        self.random_mock.range_list = sample_range_list(
+            list(class_obj['Choices']['Skills']) + class_obj['Choices']['Subskills'],
+            class_obj['Choices']['Subskills'])
         self.character.apply_class(class_obj)
 
         with self.subTest(msg='Test that the correct number of bonds are added to the character'):
@@ -1029,6 +1080,22 @@ class TestRandomCharacter(unittest.TestCase):
                 self.character.skills['Art (' + class_obj['Choices']['Subskills'][0]['Sub'] + ')'],
                 40)
 
+    def test_apply_class_claims_sub_skills(self):
+        """Tests that specific sub-skills set by a class are no longer offered as new random
+            sub-skills"""
+        self.random_mock.choice_list = ['Spanish']
+        self.character._add_random_sub_skill('Foreign Language')
+        self.character.apply_class({
+            "_id": "Test",
+            "Skills": {},
+            "Choices": {"Number": 0, "Skills": {}},
+            "Subskills": [{"Skill": "Foreign Language", "Sub": "French", "Value": 50}],
+            "Bonds": 2
+        })
+
+        self.assertEqual(self.character._remaining_sub_skills('Foreign Language').options,
+                         ['Arabic'])
+
     def test_add_package_skill_normal_skill(self):
         """Tests that it will return true and apply +20 to a normal skill"""
         starting = self.character.skills[self.skill_names[0]]
@@ -1114,7 +1181,8 @@ class TestRandomCharacter(unittest.TestCase):
                 "List": []
             }
         }
-        self.skill_names.sort()
+        all_skills = [skill for skill in self.character.skills if skill != 'Unnatural']
+        self.random_mock.range_list = sample_range_list(all_skills, [self.skill_names[0]])
         expected_all_skill_value = self.character.skills[self.skill_names[0]] + 20
         self.character.apply_package(package)
 
@@ -1151,6 +1219,7 @@ class TestRandomCharacter(unittest.TestCase):
             }
         }
         self.random_mock.choice_list = ['Arabic']
+        self.random_mock.range_list = [0]
         self.character.apply_package(package)
 
         with self.subTest(msg='It should add the package name to the character'):
@@ -1191,9 +1260,7 @@ class TestRandomCharacter(unittest.TestCase):
 
     def test_apply_stats_floor(self):
         """It should apply stats in order of best to worst based on available skills"""
-        self.random_mock.range_list = [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
-                                       1, 1, 1, 1, 1, 2, 3, 5, 1, 3, 3, 5, 1, 3, 4, 5, 1, 3, 4, 6,
-                                       1, 3, 5, 6, 1, 3, 6, 6]
+        self.random_mock.range_list = stat_range_list([15, 14, 13, 12, 11, 10])
         self.character.skills['Foreign Language (French)'] = 50
         self.character.skills['Art (Journalism)'] = 40
         self.character.skills['Anthropology'] = 30
@@ -1227,6 +1294,11 @@ class TestRandomCharacter(unittest.TestCase):
                                                 'Power': 3,
                                                 'Strength': 3})
 
+    def test_apply_stats_impossible_floor(self):
+        """It should fail right away rather than re-rolling forever if the floor can't be met"""
+        with self.assertRaises(ExhaustedError):
+            self.character.apply_stats(6 * 18 + 1)
+
     def test_calculate_attributes(self):
         """It should correctly set the attributes based on the stats"""
         self.character.stats = {'Charisma': 15,
@@ -1318,11 +1390,10 @@ class TestRandomCharacter(unittest.TestCase):
         lost_bond = {"_id": "Wife"}
         self.character.num_bonds = 2
         expected_bonds = self.character.num_bonds - 1
-        self.random_mock.sample_list = [["Alertness", "Athletics", "Bureaucracy",
-                                         "Computer Science"]]
+        picks = ["Alertness", "Athletics", "Bureaucracy", "Computer Science"]
+        self.random_mock.range_list = [0, 1, 2, 3]
         self.character.bonds = [remaining_bond, lost_bond]
-        new_skills = {skill: self.character.skills[skill] + 10
-                      for skill in self.random_mock.sample_list[0]}
+        new_skills = {skill: self.character.skills[skill] + 10 for skill in picks}
         new_skills['Occult'] = self.character.skills['Occult'] + 10
         new_sanity = self.character.sanity - 5
         self.character.damaged_veteran_experience()
@@ -1463,6 +1534,45 @@ class TestLoadingCharacterFromDict(unittest.TestCase):
         with self.assertRaises(NotFoundError):
             Character.BaseCharacter().parse_character({})
 
+    def test_exception_on_bad_stat(self):
+        """Test that an exception is raised when a stat isn't a small integer, if being strict"""
+        character = dict(self.character_dict, Stats=dict(self.character_dict['Stats'],
+                                                         Power='high'))
+        with self.assertRaises(MalformedError):
+            Character.BaseCharacter().parse_character(character, strict=True)
+
+    def test_lenient_stats(self):
+        """Test that stats that don't fit the six small integers are kept as they are, unless
+            being strict"""
+        stats = self.character_dict['Stats']
+        for odd in (dict(stats, Power='high'), dict(stats, Power=10 ** 6), dict(stats, Luck=9),
+                    {'Strength': 3}):
+            with self.subTest(msg='Testing {}'.format(odd)):
+                character = Character.BaseCharacter()
+                character.parse_character(dict(self.character_dict, Stats=odd), ['Stats'])
+                self.assertEqual(character.get_character(['Stats']), {'Stats': odd})
+
+        character = Character.BaseCharacter()
+        character.parse_character(self.character_dict, ['Stats'])
+        self.assertIsInstance(character.stats, StatBlock)
+
+    def test_exception_on_bad_bonds(self):
+        """Test that an exception is raised when the bonds aren't an object"""
+        for bonds in (['a'], 'a', 1):
+            with self.subTest(msg='Testing {}'.format(bonds)):
+                with self.assertRaises(MalformedError):
+                    Character.BaseCharacter().parse_character({'Bonds': bonds}, ['Bonds'])
+
+    def test_partial(self):
+        """Test that only the properties asked for are needed and loaded"""
+        character = Character.BaseCharacter()
+        partial = {'Stats': self.character_dict['Stats'],
+                   'Attributes': self.character_dict['Attributes']}
+
+        self.assertTrue(character.parse_character(partial, ['Stats', 'Attributes']))
+        self.assertEqual(character.get_character(['Attributes', 'Stats']), partial)
+        self.assertEqual(character.class_name, '')
+
     def test_running(self):
         """
         Tests that the parse_character function initializes the character without errors and
@@ -1502,7 +1612,7 @@ class TestLoadingCharacterFromDict(unittest.TestCase):
             self.assertEqual(character.damaged_veteran, self.character_obj.damaged_veteran)
 
         with self.subTest(mgs='It should successfully set the stats'):
-            self.assertDictEqual(character.stats, self.character_obj.stats)
+            self.assertDictEqual(dict(character.stats), dict(self.character_obj.stats))
 
         with self.subTest(mgs='It should successfully set the HP'):
             self.assertEqual(character.hp, self.character_obj.hp)
@@ -1590,7 +1700,7 @@ class TestLoadingCharacter(unittest.TestCase):
             self.assertEqual(character.damaged_veteran, self.character_obj.damaged_veteran)
 
         with self.subTest(mgs='It should successfully set the stats'):
-            self.assertDictEqual(character.stats, self.character_obj.stats)
+            self.assertDictEqual(dict(character.stats), dict(self.character_obj.stats))
 
         with self.subTest(mgs='It should successfully set the HP'):
             self.assertEqual(character.hp, self.character_obj.hp)
@@ -1668,7 +1778,7 @@ class TestSavingCharacter(unittest.TestCase):
             self.assertEqual(character.damaged_veteran, self.character_obj.damaged_veteran)
 
         with self.subTest(mgs='It should successfully have saved the stats'):
-            self.assertDictEqual(character.stats, self.character_obj.stats)
+            self.assertDictEqual(dict(character.stats), dict(self.character_obj.stats))
 
         with self.subTest(mgs='It should successfully have saved the HP'):
             self.assertEqual(character.hp, self.character_obj.hp)
@@ -1681,3 +1791,153 @@ class TestSavingCharacter(unittest.TestCase):
 
         with self.subTest(mgs='It should successfully have saved the San'):
             self.assertEqual(character.sanity, self.character_obj.sanity)
+
+    def test_save_many(self):
+        """
+        Tests that many characters can be saved at once, each getting its own record
+        """
+        other = BaseCharacter()
+        other.parse_character(self.character_obj.get_character())
+        other.class_name = 'Nurse'
+        db_ids = Character.save_characters([self.character_obj, other])
+
+        self.assertEqual(len(set(db_ids)), 2)
+        for db_id, character_obj in zip(db_ids, (self.character_obj, other)):
+            character = BaseCharacter()
+            character.load_character_from_db(db_id)
+            self.assertEqual(character.get_character(), character_obj.get_character())
+
+    def test_load_many(self):
+        """
+        Tests that many characters can be loaded at once, with an error in place of any that
+        can't be
+        """
+        db_id = self.character_obj.save()
+        results = Character.load_characters([db_id, 'a' * 24, 'abc'])
+
+        self.assertEqual(results[0].get_character(), self.character_obj.get_character())
+        self.assertIsInstance(results[1], NotFoundError)
+        self.assertIsInstance(results[2], MalformedError)
+
+    def test_load_fields(self):
+        """
+        Tests that part of a character can be loaded, without needing the rest of it
+        """
+        db_id = self.character_obj.save()
+        character = BaseCharacter()
+        self.assertTrue(character.load_character_from_db(db_id, ['Class', 'Bonds']))
+
+        self.assertEqual(character.get_character(['Class', 'Bonds']),
+                         self.character_obj.get_character(['Class', 'Bonds']))
+        self.assertEqual(character.skills, {})
+
+    def test_load_unknown_fields(self):
+        """
+        Tests that asking for a property characters don't have raises an error
+        """
+        with self.assertRaises(MalformedError):
+            BaseCharacter().load_character_from_db(self.character_obj.save(), ['Class', 'Wisdom'])
+
+    def test_load_cached(self):
+        """
+        Tests that a character that has been loaded before is loaded from the cache
+        """
+        db_id = self.character_obj.save()
+        BaseCharacter().load_character_from_db(db_id)
+        hits = Character.cache.memory.hits
+
+        with mock.patch.object(Mongo, 'find_by_id') as find:
+            character = BaseCharacter()
+            character.load_character_from_db(db_id)
+            results = Character.load_characters([db_id])
+
+        self.assertFalse(find.called)
+        self.assertEqual(Character.cache.memory.hits, hits + 2)
+        self.assertEqual(character.get_character(), self.character_obj.get_character())
+        self.assertEqual(results[0].get_character(), self.character_obj.get_character())
+
+    def test_cached_copy(self):
+        """
+        Tests that changing a character loaded from the cache doesn't change the cached copy
+        """
+        db_id = self.character_obj.save()
+        character = BaseCharacter()
+        character.load_character_from_db(db_id)
+        character.skills['Accounting'] = 90
+        character.disorders.append('Phobia')
+
+        other = BaseCharacter()
+        other.load_character_from_db(db_id)
+        self.assertEqual(other.get_character(), self.character_obj.get_character())
+
+    def test_load_missing_once(self):
+        """
+        Tests that an ID that isn't found is remembered, so the database isn't asked about it again
+        until a character is saved with it
+        """
+        missing = '5a' + 'b' * 22  # made in 2018
+        with self.assertRaises(NotFoundError):
+            BaseCharacter().load_character_from_db(missing)
+
+        with mock.patch.object(Mongo, 'find_by_id') as find:
+            with self.assertRaises(NotFoundError):
+                BaseCharacter().load_character_from_db(missing)
+            results = Character.load_characters([missing])
+
+        self.assertFalse(find.called)
+        self.assertIsInstance(results[0], NotFoundError)
+
+        Character.saved_ids.add([missing])
+        self.assertFalse(Character.saved_ids.is_missing(Mongo.to_object_id(missing)))
+
+    def test_character_json(self):
+        """
+        Tests that a character encoded as JSON has exactly the same information as its dictionary
+        """
+        encoded = self.character_obj.get_character_json()
+        self.assertEqual(json.loads(encoded.decode('utf-8')), self.character_obj.get_character())
+
+        fields = ['Stats', 'Bonds']
+        encoded = self.character_obj.get_character_json(fields)
+        self.assertEqual(json.loads(encoded.decode('utf-8')),
+                         self.character_obj.get_character(fields))
+
+    def test_fields_normalized(self):
+        """
+        Tests that asking for the same properties in another order, or more than once, gives the
+        same character
+        """
+        self.assertEqual(Character.normalize_fields(['Stats', 'Class', 'Stats']),
+                         ['Class', 'Stats'])
+        self.assertEqual(Character.required_fields(['Bonds', 'Class', 'Bonds']),
+                         ['Class', 'Bonds', 'Stats'])
+        with self.assertRaises(MalformedError):
+            Character.normalize_fields(['Class', 'Height'])
+
+        encoded = self.character_obj.get_character_json(['Class', 'Stats'])
+        self.assertEqual(self.character_obj.get_character_json(['Stats', 'Class', 'Stats']),
+                         encoded)
+        self.assertEqual(list(json.loads(encoded.decode('utf-8'))), ['Class', 'Stats'])
+
+        db_id = self.character_obj.save()
+        self.assertEqual(Character.load_character_json(db_id, ['Stats', 'Class', 'Class']),
+                         encoded)
+        whole = Character.load_character_json(db_id)
+        fields = list(reversed(Character.CHARACTER_FIELDS)) + ['Class']
+        with mock.patch.object(BaseCharacter, 'load_character_from_db') as load:
+            self.assertIs(Character.load_character_json(db_id, fields), whole)
+        load.assert_not_called()
+
+    def test_load_json_cached(self):
+        """
+        Tests that a whole saved character is only encoded once, and then sent as it was stored
+        """
+        db_id = self.character_obj.save()
+        encoded = Character.load_character_json(db_id)
+
+        with mock.patch.object(BaseCharacter, 'load_character_from_db') as load:
+            self.assertIs(Character.load_character_json(str(db_id)), encoded)
+            Character.load_character_json(db_id, ['Class'])
+
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(json.loads(encoded.decode('utf-8')), self.character_obj.get_character())
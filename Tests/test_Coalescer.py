@@ -0,0 +1,89 @@
+import unittest
+import time
+
+from threading import Event, Lock, Thread
+
+from Lib.Coalescer import Coalescer
+
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.sizes = []
+        self.release = Event()
+        self.release.set()
+        self.lock = Lock()
+
+    def run_batch(self, count):
+        """Records the size of each batch, holding up the first until it's released"""
+        with self.lock:
+            self.sizes.append(count)
+            number = len(self.sizes)
+        if number == 1:
+            self.release.wait(5)
+        return [(number, position) for position in range(count)]
+
+    def concurrent(self, coalescer, count):
+        """Makes a request, then *count* more while it's still being handled"""
+        self.release.clear()
+        results = [None] * (count + 1)
+
+        def work(position):
+            results[position] = coalescer.get()
+
+        first = Thread(target=work, args=(0,))
+        first.start()
+        while not self.sizes:
+            time.sleep(0.001)
+        threads = [Thread(target=work, args=(position,)) for position in range(1, count + 1)]
+        for thread in threads:
+            thread.start()
+        while coalescer.requests < count + 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in [first] + threads:
+            thread.join()
+        return results
+
+    def test_alone(self):
+        """A request with nothing else going on should be run straight away, by itself"""
+        coalescer = Coalescer(self.run_batch, 5, 10)
+
+        self.assertEqual(coalescer.get(), (1, 0))
+        self.assertEqual(self.sizes, [1])
+
+    def test_batch(self):
+        """Requests arriving while another is being handled should be run as one batch, each
+            getting its own result"""
+        coalescer = Coalescer(self.run_batch, 5, 4)
+        results = self.concurrent(coalescer, 4)
+
+        self.assertEqual(self.sizes, [1, 4])
+        self.assertEqual(sorted(results[1:]), [(2, position) for position in range(4)])
+        self.assertEqual(coalescer.stats(), {'requests': 5, 'batches': 2, 'mean_batch': 2.5,
+                                             'largest': 4})
+
+    def test_max_batch(self):
+        """No batch should have more requests than the maximum"""
+        coalescer = Coalescer(self.run_batch, 0.05, 3)
+        results = self.concurrent(coalescer, 7)
+
+        self.assertEqual(sum(self.sizes), 8)
+        self.assertLessEqual(max(self.sizes), 3)
+        self.assertEqual(len(set(results)), 8)
+
+    def test_disabled(self):
+        """Without a window, every request should be run by itself"""
+        coalescer = Coalescer(self.run_batch, 0, 10)
+        self.concurrent(coalescer, 3)
+
+        self.assertEqual(self.sizes, [1, 1, 1, 1])
+
+    def test_error(self):
+        """If a batch can't be run, every request in it should get the error"""
+        def fail(count):
+            raise ValueError('No rules')
+
+        coalescer = Coalescer(fail, 5, 10)
+        with self.assertRaises(ValueError):
+            coalescer.get()
+        self.assertEqual(coalescer.stats()['batches'], 1)
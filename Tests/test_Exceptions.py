@@ -1,6 +1,6 @@
 import unittest
 
-from Lib.Utilities.Exceptions import NotFoundError, MalformedError
+from Lib.Utilities.Exceptions import NotFoundError, MalformedError, ExhaustedError
 
 
 class TestNotFoundError(unittest.TestCase):
@@ -44,3 +44,23 @@ class TestMalformedError(unittest.TestCase):
         except MalformedError as error:
             self.assertEqual(int(error), 400)
 
+
+class TestExhaustedError(unittest.TestCase):
+    def test_raisable(self):
+        """Test that using the exception with the raise keyword raises an actual exception"""
+        with self.assertRaises(ExhaustedError):
+            raise ExhaustedError('This is a test')
+
+    def test_str_representation(self):
+        error_str = 'This is a test'
+        try:
+            raise ExhaustedError(error_str)
+        except ExhaustedError as error:
+            self.assertEqual(str(error), error_str)
+
+    def test_int_representation(self):
+        error_str = 'This is a test'
+        try:
+            raise ExhaustedError(error_str)
+        except ExhaustedError as error:
+            self.assertEqual(int(error), 500)
@@ -1,15 +1,21 @@
 import unittest
+import random
 
 import mongomock
 import operator
 
+from threading import Thread
+
 from os import path
 
 import Lib.Generator as Generator
+import Lib.RuleSet as RuleSet
 import Lib.Utilities.Mongo as Mongo
 
+from Lib.Bonds import BondCatalog
+from Lib.Utilities.Exceptions import ExhaustedError
 from Lib.Utilities.Workspace import parse_json
-from Tests.RandomMock import RandomMock
+from Tests.RandomMock import RandomMock, stat_range_list, sample_range_list
 from Tests.TestData import data_path
 
 
@@ -22,6 +28,7 @@ class TestGenerator(unittest.TestCase):
         cls.mongo = mongomock.MongoClient()['Test']
         cls.mongo_obj.database = cls.mongo
         Generator.Mongo = cls.mongo_obj
+        RuleSet.cache.clear()
         cls.random_mock = RandomMock()
 
         cls.bonds = parse_json(path.join(data_path, 'bonds.json'))[0]
@@ -52,23 +59,21 @@ class TestGenerator(unittest.TestCase):
 
     def setUp(self):
         self.generator = Generator.Generator()
-        self.generator.character.random = self.random_mock
+        self.character = self.generator.new_character(self.random_mock)
 
         self.random_mock.range_state = -1
         self.random_mock.choice_state = -1
-        self.random_mock.sample_state = -1
 
         self.random_mock.range_list = []
         self.random_mock.choice_list = []
-        self.random_mock.sample_list = []
 
     def test_init_classes(self):
         """Initializing the class should have grabbed the classes from the database"""
-        self.assertEqual(self.generator.classes, self.classes)
+        self.assertEqual(list(self.generator.classes), self.classes)
 
     def test_init_packages(self):
         """Initializing the class should have grabbed the packages from the database"""
-        self.assertEqual(self.generator.packages, self.packages)
+        self.assertEqual(list(self.generator.packages), self.packages)
 
     def test_init_defaults(self):
         """Initializing the class should have grabbed the defaults from the database"""
@@ -84,27 +89,45 @@ class TestGenerator(unittest.TestCase):
 
     def test_init_disorders(self):
         """Initializing the class should have grabbed the sub-skills from the database"""
-        self.assertEqual(self.generator.disorders, {
+        self.assertEqual({key: list(value) for key, value in self.generator.disorders.items()}, {
             "Violence": self.violence_disorders,
             "Helplessness": self.helplessness_disorders,
             "Unnatural": self.unnatural_disorders
         })
 
+    def test_new_character_shares_index(self):
+        """Characters should store their skills against the index in the rules"""
+        self.assertIs(self.character.skills.index, self.generator.rules.skill_index)
+
     def test_private_get_bonds_no_class(self):
         """Tests that no class specific bonds will be returned when it's run without a class or
             package"""
-        self.generator._get_bonds()
+        bonds = self.generator._get_bonds(self.character)
 
-        self.assertEqual(self.generator.bonds,
+        self.assertEqual(list(bonds),
                          [bond for bond in self.bonds if bond["Required"] is None])
 
     def test_private_get_bonds_all(self):
         """Tests that all bonds will be returned if the character has the correct prerequisites"""
-        self.generator.character.class_name = "Federal Agent"
-        self.generator.character.package_name = "Office Worker"
-        self.generator._get_bonds()
-
-        self.assertEqual(self.generator.bonds, self.bonds)
+        self.character.class_name = "Federal Agent"
+        self.character.package_name = "Office Worker"
+        bonds = self.generator._get_bonds(self.character)
+
+        self.assertEqual(list(bonds), self.bonds)
+
+    def test_private_get_bonds_no_database(self):
+        """Tests that finding the bonds for a character doesn't touch the database"""
+        self.character.class_name = "Federal Agent"
+        self.character.package_name = "Weasel"
+        self.mongo_obj.database = None
+        try:
+            bonds = self.generator._get_bonds(self.character)
+        finally:
+            self.mongo_obj.database = self.mongo
+
+        self.assertEqual(list(bonds), [bond for bond in self.bonds
+                                       if bond["Required"] is None
+                                       or "Federal Agent" in bond["Required"]])
 
     def test_random_character_class(self):
         """Tests that applying a character class is done randomly and sets the all expected
@@ -113,21 +136,22 @@ class TestGenerator(unittest.TestCase):
         skill_choice = 'Accounting'
         self.random_mock.choice_list = [class_obj for class_obj in self.classes
                                         if class_obj['_id'] == class_name]
-        self.random_mock.sample_list = [[skill_choice]]
-        self.generator.random_character_class()
+        self.random_mock.range_list = sample_range_list(
+            list(self.random_mock.choice_list[0]['Choices']['Skills']), [skill_choice])
+        self.generator.random_character_class(self.character)
 
         with self.subTest(msg='Testing that the class name was correctly set'):
-            self.assertEqual(self.generator.character.class_name, class_name)
+            self.assertEqual(self.character.class_name, class_name)
 
         with self.subTest(msg='Testing the number of bonds matches what\'s expected for the class'):
-            self.assertEqual(self.generator.character.num_bonds, 3)
+            self.assertEqual(self.character.num_bonds, 3)
 
         with self.subTest(msg='Testing that the skill choice went as expected'):
-            self.assertEqual(self.generator.character.skills[skill_choice], 60)
+            self.assertEqual(self.character.skills[skill_choice], 60)
 
         for skill in self.random_mock.choice_list[0]['Skills'].keys():
             with self.subTest(msg='Testing setting the skill: ' + skill):
-                self.assertEqual(self.generator.character.skills[skill],
+                self.assertEqual(self.character.skills[skill],
                                  self.random_mock.choice_list[0]['Skills'][skill])
 
     def test_random_character_package(self):
@@ -135,26 +159,25 @@ class TestGenerator(unittest.TestCase):
         package_name = 'Weasel'
         self.random_mock.choice_list = [package for package in self.packages
                                         if package['_id'] == package_name]
-        self.generator.random_character_package()
+        self.generator.random_character_package(self.character)
 
         for skill in self.random_mock.choice_list[0]['Skills']:
             with self.subTest(msg='Testing setting the skill: ' + skill):
-                self.assertEqual(self.generator.character.skills[skill],
+                self.assertEqual(self.character.skills[skill],
                                  self.default_stats[skill] + 20)
 
     def test_random_character_stats(self):
         """Tests that it correctly sets the stats based on the existing skills"""
-        self.random_mock.range_list = [3, 3, 4, 1, 3, 3, 5, 1, 3, 4, 6, 1, 3, 4, 6, 1, 3, 5, 6, 1,
-                                       3, 6, 6, 1]
-        self.generator.character.num_bonds = 1
-        self.generator.character.skills['Unarmed Combat'] = 99
-        self.generator.character.skills['Melee Weapons'] = 98
-        self.generator.character.skills['Swim'] = 97
-        self.generator.character.skills['Athletics'] = 96
-        self.generator.character.skills['Psychotherapy'] = 95
-        self.generator.random_character_stats()
-
-        self.assertEqual(self.generator.character.stats, {
+        self.random_mock.range_list = stat_range_list([15, 14, 13, 13, 11, 10])
+        self.character.num_bonds = 1
+        self.character.skills['Unarmed Combat'] = 99
+        self.character.skills['Melee Weapons'] = 98
+        self.character.skills['Swim'] = 97
+        self.character.skills['Athletics'] = 96
+        self.character.skills['Psychotherapy'] = 95
+        self.generator.random_character_stats(self.character)
+
+        self.assertEqual(self.character.stats, {
             'Strength': 15,
             'Dexterity': 14,
             'Constitution': 13,
@@ -165,80 +188,99 @@ class TestGenerator(unittest.TestCase):
 
     def test_random_character_bonds_no_bonds(self):
         """Tests the no bonds are added if the character has no capacity for bonds"""
-        self.generator.character.num_bonds = 0
-        self.generator.random_character_bonds()
+        self.character.num_bonds = 0
+        self.generator.random_character_bonds(self.character, BondCatalog(self.bonds))
 
-        self.assertEqual(self.generator.character.bonds, [])
+        self.assertEqual(self.character.bonds, [])
 
     def test_random_character_bonds_one_bond(self):
         """Tests that only one bond is added when the character only has the capacity for one
             bond"""
-        self.generator.character.num_bonds = 1
-        self.random_mock.choice_list = [self.bonds[0]]
-        self.generator.random_character_bonds()
+        self.character.num_bonds = 1
+        self.random_mock.range_list = [0]
+        self.generator.random_character_bonds(self.character, BondCatalog(self.bonds))
 
-        self.assertEqual(self.generator.character.bonds, self.random_mock.choice_list)
+        self.assertEqual(self.character.bonds, [self.bonds[0]])
 
-    def test_random_character_bonds_ignore_repeats(self):
-        """Tests that the same bond cannot be added multiple times"""
-        self.generator.character.num_bonds = 2
-        self.random_mock.choice_list = [self.bonds[0], self.bonds[0], self.bonds[-1]]
-        self.generator.random_character_bonds()
+    def test_random_character_bonds_no_repeats(self):
+        """Tests that the same bond cannot be added multiple times, even when the same random
+            numbers keep coming up"""
+        self.character.num_bonds = 3
+        self.random_mock.range_list = [0]
+        self.generator.random_character_bonds(self.character, BondCatalog(self.bonds))
 
-        self.assertEqual(self.generator.character.bonds, [self.bonds[0], self.bonds[-1]])
+        names = [bond['_id'] for bond in self.character.bonds]
+        self.assertEqual(len(set(names)), 3)
 
     def test_random_character_bonds_ignore_invalid(self):
-        """Tests that invalid bonds will be ignored"""
-        self.generator.character.num_bonds = 2
-        self.random_mock.choice_list = [self.bonds[0], {"_id": "Fake"}, self.bonds[-1]]
-        self.generator.random_character_bonds()
+        """Tests that bonds without a type will be ignored while there are types left to cover"""
+        self.character.num_bonds = 2
+        self.random_mock.range_list = [0, 0]
+        self.generator.random_character_bonds(
+            self.character, BondCatalog([self.bonds[0], {"_id": "Fake"}, self.bonds[-1]]))
 
-        self.assertEqual(self.generator.character.bonds, [self.bonds[0], self.bonds[-1]])
+        self.assertEqual(self.character.bonds, [self.bonds[0], self.bonds[-1]])
 
     def test_random_character_bonds_ignore_same_type(self):
         """Tests that the same type of bond cannot be added multiple times"""
-        self.generator.character.num_bonds = 2
-        self.random_mock.choice_list = [self.bonds[0], self.bonds[1], self.bonds[-1]]
-        self.generator.random_character_bonds()
+        self.character.num_bonds = 2
+        self.random_mock.range_list = [0, 0]
+        self.generator.random_character_bonds(self.character, BondCatalog(self.bonds))
 
-        self.assertEqual(self.generator.character.bonds, [self.bonds[0], self.bonds[-1]])
+        # bonds[1] is the only other work bond, so the first bond of another type comes next
+        self.assertEqual(self.character.bonds, [self.bonds[0], self.bonds[2]])
 
     def test_random_character_bonds_add_all_bonds(self):
         """Tests that all bonds become fair game once all types are full"""
-        self.generator.character.num_bonds = len(self.bonds)
-        self.random_mock.choice_list = self.bonds
-        self.generator.random_character_bonds()
+        self.character.num_bonds = len(self.bonds)
+        self.random_mock.range_list = [0]
+        self.generator.random_character_bonds(self.character, BondCatalog(self.bonds))
 
-        self.assertEqual(sorted(self.generator.character.bonds, key=operator.itemgetter('_id')),
+        self.assertEqual(sorted(self.character.bonds, key=operator.itemgetter('_id')),
                          sorted(self.bonds, key=operator.itemgetter('_id')))
 
+    def test_random_character_bonds_missing_types(self):
+        """Tests that bonds can still be picked when the types they'd need can't be covered"""
+        self.character.num_bonds = 2
+        self.random_mock.range_list = [0]
+        self.generator.random_character_bonds(self.character, BondCatalog(self.bonds[:2]))
+
+        self.assertEqual(self.character.bonds, self.bonds[:2])
+
+    def test_random_character_bonds_not_enough(self):
+        """Tests that asking for more bonds than exist fails right away"""
+        self.character.num_bonds = len(self.bonds) + 1
+        self.random_mock.range_list = [0]
+
+        with self.assertRaises(ExhaustedError):
+            self.generator.random_character_bonds(self.character, BondCatalog(self.bonds))
+
     def test_random_damaged_veteran_violence(self):
         self.random_mock.choice_list = ['Violence']
-        self.generator.random_damaged_veteran()
+        self.generator.random_damaged_veteran(self.character)
 
-        self.assertEqual(self.generator.character.damaged_veteran, 'Extreme Violence')
+        self.assertEqual(self.character.damaged_veteran, 'Extreme Violence')
 
     def test_random_damaged_veteran_helpless(self):
         self.random_mock.choice_list = ['Helpless']
-        self.generator.random_damaged_veteran()
+        self.generator.random_damaged_veteran(self.character)
 
-        self.assertEqual(self.generator.character.damaged_veteran, 'Captivity or Imprisonment')
+        self.assertEqual(self.character.damaged_veteran, 'Captivity or Imprisonment')
 
     def test_random_damaged_veteran_unnatural(self):
         self.random_mock.choice_list = ['Unnatural', self.generator.disorders['Unnatural'][0]]
-        self.generator.random_damaged_veteran()
+        self.generator.random_damaged_veteran(self.character)
 
-        self.assertEqual(self.generator.character.damaged_veteran,
+        self.assertEqual(self.character.damaged_veteran,
                          'Things Man Was Not Meant to Know')
 
     def test_random_damaged_veteran_experience(self):
         self.random_mock.choice_list = ['Hard Experience']
-        self.random_mock.sample_list = [["Alertness", "Athletics", "Bureaucracy",
-                                         "Computer Science"]]
-        self.generator.character.bonds = [{"_id": "Wife"}, {"_id": "Mom"}]
-        self.generator.random_damaged_veteran()
+        self.random_mock.range_list = [0, 1, 2, 3]
+        self.character.bonds = [{"_id": "Wife"}, {"_id": "Mom"}]
+        self.generator.random_damaged_veteran(self.character)
 
-        self.assertEqual(self.generator.character.damaged_veteran, 'Hard Experience')
+        self.assertEqual(self.character.damaged_veteran, 'Hard Experience')
 
     def test_generate(self):
         """Tests that a random character is generated"""
@@ -249,11 +291,10 @@ class TestGenerator(unittest.TestCase):
                                         if class_obj['_id'] == class_name]
         self.random_mock.choice_list.extend([package for package in self.packages
                                              if package['_id'] == package_name])
-        self.random_mock.choice_list.extend(self.bonds[-3:])
-        self.random_mock.range_list = [5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1,
-                                       5, 5, 5, 1, 1]
-        self.random_mock.sample_list = [[skill_choice]]
-        character = self.generator.generate()
+        self.random_mock.range_list = sample_range_list(
+            list(self.random_mock.choice_list[0]['Choices']['Skills']), [skill_choice])
+        self.random_mock.range_list += stat_range_list([15] * 6) + [2, 3, 1, 1]
+        character = self.generator.generate(self.random_mock)
 
         expected_stats = {
             'Strength': 15,
@@ -319,12 +360,11 @@ class TestGenerator(unittest.TestCase):
                                         if class_obj['_id'] == class_name]
         self.random_mock.choice_list.extend([package for package in self.packages
                                              if package['_id'] == package_name])
-        self.random_mock.choice_list.extend(self.bonds[-3:])
-        self.random_mock.range_list = [5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1,
-                                       5, 5, 5, 1, 2]
-        self.random_mock.sample_list = [[skill_choice]]
+        self.random_mock.range_list = sample_range_list(
+            list(self.random_mock.choice_list[0]['Choices']['Skills']), [skill_choice])
+        self.random_mock.range_list += stat_range_list([15] * 6) + [2, 3, 1, 2]
         self.random_mock.choice_list.append('Violence')
-        self.generator.generate()
+        self.generator.generate(self.random_mock)
 
         with self.subTest(msg='Testing that stats are set correctly'):
             self.assertEqual(self.generator.character.stats, {
@@ -366,6 +406,42 @@ class TestGenerator(unittest.TestCase):
         with self.subTest('Checking that the type of damaged veteran was set'):
             self.assertEqual(self.generator.character.damaged_veteran, 'Extreme Violence')
 
+    def test_generate_does_not_share_state(self):
+        """Tests that each call to generate works on its own, brand new, character"""
+        first = self.generator.create_character(random.Random(1))
+        second = self.generator.create_character(random.Random(1))
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first.get_character(), second.get_character())
+
+    def test_generate_threads(self):
+        """Tests that one generator can be used by many threads at once, with each thread getting
+            the same characters it would have gotten by itself"""
+        expected = [self.generator.generate(random.Random(seed)) for seed in range(16)]
+        results = [None] * len(expected)
+
+        def worker(index):
+            results[index] = self.generator.generate(random.Random(index))
+
+        threads = [Thread(target=worker, args=(index,)) for index in range(len(expected))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, expected)
+
+    def test_character_is_per_thread(self):
+        """Tests that the last generated character is only visible to the thread that made it"""
+        self.generator.generate(random.Random(1))
+        seen = []
+        thread = Thread(target=lambda: seen.append(self.generator.character))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(seen[0], self.generator.character)
+        self.assertEqual(seen[0].get_class(), '')
+
     def test_save_character(self):
         """Tests saving a character."""
         class_name = 'Federal Agent'
@@ -375,11 +451,10 @@ class TestGenerator(unittest.TestCase):
                                         if class_obj['_id'] == class_name]
         self.random_mock.choice_list.extend([package for package in self.packages
                                              if package['_id'] == package_name])
-        self.random_mock.choice_list.extend(self.bonds[-3:])
-        self.random_mock.range_list = [5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1,
-                                       5, 5, 5, 1, 1]
-        self.random_mock.sample_list = [[skill_choice]]
-        self.generator.generate()
+        self.random_mock.range_list = sample_range_list(
+            list(self.random_mock.choice_list[0]['Choices']['Skills']), [skill_choice])
+        self.random_mock.range_list += stat_range_list([15] * 6) + [2, 3, 1, 1]
+        self.generator.generate(self.random_mock)
 
         character_id = self.generator.save_character()
 
@@ -427,6 +502,7 @@ class TestGeneratorOGL(unittest.TestCase):
         cls.mongo = mongomock.MongoClient()['Test']
         cls.mongo_obj.database = cls.mongo
         Generator.Mongo = cls.mongo_obj
+        RuleSet.cache.clear()
 
         cls.classes = parse_json(path.join(data_path, 'classes.json'))[0]
         cls.classes[0]['open'] = True
@@ -460,8 +536,17 @@ class TestGeneratorOGL(unittest.TestCase):
 
     def test_init_classes(self):
         """Initializing the class should have grabbed the classes from the database"""
-        self.assertEqual(self.generator.classes, [self.classes[0]])
+        self.assertEqual(list(self.generator.classes), [self.classes[0]])
 
     def test_init_packages(self):
         """Initializing the class should have grabbed the packages from the database"""
-        self.assertEqual(self.generator.packages, [self.packages[0]])
+        self.assertEqual(list(self.generator.packages), [self.packages[0]])
+
+    def test_shared_rules(self):
+        """Generators should share the cached snapshot of the rules rather than loading their own"""
+        self.assertIs(Generator.Generator(True).rules, self.generator.rules)
+
+    def test_rules_by_reference(self):
+        """Generators should use whatever snapshot of the rules they're given"""
+        rules = RuleSet.RuleSet.load(False)
+        self.assertIs(Generator.Generator(rules=rules).rules, rules)
@@ -0,0 +1,154 @@
+import unittest
+import warnings
+
+from os import path
+
+from Lib.Plans import ClassPlan, PackagePlan, PACKAGE_BONUS
+from Lib.Utilities.Exceptions import MalformedError
+from Lib.Utilities.Workspace import parse_json
+from Tests.TestData import data_path
+
+
+class TestPlans(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.defaults = parse_json(path.join(data_path, 'default_stats.json'))[0]
+        cls.sub_skills = parse_json(path.join(data_path, 'sub_skills.json'))[0]
+        cls.classes = parse_json(path.join(data_path, 'classes.json'))[0]
+        cls.packages = parse_json(path.join(data_path, 'packages.json'))[0]
+
+    def setUp(self):
+        self.class_obj = {
+            "_id": "Test",
+            "Skills": {
+                "Alertness": 40,
+                "Foreign Language": 50
+            },
+            "Choices": {
+                "Number": 2,
+                "Skills": {
+                    "Accounting": 50,
+                    "Art": 40
+                },
+                "Subskills": [
+                    {
+                        "Skill": "Craft",
+                        "Sub": "Mechanic",
+                        "Value": 30
+                    }
+                ]
+            },
+            "Subskills": [
+                {
+                    "Skill": "Science",
+                    "Sub": "Biology",
+                    "Value": 40
+                },
+                {
+                    "Skill": "Pilot",
+                    "Sub": "",
+                    "Value": 30
+                }
+            ],
+            "Bonds": 4
+        }
+        self.package = {
+            "_id": "Test",
+            "Skills": ["Alertness", "Alertness", "Craft"],
+            "Subskills": [
+                {
+                    "Skill": "Science",
+                    "Sub": "Biology"
+                }
+            ],
+            "Choices": {
+                "Number": 1,
+                "All": False,
+                "List": ["Accounting", "Art"]
+            }
+        }
+
+    def test_class_plan(self):
+        """The plan should split the class into fixed skills, random sub-skills and choices"""
+        plan = ClassPlan(self.class_obj, self.defaults, self.sub_skills)
+
+        with self.subTest(msg='Testing the name and bonds'):
+            self.assertEqual((plan.name, plan.bonds), ('Test', 4))
+
+        with self.subTest(msg='Testing the fixed skills'):
+            self.assertEqual(plan.skills, {'Alertness': 40, 'Science (Biology)': 40})
+            self.assertEqual(plan.sub_skills, (('Science', 'Biology'),))
+
+        with self.subTest(msg='Testing the random sub-skills'):
+            self.assertEqual(plan.random_sub_skills, (('Foreign Language', 50), ('Pilot', 30)))
+
+        with self.subTest(msg='Testing the choices'):
+            self.assertEqual(plan.num_choices, 2)
+            self.assertEqual(sorted(plan.skill_choices), [('Accounting', 50), ('Art', 40)])
+            self.assertEqual(plan.sub_skill_choices, (('Craft', 'Mechanic', 30),))
+
+    def test_package_plan(self):
+        """The plan should add up the bonus for every fixed skill"""
+        plan = PackagePlan(self.package, self.defaults, self.sub_skills)
+
+        with self.subTest(msg='Testing the fixed skills'):
+            self.assertEqual(plan.skills, {'Alertness': 2 * PACKAGE_BONUS,
+                                           'Science (Biology)': PACKAGE_BONUS})
+            self.assertEqual(plan.sub_skills, (('Science', 'Biology'),))
+
+        with self.subTest(msg='Testing the random sub-skills'):
+            self.assertEqual(plan.random_sub_skills, ('Craft',))
+
+        with self.subTest(msg='Testing the choices'):
+            self.assertEqual((plan.num_choices, plan.all_skills, plan.skill_choices),
+                             (1, False, ('Accounting', 'Art')))
+
+    def test_unknown_skill_ignored(self):
+        """Skills that don't exist should be left out with a warning"""
+        self.package['Skills'].append('Unarmed')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            plan = PackagePlan(self.package, self.defaults, self.sub_skills)
+
+        self.assertNotIn('Unarmed', plan.skills)
+        self.assertEqual(len(caught), 1)
+        self.assertIn('Unarmed', str(caught[0].message))
+
+    def test_missing_property(self):
+        """A class without one of its properties should be rejected"""
+        del self.class_obj['Bonds']
+
+        with self.assertRaises(MalformedError):
+            ClassPlan(self.class_obj, self.defaults, self.sub_skills)
+
+    def test_wrong_type(self):
+        """A skill value that isn't a number should be rejected"""
+        self.class_obj['Skills']['Alertness'] = '40'
+
+        with self.assertRaises(MalformedError):
+            ClassPlan(self.class_obj, self.defaults, self.sub_skills)
+
+    def test_too_many_choices(self):
+        """A package with more choices than options should be rejected"""
+        self.package['Choices']['Number'] = 3
+
+        with self.assertRaises(MalformedError):
+            PackagePlan(self.package, self.defaults, self.sub_skills)
+
+    def test_all_choices_unlimited(self):
+        """A package choosing from all skills can have any number of choices"""
+        self.package['Choices'] = {"Number": 3, "All": True, "List": []}
+
+        self.assertEqual(PackagePlan(self.package, self.defaults, self.sub_skills).num_choices, 3)
+
+    def test_game_data(self):
+        """Every class and package in the test data should compile"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for class_obj in self.classes:
+                with self.subTest(msg='Testing ' + class_obj['_id']):
+                    ClassPlan(class_obj, self.defaults, self.sub_skills)
+            for package in self.packages:
+                with self.subTest(msg='Testing ' + package['_id']):
+                    PackagePlan(package, self.defaults, self.sub_skills)
@@ -0,0 +1,136 @@
+import unittest
+import time
+
+from unittest import mock
+from itertools import count
+from threading import Condition
+
+from Lib.Pool import CharacterPool
+
+
+def wait_for(condition, timeout=2):
+    """Waits for the background workers to do something, giving whether they did it in time"""
+    stop = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > stop:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class CountingCondition(Condition):
+    """A condition that counts how many times it's been entered, to catch workers spinning"""
+    def __init__(self):
+        super().__init__()
+        self.entered = 0
+
+    def __enter__(self):
+        self.entered += 1
+        return super().__enter__()
+
+
+class TestCharacterPool(unittest.TestCase):
+    def setUp(self):
+        self.numbers = count()
+        self.pool = CharacterPool(lambda: next(self.numbers), 5, 2)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_disabled(self):
+        """A pool with no room should never start workers or hold characters"""
+        generate = mock.Mock()
+        pool = CharacterPool(generate, 0)
+
+        self.assertIsNone(pool.get())
+        self.assertFalse(generate.called)
+        self.assertEqual(pool.stats()['fallbacks'], 0)
+
+    def test_fallback(self):
+        """Taking from the pool before the workers have filled it should fall back, not wait"""
+        pool = CharacterPool(lambda: time.sleep(0.2), 5, 2)
+        self.assertIsNone(pool.get())
+        pool.stop()
+
+        self.assertEqual(pool.stats()['fallbacks'], 1)
+
+    def test_fill(self):
+        """The workers should fill the pool up to the high watermark, and no further"""
+        self.pool.get()
+        self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+        time.sleep(0.05)
+
+        self.assertEqual(len(self.pool), 5)
+        self.assertEqual(self.pool.stats()['generated'], 5)
+
+    def test_low_watermark_clamped(self):
+        """The low watermark should always be below the high watermark"""
+        self.assertEqual(CharacterPool(lambda: 0, 5, 5).low, 4)
+        self.assertEqual(CharacterPool(lambda: 0, 5, 9).low, 4)
+        self.assertEqual(CharacterPool(lambda: 0, 5, 3).low, 3)
+        self.assertEqual(CharacterPool(lambda: 0, 0, 3).low, 0)
+
+    def test_full_pool_parks(self):
+        """Once the pool is full the workers should wait, even if the low watermark is as high as
+            the high watermark"""
+        self.pool.low = self.pool.high
+        self.pool._wake = CountingCondition()
+
+        self.pool.get()
+        self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+        time.sleep(0.05)
+        entered = self.pool._wake.entered
+        time.sleep(0.1)
+
+        self.assertEqual(self.pool._wake.entered, entered)
+        self.assertEqual(self.pool.stats()['generated'], 5)
+
+    def test_refill(self):
+        """Characters should come out in order, and the pool be refilled once it's running low"""
+        self.pool.get()
+        self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+
+        self.assertEqual([self.pool.get() for _ in range(2)], [0, 1])
+        time.sleep(0.05)
+        self.assertEqual(len(self.pool), 3)
+
+        self.pool.get()
+        self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+        self.assertEqual(self.pool.stats()['hits'], 3)
+
+    def test_errors(self):
+        """A worker that fails to generate a character should count the error and keep going"""
+        def generate():
+            number = next(self.numbers)
+            if number == 0:
+                raise ValueError('No rules')
+            return number
+
+        pool = CharacterPool(generate, 2, 0)
+        with mock.patch('Lib.Pool.ERROR_BACKOFF', 0.01):
+            pool.get()
+            self.assertTrue(wait_for(lambda: len(pool) == 2))
+            self.assertEqual(pool.get(), 1)
+        pool.stop()
+
+        self.assertEqual(pool.stats()['errors'], 1)
+
+    def test_fork(self):
+        """A process that didn't start the workers should throw away the characters it inherited"""
+        self.pool.get()
+        self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.pool.get()
+            self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+            self.assertGreaterEqual(self.pool.get(), 5)
+
+    def test_stats(self):
+        """The stats should show the depth of the pool and how quickly it's refilled"""
+        self.pool.get()
+        self.assertTrue(wait_for(lambda: len(self.pool) == 5))
+
+        stats = self.pool.stats()
+        self.assertEqual((stats['depth'], stats['low'], stats['high']), (5, 2, 5))
+        self.assertEqual((stats['fallbacks'], stats['errors']), (1, 0))
+        self.assertGreater(stats['refill_rate'], 0)
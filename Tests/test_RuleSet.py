@@ -0,0 +1,220 @@
+import unittest
+
+import mongomock
+
+from os import path
+from unittest import mock
+
+import Lib.RuleSet as RuleSet
+import Lib.Utilities.Mongo as Mongo
+
+from Lib.Utilities.Exceptions import MalformedError
+from Lib.Utilities.Workspace import parse_json
+from Tests.TestData import data_path
+
+
+class FakeClock(object):
+    """A clock that only moves when told to"""
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        return self.time
+
+
+class TestRuleSet(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Populates a mock Mongo database with the test data"""
+        cls.mongo_obj = Mongo
+        cls.mongo = mongomock.MongoClient()['Test']
+        cls.mongo_obj.database = cls.mongo
+
+        cls.classes = parse_json(path.join(data_path, 'classes.json'))[0]
+        cls.classes[0]['open'] = True
+        cls.packages = parse_json(path.join(data_path, 'packages.json'))[0]
+        cls.default_stats = parse_json(path.join(data_path, 'default_stats.json'))[0]
+        cls.skill_mapping = parse_json(path.join(data_path, 'skill_mapping.json'))[0]
+        cls.sub_skills = parse_json(path.join(data_path, 'sub_skills.json'))[0]
+        cls.violence_disorders = parse_json(path.join(data_path, 'violence_disorders.json'))[0]
+        cls.bonds = parse_json(path.join(data_path, 'bonds.json'))[0]
+
+        cls.mongo_obj.insert(cls.bonds, 'bonds')
+        cls.mongo_obj.insert(cls.classes, 'classes')
+        cls.mongo_obj.insert(cls.packages, 'packages')
+        cls.mongo_obj.insert(cls.default_stats, 'default_stats')
+        cls.mongo_obj.insert(cls.skill_mapping, 'skill_mapping')
+        cls.mongo_obj.insert(cls.sub_skills, 'sub_skills')
+        cls.mongo_obj.insert(cls.violence_disorders, 'disorders')
+
+        cls.default_stats.pop('_id')
+        cls.skill_mapping.pop('_id')
+        cls.sub_skills.pop('_id')
+
+    def setUp(self):
+        self.Mongo = Mongo
+        self.Mongo.database = self.mongo
+        self.clock = FakeClock()
+        self.cache = RuleSet.RuleSetCache(60, self.clock)
+
+    def test_load(self):
+        """Loading should grab all of the rules from the database"""
+        rules = RuleSet.RuleSet.load()
+
+        with self.subTest(msg='Testing the classes'):
+            self.assertEqual(list(rules.classes), self.classes)
+
+        with self.subTest(msg='Testing the packages'):
+            self.assertEqual(list(rules.packages), self.packages)
+
+        with self.subTest(msg='Testing the defaults'):
+            self.assertEqual(dict(rules.defaults), self.default_stats)
+
+        with self.subTest(msg='Testing the skill mappings'):
+            self.assertEqual(dict(rules.skill_mapping), self.skill_mapping)
+
+        with self.subTest(msg='Testing the sub-skills'):
+            self.assertEqual(dict(rules.sub_skills), self.sub_skills)
+
+        with self.subTest(msg='Testing the disorders'):
+            self.assertEqual(list(rules.disorders['Violence']), self.violence_disorders)
+            self.assertEqual(list(rules.disorders['Unnatural']), [])
+
+    def test_bonds_for_nothing(self):
+        """A character without a class or package should only get bonds without requirements"""
+        rules = RuleSet.RuleSet.load()
+
+        self.assertEqual(list(rules.bonds_for()),
+                         [bond for bond in self.bonds if bond['Required'] is None])
+
+    def test_bonds_for_class_and_package(self):
+        """Bonds requiring the class or the package should be included, in database order"""
+        rules = RuleSet.RuleSet.load()
+        expected = [bond for bond in self.bonds if bond['Required'] is None
+                    or 'Federal Agent' in bond['Required'] or 'Office Worker' in bond['Required']]
+
+        self.assertEqual(list(rules.bonds_for('Federal Agent', 'Office Worker')), expected)
+
+    def test_bonds_for_matches_query(self):
+        """The index should give exactly what the old per-character query did for every
+            combination of class and package"""
+        rules = RuleSet.RuleSet.load()
+        for class_obj in self.classes:
+            for package in self.packages:
+                names = [class_obj['_id'], package['_id']]
+                with self.subTest(msg='Testing {} and {}'.format(*names)):
+                    expected = Mongo.find_subset('bonds', {"Required": {"$in": [None] + names}})
+                    self.assertEqual(list(rules.bonds_for(*names)), expected)
+
+    def test_bonds_for_precomputed(self):
+        """Every class and package combination in the rules should already have its bonds worked
+            out, and repeated lookups should give the same object"""
+        rules = RuleSet.RuleSet.load()
+        class_name, package_name = self.classes[0]['_id'], self.packages[0]['_id']
+
+        self.assertIn((class_name, package_name), rules._bond_views)
+        self.assertIs(rules.bonds_for(class_name, package_name),
+                      rules.bonds_for(class_name, package_name))
+
+    def test_plans(self):
+        """Every class and package should be compiled into a plan when the rules are loaded"""
+        rules = RuleSet.RuleSet.load()
+
+        self.assertEqual(sorted(rules.class_plans), sorted(c['_id'] for c in self.classes))
+        self.assertEqual(sorted(rules.package_plans), sorted(p['_id'] for p in self.packages))
+
+    def test_skill_index(self):
+        """Every default skill, sub-skill and skill named in a plan should have a position"""
+        rules = RuleSet.RuleSet.load()
+        index = rules.skill_index
+
+        self.assertEqual(index.names[:index.default_count], list(self.default_stats))
+        for skill, options in self.sub_skills.items():
+            for sub in options:
+                self.assertIn('{} ({})'.format(skill, sub), index.positions)
+        for plan in rules.class_plans.values():
+            for skill in plan.skills:
+                self.assertIn(skill, index.positions)
+
+    def test_malformed_class(self):
+        """A snapshot with a broken class shouldn't be built"""
+        with self.assertRaises(MalformedError):
+            RuleSet.RuleSet([{'_id': 'Broken'}], [], self.default_stats, {}, self.sub_skills,
+                            self.skill_mapping)
+
+    def test_load_open_gaming_only(self):
+        """Loading only open gaming content should leave out everything else"""
+        rules = RuleSet.RuleSet.load(True)
+
+        self.assertEqual(list(rules.classes), [self.classes[0]])
+        self.assertTrue(rules.open_gaming_only)
+
+    def test_load_error(self):
+        """A query failing should raise its own error, not one about the missing results"""
+        error = MalformedError('Unsupported query operator')
+        with mock.patch.object(Mongo, 'find_subset', side_effect=error):
+            with self.assertRaises(MalformedError) as context:
+                RuleSet.RuleSet.load()
+        self.assertIs(context.exception, error)
+
+    def test_immutable(self):
+        """The snapshot shouldn't allow its contents to be changed"""
+        rules = RuleSet.RuleSet.load()
+
+        with self.assertRaises(TypeError):
+            rules.defaults['Accounting'] = 99
+
+        with self.assertRaises(AttributeError):
+            rules.classes = []
+
+    def test_cache_reuses_snapshot(self):
+        """The cache should only load the rules once while they are fresh"""
+        rules = self.cache.get()
+        self.clock.time = 59
+
+        self.assertIs(self.cache.get(), rules)
+
+    def test_cache_separate_open_gaming(self):
+        """Open gaming and full content should be cached separately"""
+        self.assertIsNot(self.cache.get(True), self.cache.get(False))
+        self.assertTrue(self.cache.get(True).open_gaming_only)
+
+    def test_cache_expiry(self):
+        """The cache should reload the rules once they are older than the time to live"""
+        rules = self.cache.get()
+        self.clock.time = 60
+
+        self.assertIsNot(self.cache.get(), rules)
+
+    def test_cache_no_expiry(self):
+        """The cache should never reload the rules on its own if there's no time to live"""
+        self.cache.ttl = None
+        rules = self.cache.get()
+        self.clock.time = 10 ** 9
+
+        self.assertIs(self.cache.get(), rules)
+
+    def test_cache_refresh(self):
+        """Refreshing should reload every snapshot that has been loaded, even fresh ones"""
+        rules = self.cache.get()
+        open_rules = self.cache.get(True)
+        self.cache.refresh()
+
+        self.assertIsNot(self.cache.get(), rules)
+        self.assertIsNot(self.cache.get(True), open_rules)
+
+    def test_cache_refresh_one(self):
+        """Refreshing one snapshot should leave the others alone"""
+        rules = self.cache.get()
+        open_rules = self.cache.get(True)
+        self.cache.refresh(True)
+
+        self.assertIs(self.cache.get(), rules)
+        self.assertIsNot(self.cache.get(True), open_rules)
+
+    def test_cache_clear(self):
+        """Clearing the cache should force the rules to be loaded again"""
+        rules = self.cache.get()
+        self.cache.clear()
+
+        self.assertIsNot(self.cache.get(), rules)
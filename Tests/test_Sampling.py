@@ -0,0 +1,184 @@
+import unittest
+import random
+
+from collections import Counter
+from fractions import Fraction
+from itertools import permutations, product
+
+from Lib.Sampling import AliasTable, RemainingPool, STAT_COUNTS, stat_sampler, sample, \
+    sample_indices
+from Lib.Utilities.Exceptions import ExhaustedError
+
+
+def roll_stat(rng):
+    """The classic 4d6 drop lowest roll"""
+    rolls = [rng.randrange(1, 7) for _ in range(4)]
+    return sum(sorted(rolls, reverse=True)[:3])
+
+
+def rejection_stats(floor, rng):
+    """The original way of getting stats above a floor: re-roll all six until they get there"""
+    die_rolls = sorted([roll_stat(rng) for _ in range(6)], reverse=True)
+    while sum(die_rolls) < floor:
+        die_rolls = sorted([roll_stat(rng) for _ in range(6)], reverse=True)
+    return tuple(die_rolls)
+
+
+def chi_squared(first, second):
+    """The two sample chi-squared statistic, and its degrees of freedom, for two Counters"""
+    first_total = sum(first.values())
+    second_total = sum(second.values())
+    statistic = 0
+    keys = set(first.keys()) | set(second.keys())
+    for key in keys:
+        expected = (first[key] + second[key]) / (first_total + second_total)
+        for observed, total in ((first[key], first_total), (second[key], second_total)):
+            statistic += (observed - expected * total) ** 2 / (expected * total)
+    return statistic, len(keys) - 1
+
+
+class TestAliasTable(unittest.TestCase):
+    def test_exact(self):
+        """Every column of the table should add up to exactly the weights it was built from"""
+        weights = [1, 7, 3, 13, 2, 2]
+        table = AliasTable(list('abcdef'), weights)
+        probabilities = Counter()
+        for index, outcome in enumerate(table.outcomes):
+            accept = Fraction(table.thresholds[index], table.total)
+            probabilities[outcome] += accept / len(weights)
+            probabilities[table.outcomes[table.aliases[index]]] += (1 - accept) / len(weights)
+
+        for outcome, weight in zip('abcdef', weights):
+            with self.subTest(msg='Testing outcome {}'.format(outcome)):
+                self.assertEqual(probabilities[outcome], Fraction(weight, sum(weights)))
+
+    def test_empty(self):
+        """Building a table with nothing in it should fail"""
+        with self.assertRaises(ExhaustedError):
+            AliasTable([], [])
+
+
+class TestStatSampler(unittest.TestCase):
+    def test_stat_counts(self):
+        """The distribution of a single stat should match brute force counting"""
+        counts = Counter(sum(rolls) - min(rolls) for rolls in product(range(1, 7), repeat=4))
+
+        self.assertEqual(STAT_COUNTS, dict(counts))
+        self.assertEqual(sum(STAT_COUNTS.values()), 6 ** 4)
+
+    def test_floor_respected(self):
+        """Every set of stats should be sorted and add up to at least the floor"""
+        rng = random.Random(0)
+        for floor in (68, 80):
+            sampler = stat_sampler(floor)
+            for _ in range(1000):
+                rolls = sampler.draw(rng)
+                self.assertGreaterEqual(sum(rolls), floor)
+                self.assertEqual(list(rolls), sorted(rolls, reverse=True))
+
+    def test_cached(self):
+        """The sampler for a floor should only be built once"""
+        self.assertIs(stat_sampler(68), stat_sampler(68))
+
+    def test_impossible_floor(self):
+        """A floor no set of stats can reach should fail right away"""
+        with self.assertRaises(ExhaustedError):
+            stat_sampler(109)
+
+    def test_same_distribution(self):
+        """The sampler should give the same distribution as re-rolling until the floor is met"""
+        trials = 20000
+        for floor in (68, 80):
+            rng = random.Random(floor)
+            old = [rejection_stats(floor, rng) for _ in range(trials)]
+            sampler = stat_sampler(floor)
+            new = [sampler.draw(rng) for _ in range(trials)]
+
+            for name, summary in (('total', sum), ('best stat', max), ('worst stat', min)):
+                with self.subTest(msg='Testing the {} with a floor of {}'.format(name, floor)):
+                    statistic, freedom = chi_squared(Counter(map(summary, old)),
+                                                     Counter(map(summary, new)))
+                    # far beyond the 99.9th percentile of the chi-squared distribution
+                    self.assertLess(statistic, freedom + 5 * (2 * freedom) ** 0.5)
+
+
+class TestSample(unittest.TestCase):
+    def test_distinct(self):
+        """Every position picked should be different, and in range"""
+        rng = random.Random(0)
+        for _ in range(200):
+            picked = sample_indices(1000, 10, rng)
+            self.assertEqual(len(set(picked)), 10)
+            self.assertTrue(all(0 <= position < 1000 for position in picked))
+
+    def test_everything(self):
+        """Picking everything should give every position exactly once"""
+        self.assertEqual(sorted(sample_indices(50, 50, random.Random(0))), list(range(50)))
+
+    def test_too_many(self):
+        """Picking more than there are should fail"""
+        with self.assertRaises(ExhaustedError):
+            sample_indices(3, 4, random.Random(0))
+
+    def test_none(self):
+        """Picking nothing shouldn't use any random numbers"""
+        self.assertEqual(sample(['a', 'b'], 0, None), [])
+
+    def test_uniform(self):
+        """Every ordered pick of two from four should be equally likely"""
+        trials = 24000
+        rng = random.Random(1)
+        counts = Counter(tuple(sample('abcd', 2, rng)) for _ in range(trials))
+
+        self.assertEqual(set(counts.keys()), set(permutations('abcd', 2)))
+        statistic, freedom = chi_squared(counts, Counter({key: trials // 12 for key in counts}))
+        self.assertLess(statistic, freedom + 5 * (2 * freedom) ** 0.5)
+
+
+class TestRemainingPool(unittest.TestCase):
+    def test_taken_left_out_and_repeats_kept(self):
+        """Taken options shouldn't be in the pool and repeated options should be in it as often as
+            they're repeated"""
+        pool = RemainingPool(['a', 'b', 'c', 'b'], ['a'])
+
+        self.assertEqual(sorted(pool.options), ['b', 'b', 'c'])
+        self.assertEqual(len(pool), 2)
+        self.assertNotIn('a', pool)
+
+    def test_discard_repeats(self):
+        """Discarding a repeated option should remove every copy and keep the rest findable"""
+        pool = RemainingPool('abacbda')
+        pool.discard('a')
+
+        self.assertEqual(sorted(pool.options), list('bbcd'))
+        for option, positions in pool.positions.items():
+            self.assertEqual([pool.options[position] for position in positions],
+                             [option] * len(positions))
+
+    def test_draw_weighted_by_repeats(self):
+        """Repeated options should be drawn as often as they would be from the full list"""
+        trials = 6000
+        rng = random.Random(2)
+        counts = Counter(RemainingPool('abb').draw(rng) for _ in range(trials))
+
+        statistic, freedom = chi_squared(counts, Counter({'a': trials // 3, 'b': 2 * trials // 3}))
+        self.assertLess(statistic, freedom + 5 * (2 * freedom) ** 0.5)
+
+    def test_discard(self):
+        """Discarding should remove the option and keep every other option findable"""
+        pool = RemainingPool('abcde')
+        pool.discard('b')
+        pool.discard('z')
+
+        self.assertEqual(len(pool), 4)
+        for option in 'acde':
+            self.assertEqual(pool.options[pool.positions[option][0]], option)
+
+    def test_draw_until_exhausted(self):
+        """Drawing should give every option once, then fail"""
+        pool = RemainingPool('abcde')
+        rng = random.Random(0)
+
+        self.assertEqual(sorted(pool.draw(rng) for _ in range(5)), list('abcde'))
+        with self.assertRaises(ExhaustedError):
+            pool.draw(rng)
@@ -0,0 +1,164 @@
+import unittest
+import os
+import time
+
+import mongomock
+
+from threading import Event
+from unittest import mock
+
+import Lib.Utilities.Mongo as Mongo
+
+from bson import ObjectId
+
+from Lib.SavedIDs import SavedIDIndex, INSERT_MARGIN
+from ExternalServices import SAVE_LOCATION
+
+
+def old_id(number):
+    """Makes an ID that was made an hour (plus the margin) ago"""
+    return ObjectId('{:08x}{:016x}'.format(int(time.time()) - INSERT_MARGIN - 3600, number))
+
+
+class TestSavedIDIndex(unittest.TestCase):
+    def setUp(self):
+        self.mongo = mongomock.MongoClient()['Test']
+        Mongo.database = self.mongo
+        self.saved = [old_id(number) for number in range(50)]
+        self.mongo[SAVE_LOCATION].insert_many([{'_id': object_id} for object_id in self.saved])
+        self.index = SavedIDIndex(100, 0.01, 10, 60)
+
+    def built(self):
+        """Builds the filter up front, as it would be at startup"""
+        self.index.build()
+        return self.index
+
+    def test_build_once(self):
+        """The filter should be built from the database the first time it's needed, and only then"""
+        with mock.patch.object(Mongo, 'find_ids', wraps=Mongo.find_ids) as find:
+            self.index.build()
+            self.index.build()
+            self.index.is_missing(self.saved[0])
+
+        self.assertEqual(find.call_count, 1)
+        self.assertEqual(self.index.stats()['size'], 50)
+
+    def test_build_in_background(self):
+        """The first check should start building the filter without waiting for it, and IDs
+            should go to the database until it's ready"""
+        started = Event()
+        finish = Event()
+
+        def find_ids(collection):
+            started.set()
+            finish.wait(5)
+            for object_id in self.saved:
+                yield object_id
+
+        with mock.patch.object(Mongo, 'find_ids', side_effect=find_ids) as find:
+            self.assertFalse(self.index.is_missing(old_id(100)))
+            self.assertTrue(started.wait(5))
+            self.assertFalse(self.index.is_missing(old_id(101)))
+            finish.set()
+            for _ in range(500):
+                if self.index.stats()['size']:
+                    break
+                time.sleep(0.01)
+
+        self.assertEqual(find.call_count, 1)
+        self.assertEqual(self.index.stats()['size'], 50)
+        self.assertFalse(self.index.is_missing(self.saved[0]))
+
+    def test_build_failure(self):
+        """If the filter can't be built, building should be tried again the next time it's
+            needed"""
+        self.index._builder = os.getpid()
+        with mock.patch.object(Mongo, 'find_ids', side_effect=IOError):
+            self.index._build_in_background(os.getpid())
+
+        self.assertIsNone(self.index._builder)
+        self.assertEqual(self.index.stats()['size'], 0)
+
+    def test_future_ids(self):
+        """IDs made further in the future than the margin should be ruled out straight away, even
+            without a filter"""
+        future = ObjectId('{:08x}{:016x}'.format(int(time.time()) + INSERT_MARGIN + 60, 0))
+        index = SavedIDIndex(0, 0.01, 10, 60)
+        with mock.patch.object(Mongo, 'find_ids') as find:
+            self.assertTrue(index.is_missing(future))
+            self.assertTrue(index.is_missing(ObjectId('f' * 24)))
+            self.assertFalse(index.is_missing(ObjectId()))
+
+        self.assertFalse(find.called)
+        self.assertEqual(index.stats()['future'], 2)
+
+    def test_saved_ids(self):
+        """IDs that were saved should never be said to be missing"""
+        index = self.built()
+        self.assertFalse(any(index.is_missing(object_id) for object_id in self.saved))
+
+    def test_unsaved_ids(self):
+        """Old IDs that were never saved should (almost always) be ruled out"""
+        self.built()
+        missing = [self.index.is_missing(old_id(number)) for number in range(50, 250)]
+
+        self.assertGreater(sum(missing), 190)
+        self.assertEqual(self.index.rejections, sum(missing))
+
+    def test_new_ids(self):
+        """IDs newer than the filter could have been saved by another process, so should never be
+            ruled out by it"""
+        self.built()
+        self.assertFalse(self.index.is_missing(ObjectId()))
+
+    def test_not_found(self):
+        """IDs that weren't found should be remembered as missing, until they're saved"""
+        object_id = ObjectId()
+        self.index.not_found(object_id)
+        self.assertTrue(self.index.is_missing(object_id))
+
+        self.index.add([object_id])
+        self.assertFalse(self.index.is_missing(object_id))
+        self.assertIn(str(object_id), self.index.filter)
+
+    def test_stats(self):
+        """The stats should count how many IDs were answered without the database"""
+        self.built()
+        for number in range(50, 150):
+            object_id = old_id(number)
+            if not self.index.is_missing(object_id):
+                self.index.not_found(object_id)
+        self.index.is_missing(self.saved[0])
+        new_id = ObjectId()
+        self.index.not_found(new_id)
+        self.index.is_missing(new_id)
+
+        stats = self.index.stats()
+        self.assertEqual(stats['checks'], 102)
+        self.assertEqual(stats['missing_hits'], 1)
+        self.assertEqual(stats['rejections'] + stats['false_positives'], 100)
+        self.assertAlmostEqual(stats['hit_rate'], (stats['rejections'] + 1) / 102)
+        self.assertAlmostEqual(stats['false_positive_rate'], stats['false_positives'] / 100)
+        self.assertLess(stats['expected_false_positive_rate'], 0.01)
+
+    def test_disabled(self):
+        """Without a filter, only IDs that weren't found should be said to be missing"""
+        index = SavedIDIndex(0, 0.01, 10, 60)
+        with mock.patch.object(Mongo, 'find_ids') as find:
+            self.assertFalse(index.is_missing(old_id(100)))
+
+        self.assertFalse(find.called)
+        index.not_found(old_id(100))
+        self.assertTrue(index.is_missing(old_id(100)))
+        self.assertEqual(index.stats()['size'], 0)
+
+    def test_clear(self):
+        """Clearing should forget everything, so the filter is built again"""
+        self.built().not_found(ObjectId())
+        self.index.is_missing(self.saved[0])
+        self.index.clear()
+
+        self.assertEqual(self.index.stats()['size'], 0)
+        self.assertEqual(self.index.checks, 0)
+        self.index.build()
+        self.assertEqual(self.index.stats()['size'], 50)
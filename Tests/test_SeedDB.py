@@ -6,6 +6,7 @@ import mongomock
 import os
 
 import SeedDB as SeedDB
+import Lib.Utilities.Mongo as Mongo
 
 test_file = os.path.join('.', 'Tests', 'TestData', 'test.json')
 json_obj = {"_id": "test"}
@@ -26,7 +27,7 @@ class TestDatabase(unittest.TestCase):
     def setUp(self):
         self.SeedDB = SeedDB
         self.mongo = mongomock.MongoClient()['Test']
-        self.SeedDB.Mongo.database = self.mongo
+        Mongo.database = self.mongo
 
     def test_worker(self):
         """Ensure that the worker function can insert JSON into the database"""
@@ -0,0 +1,146 @@
+import unittest
+
+from types import MappingProxyType
+
+from Lib.Skills import SkillIndex, SkillSet, StatBlock, ABSENT, STAT_NAMES
+
+
+class TestSkillIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SkillIndex({'Accounting': 10, 'Alertness': 20},
+                                {'Art': ['Poetry', 'Dance'], 'Craft': ['Mechanic']})
+
+    def test_positions(self):
+        """Defaults should come first, then every sub-skill"""
+        self.assertEqual(self.index.names, ['Accounting', 'Alertness', 'Art (Poetry)',
+                                            'Art (Dance)', 'Craft (Mechanic)'])
+        self.assertEqual(self.index.default_count, 2)
+        self.assertEqual(list(self.index.template), [10, 20, ABSENT, ABSENT, ABSENT])
+
+    def test_intern(self):
+        """Known names should keep their position and new names should go on the end"""
+        self.assertEqual(self.index.intern('Art (Dance)'), 3)
+        self.assertEqual(self.index.intern('Art (Mime)'), 5)
+        self.assertEqual(self.index.intern('Art (Mime)'), 5)
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.template[5], ABSENT)
+
+
+class TestSkillSet(unittest.TestCase):
+    def setUp(self):
+        self.defaults = MappingProxyType({'Accounting': 10, 'Alertness': 20, 'Unnatural': 0})
+        self.index = SkillIndex(self.defaults, {'Science': ['Biology']})
+        self.skills = SkillSet(self.index)
+
+    def test_reads_defaults(self):
+        """Untouched skills should have their default values"""
+        self.assertEqual(self.skills['Alertness'], 20)
+        self.assertIn('Accounting', self.skills)
+        self.assertNotIn('Science (Biology)', self.skills)
+        self.assertEqual(len(self.skills), 3)
+
+    def test_set(self):
+        """Setting a skill should only change this set of skills"""
+        other = SkillSet(self.index)
+        self.skills['Alertness'] = 40
+        self.skills['Craft (Mechanic)'] = 0
+
+        self.assertEqual(self.skills['Alertness'], 40)
+        self.assertEqual(self.skills['Craft (Mechanic)'], 0)
+        self.assertEqual(other['Alertness'], 20)
+        self.assertNotIn('Craft (Mechanic)', other)
+
+    def test_order(self):
+        """Iterating should give the defaults in order, then new skills in the order added"""
+        self.skills['Science (Biology)'] = 40
+        self.skills['Alertness'] = 40
+        self.skills['Art (Poetry)'] = 30
+
+        self.assertEqual(list(self.skills), ['Accounting', 'Alertness', 'Unnatural',
+                                             'Science (Biology)', 'Art (Poetry)'])
+        self.assertEqual(len(self.skills), 5)
+
+    def test_delete(self):
+        """Deleting should work for both default and new skills"""
+        self.skills['Art (Poetry)'] = 30
+        del self.skills['Unnatural']
+        del self.skills['Art (Poetry)']
+
+        self.assertNotIn('Unnatural', self.skills)
+        self.assertEqual(dict(self.skills), {'Accounting': 10, 'Alertness': 20})
+        with self.assertRaises(KeyError):
+            self.skills['Unnatural']
+        with self.assertRaises(KeyError):
+            del self.skills['Unnatural']
+
+    def test_equality(self):
+        """A set of skills should be equal to a dictionary with the same skills"""
+        self.skills['Alertness'] = 40
+
+        self.assertEqual(self.skills, {'Accounting': 10, 'Alertness': 40, 'Unnatural': 0})
+        self.assertEqual(dict(self.skills), {'Accounting': 10, 'Alertness': 40, 'Unnatural': 0})
+
+    def test_dictionary_methods(self):
+        """The usual dictionary methods should work"""
+        self.skills.update({'Alertness': 30, 'Art (Poetry)': 10})
+        self.skills['Accounting'] += 5
+
+        self.assertEqual(self.skills.get('Art (Poetry)'), 10)
+        self.assertEqual(self.skills.get('Swim', 0), 0)
+        self.assertEqual(sorted(self.skills.items()), [('Accounting', 15), ('Alertness', 30),
+                                                       ('Art (Poetry)', 10), ('Unnatural', 0)])
+
+    def test_index_grows(self):
+        """A set of skills should still work after other sets have added names to the index"""
+        other = SkillSet(self.index)
+        other['Art (Poetry)'] = 10
+        self.skills['Art (Dance)'] = 20
+
+        self.assertNotIn('Art (Poetry)', self.skills)
+        self.assertEqual(self.skills['Art (Dance)'], 20)
+        self.assertEqual(list(other)[-1], 'Art (Poetry)')
+
+    def test_too_small(self):
+        """The value used to mark missing skills can't be stored"""
+        with self.assertRaises(ValueError):
+            self.skills['Alertness'] = ABSENT
+
+    def test_copy(self):
+        """A copy should share the index but have its own values"""
+        self.skills['Alertness'] = 40
+        copy = self.skills.copy()
+        copy['Alertness'] = 50
+
+        self.assertIs(copy.index, self.skills.index)
+        self.assertEqual(self.skills['Alertness'], 40)
+        self.assertEqual(copy['Alertness'], 50)
+
+
+class TestStatBlock(unittest.TestCase):
+    def test_empty(self):
+        """Every stat should start at 0"""
+        self.assertEqual(dict(StatBlock()), {stat: 0 for stat in STAT_NAMES})
+
+    def test_from_dict(self):
+        """Stats should be read from a dictionary and behave like one"""
+        stats = {stat: value for value, stat in enumerate(STAT_NAMES, 10)}
+        block = StatBlock(stats)
+        block['Power'] -= 3
+
+        self.assertEqual(block, dict(stats, Power=stats['Power'] - 3))
+        self.assertIn('Charisma', block)
+        self.assertNotIn('Wisdom', block)
+
+    def test_missing_stat(self):
+        """Every stat is needed"""
+        with self.assertRaises(KeyError):
+            StatBlock({'Strength': 10})
+
+    def test_fixed(self):
+        """Stats can't be added or removed"""
+        block = StatBlock()
+
+        with self.assertRaises(KeyError):
+            block['Wisdom'] = 10
+        with self.assertRaises(TypeError):
+            del block['Power']
@@ -0,0 +1,212 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from threading import Thread
+
+from Lib.Utilities.Cache import LRUCache, ExpiringCache, BloomFilter, DiskCache, TieredCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(2)
+
+    def test_get_put(self):
+        """Items put in the cache should come back out, and the hits and misses be counted"""
+        self.cache.put('a', 1)
+
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('b', 2), 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_least_recently_used(self):
+        """A full cache should throw away the item that was used least recently"""
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_disabled(self):
+        """A cache with no room should never hold anything"""
+        cache = LRUCache(0)
+        cache.put('a', 1)
+
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        """Clearing should throw away every item and reset the counters"""
+        self.cache.put('a', 1)
+        self.cache.get('a')
+        self.cache.clear()
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+    def test_threads(self):
+        """The cache should never go over its size, however many threads use it"""
+        cache = LRUCache(50)
+
+        def work(offset):
+            for key in range(200):
+                cache.put(key + offset, key)
+                cache.get(key)
+
+        threads = [Thread(target=work, args=(offset,)) for offset in range(0, 800, 200)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(cache), 50)
+        self.assertEqual(cache.hits + cache.misses, 800)
+
+
+class TestExpiringCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = ExpiringCache(2, 10, clock=lambda: self.now)
+
+    def test_expiry(self):
+        """Items should only come back out until their time to live has passed"""
+        self.cache.put('a', 1)
+        self.now = 9
+
+        self.assertIn('a', self.cache)
+        self.assertEqual(self.cache.get('a'), 1)
+
+        self.now = 10
+        self.assertNotIn('a', self.cache)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_discard(self):
+        """Discarded items should be gone straight away"""
+        self.cache.put('a', 1)
+        self.cache.discard('a')
+        self.cache.discard('b')
+
+        self.assertIsNone(self.cache.get('a'))
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        """Every item added should be said to (maybe) have been added"""
+        bloom = BloomFilter(1000)
+        for key in range(1000):
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in range(1000)))
+        self.assertEqual(len(bloom), 1000)
+
+    def test_false_positive_rate(self):
+        """Items that were never added should rarely be said to have been, at about the rate
+            expected"""
+        bloom = BloomFilter(1000, 0.01)
+        for key in range(1000):
+            bloom.add(key)
+
+        false_positives = sum(key in bloom for key in range(1000, 21000))
+        self.assertLess(false_positives / 20000, 0.03)
+        self.assertAlmostEqual(bloom.false_positive_rate(), 0.01, delta=0.005)
+
+    def test_clear(self):
+        """Clearing should remove every item"""
+        bloom = BloomFilter(10)
+        bloom.add('a')
+        bloom.clear()
+
+        self.assertNotIn('a', bloom)
+        self.assertEqual(len(bloom), 0)
+        self.assertEqual(bloom.false_positive_rate(), 0)
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite')
+        self.cache = DiskCache(self.path)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_get_put(self):
+        """Items put in the cache should come back out, as copies"""
+        item = {'Class': 'Nurse', 'Skills': {'Alertness': 20}}
+        self.cache.put('a', item)
+
+        self.assertEqual(self.cache.get('a'), item)
+        self.assertIsNot(self.cache.get('a'), item)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_lazy(self):
+        """The database file shouldn't be opened until the cache is used"""
+        self.assertFalse(os.path.exists(self.path))
+        self.cache.put('a', 1)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_survives_restart(self):
+        """Items should still be there after the cache is reopened"""
+        self.cache.put('a', [1, 2])
+        self.cache.close()
+        self.cache = DiskCache(self.path)
+
+        self.assertEqual(self.cache.get('a'), [1, 2])
+
+    def test_replace_and_clear(self):
+        """Putting an item twice should replace it, and clearing should remove everything"""
+        self.cache.put('a', 1)
+        self.cache.put('a', 2)
+        self.assertEqual(self.cache.get('a'), 2)
+
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestTieredCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.disk = DiskCache(os.path.join(self.directory, 'cache.sqlite'))
+        self.cache = TieredCache(LRUCache(1), self.disk)
+
+    def tearDown(self):
+        self.disk.close()
+        shutil.rmtree(self.directory)
+
+    def test_memory_then_disk(self):
+        """Items pushed out of memory should still be found on disk, and moved back into memory"""
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+
+        self.assertNotIn('a', self.cache.memory)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIn('a', self.cache.memory)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('c'))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'disk_hits': 1, 'misses': 1, 'size': 1})
+
+    def test_memory_only(self):
+        """Without a disk, the cache should just be the in-process cache"""
+        cache = TieredCache(LRUCache(1))
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_clear(self):
+        """Clearing should empty both tiers"""
+        self.cache.put('a', 1)
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.disk), 0)
@@ -0,0 +1,77 @@
+import unittest
+import os
+
+import Lib.Utilities.Connections as Connections
+
+from threading import Thread
+from unittest import mock
+
+
+class TestSQLiteConnection(unittest.TestCase):
+    def setUp(self):
+        self.setups = []
+        self.connection = Connections.SQLiteConnection(':memory:', self.setups.append)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_lazy(self):
+        """The database shouldn't be opened until it's used, and then only once"""
+        self.assertFalse(self.connection.connected)
+        self.assertEqual(self.setups, [])
+
+        with self.connection as first:
+            first.execute('CREATE TABLE test (value INTEGER)')
+        with self.connection as second:
+            self.assertIs(first, second)
+        self.assertTrue(self.connection.connected)
+        self.assertEqual(self.setups, [first])
+
+    def test_reentrant(self):
+        """A thread already using the connection should be able to use it again"""
+        with self.connection as outer:
+            with self.connection as inner:
+                self.assertIs(outer, inner)
+
+    def test_threads(self):
+        """Threads should share the connection, taking turns"""
+        with self.connection as connection:
+            connection.execute('CREATE TABLE test (value INTEGER)')
+
+        def insert(value):
+            with self.connection as connection, connection:
+                connection.execute('INSERT INTO test VALUES (?)', (value,))
+
+        threads = [Thread(target=insert, args=(value,)) for value in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self.connection as connection:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM test').fetchone()[0], 10)
+        self.assertEqual(self.connection.connects, 1)
+
+    def test_fork(self):
+        """A forked process should open its own connection, with its own lock"""
+        with self.connection as parent:
+            pass
+        self.connection._lock.acquire()  # as if another thread was using it during the fork
+        try:
+            with mock.patch.object(Connections.os, 'getpid', return_value=os.getpid() + 1):
+                self.assertFalse(self.connection.connected)
+                with self.connection as child:
+                    self.assertIsNot(child, parent)
+        finally:
+            self.connection._pid = os.getpid()
+        self.assertEqual(self.connection.connects, 2)
+        self.assertEqual(len(self.setups), 2)
+
+    def test_close(self):
+        """Closing should mean a new connection is opened when it's next used"""
+        with self.connection as first:
+            pass
+        self.connection.close()
+        self.assertFalse(self.connection.connected)
+        with self.connection as second:
+            self.assertIsNot(first, second)
@@ -0,0 +1,68 @@
+import unittest
+
+import mongomock
+
+import Lib.Utilities.Indexes as Indexes
+import Lib.Utilities.Mongo as Mongo
+import Lib.Utilities.Storage as Storage
+
+from unittest import mock
+
+
+class TestSQLite(unittest.TestCase):
+    def setUp(self):
+        self.storage = Storage.SQLiteStorage(':memory:')
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_ensure_indexes(self):
+        """Every index should be created, and creating them again should change nothing"""
+        names = Indexes.ensure_indexes(self.storage)
+        self.assertEqual(names, Indexes.ensure_indexes(self.storage))
+        self.assertEqual(len(names), len(Indexes.INDEXES))
+        self.assertIn('Violence_1', names)
+
+        with self.storage._connection as connection:
+            indexes = connection.execute('PRAGMA index_list("disorders")').fetchall()
+        self.assertEqual(len(indexes), 4)  # one for each field, and one for the primary key
+
+    def test_check_queries(self):
+        """Once the indexes exist, no query should read a whole collection"""
+        Indexes.ensure_indexes(self.storage)
+        self.assertEqual(Indexes.check_queries(self.storage), [])
+
+    def test_check_queries_scans(self):
+        """Queries that would read a whole collection should be reported"""
+        with mock.patch.object(Indexes, 'QUERIES', [('classes', {}), ('classes', {'open': True})]):
+            self.assertEqual(Indexes.check_queries(self.storage), [('classes', {})])
+
+    def test_default_storage(self):
+        """The process-wide storage should be used unless another is given"""
+        with mock.patch.object(Storage, 'storage', self.storage):
+            Indexes.ensure_indexes()
+            self.assertEqual(Indexes.check_queries(), [])
+
+
+class TestMongo(unittest.TestCase):
+    def setUp(self):
+        self.mongo = mongomock.MongoClient()['Test']
+        Mongo.database = self.mongo
+        self.storage = Storage.MongoStorage()
+
+    def test_ensure_indexes(self):
+        """Every index should be created in Mongo, and creating them again should change
+            nothing"""
+        names = Indexes.ensure_indexes(self.storage)
+        self.assertEqual(names, Indexes.ensure_indexes(self.storage))
+        self.assertEqual(sorted(self.mongo['disorders'].index_information()),
+                         ['Helplessness_1', 'Unnatural_1', 'Violence_1', '_id_'])
+        self.assertEqual(list(self.mongo['bonds'].index_information()), [])
+
+    def test_check_queries(self):
+        """Queries should be reported if Mongo would scan the whole collection for them"""
+        def plan_stages(collection, query):
+            return ['COLLSCAN'] if collection == 'classes' else ['FETCH', 'IXSCAN']
+
+        with mock.patch.object(Mongo, 'plan_stages', side_effect=plan_stages):
+            self.assertEqual(Indexes.check_queries(self.storage), [('classes', {'open': True})])
@@ -1,10 +1,12 @@
 import unittest
+import os
 
 import mongomock
 
 import Lib.Utilities.Mongo as Mongo
 
 from copy import deepcopy
+from unittest import mock
 
 from Lib.Utilities.Exceptions import MalformedError
 
@@ -32,6 +34,23 @@ class TestInsert(unittest.TestCase):
         self.Mongo.insert(original, 'test')
         self.assertEqual(copy, original)
 
+    def test_insert_list_side_effects(self):
+        """Ensure that inserting a list of dicts doesn't add IDs to them either"""
+        original = [{"test": {"nested": 1}}, {"test": 2}]
+        copy = deepcopy(original)
+        ids = self.Mongo.insert(original, 'test')
+        self.assertEqual(copy, original)
+        self.assertEqual(self.mongo['test'].find_one({'_id': ids[0]})['test'], {"nested": 1})
+
+    def test_with_id(self):
+        """Ensure that IDs are added to a shallow copy, keeping any that are already there"""
+        original = {"test": {"nested": 1}}
+        copy = self.Mongo._with_id(original)
+        self.assertIsInstance(copy['_id'], Mongo.ObjectId)
+        self.assertNotIn('_id', original)
+        self.assertIs(copy['test'], original['test'])
+        self.assertEqual(self.Mongo._with_id({'_id': 'test'}), {'_id': 'test'})
+
     def test_insert_single_dict_in_array(self):
         """Ensure that the insert function works for a single dict array"""
         self.assertEqual(self.Mongo.insert([{"_id": "test"}], 'test'), 'test')
@@ -45,6 +64,31 @@ class TestInsert(unittest.TestCase):
         self.assertEqual(self.mongo['test'].find()[0], dicts[0])
         self.assertEqual(self.mongo['test'].find()[1], dicts[1])
 
+    def test_insert_many(self):
+        """Ensure that many documents can be inserted at once, giving back every ID in order"""
+        dicts = [{"_id": 'test'}, {"data": 1}]
+        ids = self.Mongo.insert_many(dicts, 'test')
+        self.assertEqual(ids[0], 'test')
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.mongo['test'].count_documents({}), 2)
+
+    def test_insert_many_side_effects(self):
+        """Ensure that inserting many documents doesn't add IDs to the originals"""
+        dicts = [{"test": 1}, {"test": 2}]
+        copy = deepcopy(dicts)
+        self.Mongo.insert_many(dicts, 'test')
+        self.assertEqual(copy, dicts)
+
+    def test_insert_many_partial_failure(self):
+        """Ensure that a document that can't be inserted doesn't stop the others"""
+        ids = self.Mongo.insert_many([{"_id": 'test'}, {"_id": 'test'}, {"_id": 'test1'}], 'test')
+        self.assertEqual(ids, ['test', None, 'test1'])
+        self.assertEqual(self.mongo['test'].count_documents({}), 2)
+
+    def test_insert_many_empty(self):
+        """Ensure that inserting nothing does nothing"""
+        self.assertEqual(self.Mongo.insert_many([], 'test'), [])
+
 
 class TestFind(unittest.TestCase):
     def setUp(self):
@@ -63,6 +107,10 @@ class TestFind(unittest.TestCase):
         """Ensure that find_all returns all inserted records"""
         self.assertEqual(Mongo.find_all(self.collection), self.inserted_docs)
 
+    def test_find_ids(self):
+        """Ensure that find_ids returns the ID of every record"""
+        self.assertEqual(list(Mongo.find_ids(self.collection)), [1, 2, 3])
+
     def test_find_subset(self):
         """Ensure that find_subset returns one the expected results"""
         self.assertEqual(Mongo.find_subset(self.collection, {'_id': {'$lte': 2}}),
@@ -103,3 +151,172 @@ class TestFind(unittest.TestCase):
         """
         with self.assertRaises(MalformedError):
             Mongo.find_by_id(self.collection, 'abc')
+
+    def test_find_by_ids_literal(self):
+        """
+        Ensure that find_by_ids returns the documents in the order asked for, with empty documents
+        for any that can't be found
+        """
+        self.assertEqual(Mongo.find_by_ids(self.collection, [3, 4, 1, 3], True),
+                         [{'data': 3}, {}, {'data': 1}, {'data': 3}])
+
+    def test_find_by_ids_oid(self):
+        """
+        Ensure that find_by_ids returns the expected documents if given the _ids for objectIDs
+        """
+        obj_ids = [str(self.Mongo.insert({'data': data}, self.collection)) for data in (8, 9)]
+        self.assertEqual(Mongo.find_by_ids(self.collection, obj_ids[::-1]),
+                         [{'data': 9}, {'data': 8}])
+
+    def test_find_by_ids_oid_err(self):
+        """
+        Ensure that find_by_ids raises an error if any of the _ids isn't a valid objectID
+        """
+        with self.assertRaises(MalformedError):
+            Mongo.find_by_ids(self.collection, ['a' * 24, 'abc'])
+
+    def test_find_by_ids_empty(self):
+        """Ensure that find_by_ids doesn't need any IDs"""
+        self.assertEqual(Mongo.find_by_ids(self.collection, []), [])
+
+    def test_find_by_id_fields(self):
+        """Ensure that find_by_id only fetches the fields asked for"""
+        obj_id = self.Mongo.insert({'data': 9, 'other': 10}, self.collection)
+        self.assertEqual(Mongo.find_by_id(self.collection, obj_id, fields=['other']), {'other': 10})
+
+    def test_find_by_ids_fields(self):
+        """Ensure that find_by_ids only fetches the fields asked for"""
+        obj_id = self.Mongo.insert({'data': 9, 'other': 10}, self.collection)
+        self.assertEqual(Mongo.find_by_ids(self.collection, [obj_id], fields=['data']),
+                         [{'data': 9}])
+
+
+    def test_iter_all(self):
+        """Ensure that iter_all gives every record, one at a time"""
+        records = self.Mongo.iter_all(self.collection, batch_size=1)
+        self.assertEqual(next(records), self.inserted_docs[0])
+        self.assertEqual(list(records), self.inserted_docs[1:])
+
+    def test_iter_subset(self):
+        """Ensure that iter_subset applies the query, fields, sort and limit"""
+        self.mongo[self.collection].update_many({}, {'$set': {'other': 1}})
+        records = self.Mongo.iter_subset(self.collection, {'data': {'$gt': 1}}, fields=['data'],
+                                         sort=[('data', -1)], limit=1, batch_size=1)
+        self.assertEqual(list(records), [{'_id': 3, 'data': 3}])
+
+    def test_iter_subset_closes(self):
+        """Ensure that the cursor is closed even if the records aren't all used"""
+        cursor = mock.MagicMock()
+        cursor.batch_size.return_value = cursor
+        cursor.__iter__.return_value = iter(self.inserted_docs)
+        database = {self.collection: mock.MagicMock()}
+        database[self.collection].find.return_value = cursor
+
+        with mock.patch.object(Mongo, 'database', database):
+            records = self.Mongo.iter_subset(self.collection, batch_size=2)
+            self.assertEqual(next(records), self.inserted_docs[0])
+            records.close()
+        cursor.batch_size.assert_called_once_with(2)
+        cursor.close.assert_called_once_with()
+
+    def test_iter_subset_raw(self):
+        """Ensure that records can be fetched without being decoded"""
+        collection = mock.MagicMock()
+        collection.with_options.return_value.find.return_value.__iter__.return_value = iter([])
+
+        with mock.patch.object(Mongo, 'database', {self.collection: collection}):
+            self.assertEqual(list(self.Mongo.iter_subset(self.collection, raw=True)), [])
+        collection.find.assert_not_called()
+        options = collection.with_options.call_args[1]['codec_options']
+        self.assertIs(options.document_class, Mongo.RawBSONDocument)
+
+
+    def test_ensure_index(self):
+        """Ensure that an index is created once, however many times it's asked for"""
+        self.assertEqual(Mongo.ensure_index(self.collection, [('data', 1)]), 'data_1')
+        self.assertEqual(Mongo.ensure_index(self.collection, (('data', 1),)), 'data_1')
+        self.assertEqual(len(self.mongo[self.collection].index_information()), 2)
+
+    def test_plan_stages(self):
+        """Ensure that every stage of the plan Mongo picked is found"""
+        collection = mock.MagicMock()
+        collection.find.return_value.explain.return_value = {'queryPlanner': {
+            'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'OR', 'inputStages': [
+                {'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]}},
+            'rejectedPlans': [{'stage': 'SORT'}]}}
+
+        with mock.patch.object(Mongo, 'database', {self.collection: collection}):
+            stages = Mongo.plan_stages(self.collection, {'data': 1})
+        collection.find.assert_called_once_with({'data': 1})
+        self.assertEqual(sorted(stages), ['COLLSCAN', 'FETCH', 'IXSCAN', 'OR'])
+
+
+class TestClientManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = Mongo.ClientManager('mongodb://localhost/Test', 'Test',
+                                           client_class=mongomock.MongoClient, maxPoolSize=5,
+                                           socketTimeoutMS=None)
+
+    def test_lazy(self):
+        """Ensure that the client isn't made until it's needed, and is then reused"""
+        self.assertEqual(self.manager.connects, 0)
+        self.assertFalse(self.manager.stats()['connected'])
+
+        database = self.manager.database
+        self.assertEqual(database.name, 'Test')
+        self.assertIs(self.manager.client, database.client)
+        self.assertEqual(self.manager.connects, 1)
+
+    def test_options(self):
+        """Ensure that options are passed to the client, leaving out those that are None"""
+        client_class = mock.MagicMock()
+        manager = Mongo.ClientManager('uri', 'Test', client_class=client_class, maxPoolSize=5,
+                                      socketTimeoutMS=None, w=1)
+        manager.client
+        args, kwargs = client_class.call_args
+        self.assertEqual(args, ('uri',))
+        self.assertEqual(kwargs['maxPoolSize'], 5)
+        self.assertEqual(kwargs['w'], 1)
+        self.assertNotIn('socketTimeoutMS', kwargs)
+
+    def test_fork(self):
+        """Ensure that a new client is made in a forked process"""
+        client = self.manager.client
+        with mock.patch.object(Mongo.os, 'getpid', return_value=os.getpid() + 1):
+            self.assertFalse(self.manager.stats()['connected'])
+            self.assertIsNot(self.manager.client, client)
+            self.assertEqual(self.manager.connects, 2)
+        self.assertIsNot(self.manager.client, client)
+        self.assertEqual(self.manager.connects, 3)
+
+    def test_close(self):
+        """Ensure that closing the client means a new one is made when it's next needed"""
+        client = self.manager.client
+        self.manager.close()
+        self.assertFalse(self.manager.stats()['connected'])
+        self.assertIsNot(self.manager.client, client)
+
+    def test_stats(self):
+        """Ensure that the pool's size limits and what it's done are reported"""
+        self.manager.client
+        self.manager._counter = Mongo.PoolCounter()
+        for event in ('connection_created', 'connection_created', 'connection_checked_out',
+                      'connection_checked_out', 'connection_checked_in', 'connection_closed'):
+            getattr(self.manager._counter, event)(None)
+
+        stats = self.manager.stats()
+        self.assertEqual(stats['pid'], os.getpid())
+        self.assertTrue(stats['connected'])
+        self.assertEqual(stats['max_pool_size'], 5)
+        self.assertIsNone(stats['min_pool_size'])
+        self.assertEqual(stats['open'], 1)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['created'], 2)
+
+    def test_module_database(self):
+        """Ensure that the manager's database is used unless one has been set"""
+        with mock.patch.object(Mongo, 'database', None):
+            with mock.patch.object(Mongo, 'manager', self.manager):
+                object_id = Mongo.insert({'data': 1}, 'test')
+                self.assertEqual(self.manager.database['test'].find_one(),
+                                 {'_id': object_id, 'data': 1})
@@ -0,0 +1,39 @@
+import unittest
+import json
+
+from unittest import mock
+
+import Lib.Utilities.Serialize as Serialize
+
+
+class TestSerialize(unittest.TestCase):
+    def test_dumps(self):
+        """Values should be encoded as compact JSON bytes, in the order given"""
+        value = {'Skills': {'Unnatural': 0, 'Alertness': 20}, 'Class': 'Nurse', 'Bonds': []}
+        encoded = Serialize.dumps(value)
+
+        self.assertEqual(json.loads(encoded.decode('utf-8')), value)
+        self.assertNotIn(b' ', encoded.replace(b'Nurse', b''))
+        self.assertLess(encoded.index(b'Skills'), encoded.index(b'Class'))
+
+    def test_dumps_unicode(self):
+        """Characters outside of ASCII should be encoded as UTF-8"""
+        self.assertEqual(Serialize.dumps('Brûlé'), '"Brûlé"'.encode('utf-8'))
+
+    def test_fast_encoder(self):
+        """The fast encoder should be used when it's installed"""
+        fast = mock.Mock()
+        fast.dumps.return_value = b'{}'
+        with mock.patch.object(Serialize, 'orjson', fast):
+            self.assertEqual(Serialize.dumps({}), b'{}')
+        fast.dumps.assert_called_once_with({})
+
+    def test_join(self):
+        """Objects and arrays built from encoded pieces should be valid JSON"""
+        members = [(Serialize.key('ID'), Serialize.dumps('a')),
+                   (Serialize.key('Values'), Serialize.join_array([b'1', b'null']))]
+        encoded = Serialize.join_object(members)
+
+        self.assertEqual(json.loads(encoded.decode('utf-8')), {'ID': 'a', 'Values': [1, None]})
+        self.assertEqual(Serialize.join_array([]), b'[]')
+        self.assertEqual(Serialize.join_object([]), b'{}')
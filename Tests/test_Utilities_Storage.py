@@ -0,0 +1,254 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import warnings
+
+import mongomock
+
+from os import path
+from unittest import mock
+
+import Lib.Character as Character
+import Lib.Generator as Generator
+import Lib.RuleSet as RuleSet
+import Lib.Utilities.Connections as Connections
+import Lib.Utilities.Mongo as Mongo
+import Lib.Utilities.Storage as Storage
+
+from bson import ObjectId
+
+from Lib.Utilities.Exceptions import MalformedError
+from Lib.Utilities.Workspace import parse_json
+from Tests.TestData import data_path
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.storage = Storage.SQLiteStorage(':memory:')
+        self.collection = 'Test'
+        self.inserted_docs = [dict(_id=1, data=1, flag=True), dict(_id=2, data=2, flag=False),
+                              dict(_id=3, data=3, flag=True)]
+        self.storage.insert(self.inserted_docs, self.collection)
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_insert(self):
+        """Inserting should give back the IDs, making new ObjectIDs where needed, without changing
+            the records"""
+        record = {'data': 4}
+        object_id = self.storage.insert(record, 'other')
+
+        self.assertIsInstance(object_id, ObjectId)
+        self.assertEqual(record, {'data': 4})
+        self.assertEqual(self.storage.insert([{'_id': 'test'}], 'other'), 'test')
+        self.assertEqual(self.storage.find_all('other'), [{'_id': object_id, 'data': 4},
+                                                          {'_id': 'test'}])
+
+    def test_insert_duplicate(self):
+        """Inserting a record with an _id that's already used should fail"""
+        with self.assertRaises(MalformedError):
+            self.storage.insert({'_id': 1}, self.collection)
+
+    def test_insert_many(self):
+        """Inserting many records should give back every ID in order, with None for failures"""
+        ids = self.storage.insert_many([{'_id': 1}, {'data': 5}, {'_id': 'new'}], self.collection)
+
+        self.assertIsNone(ids[0])
+        self.assertIsInstance(ids[1], ObjectId)
+        self.assertEqual(ids[2], 'new')
+        self.assertEqual(len(self.storage.find_all(self.collection)), 5)
+
+    def test_find_all(self):
+        """Every record should be found, in the order they were inserted"""
+        self.assertEqual(self.storage.find_all(self.collection), self.inserted_docs)
+        self.assertEqual(self.storage.find_all('empty'), [])
+
+    def test_find_subset(self):
+        """Queries should match records the same way as in Mongo"""
+        queries = [
+            ({'flag': True}, [0, 2]),
+            ({'_id': {'$in': [1, 3]}}, [0, 2]),
+            ({'data': {'$gt': 1, '$lt': 3}}, [1]),
+            ({'data': {'$in': [1, 3]}}, [0, 2]),
+            ({'data': {'$ne': 2}, 'flag': True}, [0, 2]),
+            ({'missing': None}, [0, 1, 2]),
+            ({}, [0, 1, 2])
+        ]
+        for query, positions in queries:
+            with self.subTest(msg='Testing {}'.format(query)):
+                self.assertEqual(self.storage.find_subset(self.collection, query),
+                                 [self.inserted_docs[position] for position in positions])
+
+    def test_find_subset_unsupported(self):
+        """Queries using operators that aren't supported should fail"""
+        with self.assertRaises(MalformedError):
+            self.storage.find_subset(self.collection, {'data': {'$regex': '1'}})
+
+    def test_find_subset_index(self):
+        """Querying a field should create an index on it, which later queries use"""
+        self.storage.find_subset(self.collection, {'flag': True})
+        with self.storage._connection as connection:
+            plan = connection.execute(
+                'EXPLAIN QUERY PLAN SELECT key FROM "Test" WHERE '
+                'json_extract(document, \'$."flag"\') = 1').fetchall()
+            indexes = connection.execute('PRAGMA index_list("Test")').fetchall()
+        self.assertIn('Test.flag', [row[1] for row in indexes])
+        self.assertTrue(any('Test.flag' in row[-1] for row in plan))
+
+    def test_iter_all(self):
+        """Every record should be given, one at a time, in the order they were inserted"""
+        records = self.storage.iter_all(self.collection, batch_size=2)
+        self.assertEqual(next(records), self.inserted_docs[0])
+        self.storage.insert({'_id': 4}, 'other')
+        self.assertEqual(list(records), self.inserted_docs[1:])
+
+    def test_iter_subset(self):
+        """The query, fields, sort and limit should all be applied"""
+        records = self.storage.iter_subset(self.collection, {'flag': True}, fields=['data'],
+                                           sort=[('data', -1)], limit=1, batch_size=1)
+        self.assertEqual(list(records), [{'_id': 3, 'data': 3}])
+        records = self.storage.iter_subset(self.collection, sort=[('flag', 1), ('_id', -1)])
+        self.assertEqual([record['_id'] for record in records], [2, 3, 1])
+
+    def test_iter_subset_unsupported(self):
+        """Sorting in anything but ascending or descending order should fail"""
+        with self.assertRaises(MalformedError):
+            list(self.storage.iter_subset(self.collection, sort=[('data', 'up')]))
+
+    def test_find_one(self):
+        """The first matching record should be found, without its _id"""
+        self.assertEqual(self.storage.find_one(self.collection), {'data': 1, 'flag': True})
+        self.assertEqual(self.storage.find_one(self.collection, {'flag': False}, ['data']),
+                         {'data': 2})
+        self.assertEqual(self.storage.find_one(self.collection, {'data': 9}), {})
+
+    def test_find_by_id(self):
+        """Records should be found by their _id, either literally or as an ObjectID"""
+        object_id = self.storage.insert({'data': 9, 'other': 10}, self.collection)
+
+        self.assertEqual(self.storage.find_by_id(self.collection, 2, literal=True),
+                         {'data': 2, 'flag': False})
+        self.assertEqual(self.storage.find_by_id(self.collection, str(object_id),
+                                                 fields=['other']), {'other': 10})
+        self.assertEqual(self.storage.find_by_id(self.collection, 'a' * 24), {})
+        with self.assertRaises(MalformedError):
+            self.storage.find_by_id(self.collection, 'a')
+
+    def test_find_by_ids(self):
+        """Many records should be found at once, in the order asked for"""
+        self.assertEqual(self.storage.find_by_ids(self.collection, [3, 9, 1, 3], literal=True,
+                                                  fields=['data']),
+                         [{'data': 3}, {}, {'data': 1}, {'data': 3}])
+        self.assertEqual(self.storage.find_by_ids(self.collection, []), [])
+
+    def test_find_ids(self):
+        """The _id of every record should be found"""
+        self.assertEqual(list(self.storage.find_ids(self.collection)), [1, 2, 3])
+
+    def test_find_ids_streamed(self):
+        """IDs should be read as they're needed, with other queries allowed in between"""
+        self.storage.insert([{'_id': key} for key in range(4, 2504)], self.collection)
+        ids = self.storage.find_ids(self.collection)
+
+        self.assertEqual(next(ids), 1)
+        self.assertEqual(self.storage.find_by_id(self.collection, 2, literal=True),
+                         {'data': 2, 'flag': False})
+        self.assertEqual(list(ids), list(range(2, 2504)))
+
+    def test_file(self):
+        """Records should still be there after the file is reopened"""
+        directory = tempfile.mkdtemp()
+        try:
+            storage = Storage.SQLiteStorage(os.path.join(directory, 'storage.sqlite'))
+            object_id = storage.insert({'data': 1}, 'test')
+            storage.find_subset('test', {'data': 1})
+            storage.close()
+
+            storage = Storage.SQLiteStorage(os.path.join(directory, 'storage.sqlite'))
+            self.assertEqual(storage.find_subset('test', {'data': 1}),
+                             [{'_id': object_id, 'data': 1}])
+            storage.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+    def test_lazy_and_fork_safe(self):
+        """The file shouldn't be opened until it's used, and a forked process should open it
+            again for itself"""
+        directory = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(directory, 'storage.sqlite')
+            storage = Storage.SQLiteStorage(file_path)
+            self.assertFalse(os.path.exists(file_path))
+
+            object_id = storage.insert({'data': 1}, 'test')
+            with mock.patch.object(Connections.os, 'getpid', return_value=os.getpid() + 1):
+                self.assertEqual(storage.find_subset('test', {'data': 1}),
+                                 [{'_id': object_id, 'data': 1}])
+                self.assertEqual(storage._connection.connects, 2)
+                storage.close()
+        finally:
+            shutil.rmtree(directory)
+
+class TestMongoStorage(unittest.TestCase):
+    def setUp(self):
+        Mongo.database = mongomock.MongoClient()['Test']
+        self.storage = Storage.MongoStorage()
+
+    def test_operations(self):
+        """Every operation should be done in Mongo"""
+        object_id = self.storage.insert({'data': 1}, 'test')
+        ids = self.storage.insert_many([{'data': 2}], 'test')
+
+        self.assertEqual(list(self.storage.find_ids('test')), [object_id] + ids)
+        self.assertEqual(self.storage.find_subset('test', {'data': 2}),
+                         [{'_id': ids[0], 'data': 2}])
+        self.assertEqual(list(self.storage.iter_subset('test', {'data': 2}, fields=[])),
+                         [{'_id': ids[0]}])
+        self.assertEqual(list(self.storage.iter_all('test', sort=[('data', -1)], limit=1)),
+                         [{'_id': ids[0], 'data': 2}])
+        self.assertEqual(self.storage.find_by_id('test', str(object_id)), {'data': 1})
+        self.assertEqual(self.storage.find_by_ids('test', ids), [{'data': 2}])
+        self.assertEqual(len(self.storage.find_all('test')), 2)
+
+    def test_open_storage(self):
+        """Mongo should be used unless an SQLite file is given"""
+        self.assertIsInstance(Storage.open_storage(None), Storage.MongoStorage)
+        storage = Storage.open_storage(':memory:')
+        self.assertIsInstance(storage, Storage.SQLiteStorage)
+        storage.close()
+
+
+class TestWithoutMongo(unittest.TestCase):
+    def setUp(self):
+        self.storage = Storage.SQLiteStorage(':memory:')
+        for name, collection in (('bonds', 'bonds'), ('classes', 'classes'),
+                                 ('default_stats', 'default_stats'), ('packages', 'packages'),
+                                 ('skill_mapping', 'skill_mapping'), ('sub_skills', 'sub_skills'),
+                                 ('helplessness_disorders', 'disorders'),
+                                 ('unnatural_disorders', 'disorders'),
+                                 ('violence_disorders', 'disorders')):
+            self.storage.insert(parse_json(path.join(data_path, name + '.json'))[0], collection)
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_generate_save_load(self):
+        """Characters should be generated, saved and loaded with only an SQLite file"""
+        with mock.patch.object(Storage, 'storage', self.storage):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                rules = RuleSet.RuleSet.load()
+            generator = Generator.Generator(rules=rules)
+            character = generator.create_character(random.Random(3))
+            object_id = character.save()
+
+            loaded = Character.BaseCharacter()
+            loaded.load_character_from_db(object_id)
+
+        self.assertEqual(len(rules.disorders['Unnatural']),
+                         len(self.storage.find_subset('disorders', {'Unnatural': True})))
+        self.assertEqual(loaded.get_character(), character.get_character())
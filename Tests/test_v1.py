@@ -1,13 +1,20 @@
 import unittest
 import operator
 import json
+import random
+import time
+
+from unittest import mock
 
 import Tests._test_app as test_app
+import Lib.RuleSet as RuleSet
 
 from os import path
 
-from Lib.Character import BaseCharacter
-from ExternalServices import SAVE_LOCATION
+from Lib.Character import BaseCharacter, CHARACTER_FIELDS
+from Lib.Pool import CharacterPool
+from Tests.RandomMock import stat_range_list, sample_range_list
+from ExternalServices import SAVE_LOCATION, MAX_BATCH_COUNT
 from Lib.Utilities.Workspace import parse_json
 from Tests.TestData import data_path
 
@@ -21,6 +28,7 @@ class TestV1Endpoints(unittest.TestCase):
         cls.app = test_app.app
         cls.mongo = test_app.TEST_MONGO
         cls.random_mock = test_app.RANDOM_MOCK
+        RuleSet.cache.clear()
 
         cls.bonds = parse_json(path.join(data_path, 'bonds.json'))[0]
         cls.bonds = sorted(cls.bonds, key=operator.itemgetter('Work'), reverse=True)
@@ -72,11 +80,9 @@ class TestV1Endpoints(unittest.TestCase):
         """Time to initialize the RNG"""
         self.random_mock.range_state = -1
         self.random_mock.choice_state = -1
-        self.random_mock.sample_state = -1
 
         self.random_mock.range_list = []
         self.random_mock.choice_list = []
-        self.random_mock.sample_list = []
 
     def test_post_characters_400_missing_properties(self):
         """It should return 400 if there are missing properties in the provided JSON"""
@@ -85,6 +91,15 @@ class TestV1Endpoints(unittest.TestCase):
                                     content_type='application/json')
         self.assertEqual(res.status_code, 400)
 
+    def test_post_characters_400_bad_stat(self):
+        """It should return 400 if a stat isn't a number"""
+        character = dict(self.character_data, Stats=dict(self.character_data['Stats'],
+                                                          Power='high'))
+        res = self.test_client.post(self.url_prefix + 'characters',
+                                    data=json.dumps(character),
+                                    content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+
     def test_post_characters_400_json_err(self):
         """It should return 400 if the JSON is missing or otherwise cannot be parsed"""
         res = self.test_client.post(self.url_prefix + 'characters')
@@ -105,6 +120,73 @@ class TestV1Endpoints(unittest.TestCase):
         id = json.loads(res.data.decode('utf-8'))["ID"]
         self.assertEqual(len(id), 24)
 
+    def test_post_characters_batch(self):
+        """It should save every valid character in a list and report an error for the rest"""
+        characters = [self.character_data, {"test": True}, self.character_data]
+        res = self.test_client.post(self.url_prefix + 'characters/batch',
+                                    data=json.dumps(characters),
+                                    content_type='application/json')
+        results = json.loads(res.data.decode('utf-8'))["Results"]
+
+        with self.subTest(msg='Testing that the endpoint returns 200'):
+            self.assertEqual(res.status_code, 200)
+
+        with self.subTest(msg='Testing the result for each character'):
+            self.assertEqual([result["Error"] is None for result in results], [True, False, True])
+            self.assertIsNone(results[1]["ID"])
+            self.assertNotEqual(results[0]["ID"], results[2]["ID"])
+
+        with self.subTest(msg='Testing that the characters were saved'):
+            saved = self.test_client.get(self.url_prefix + 'characters/' + results[2]["ID"])
+            self.assertEqual(json.loads(saved.data.decode('utf-8'))["Character"],
+                             self.character_data)
+
+    def test_post_characters_batch_bad_type(self):
+        """It should report an error for a character with a property of the wrong type, without
+            failing the rest of the batch"""
+        characters = [dict(self.character_data, Bonds=['Mother']), self.character_data]
+        res = self.test_client.post(self.url_prefix + 'characters/batch',
+                                    data=json.dumps(characters),
+                                    content_type='application/json')
+        results = json.loads(res.data.decode('utf-8'))["Results"]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(results[0]["ID"])
+        self.assertIn('Bonds', results[0]["Error"])
+        self.assertEqual(len(results[1]["ID"]), 24)
+
+    def test_post_characters_batch_ndjson(self):
+        """It should save characters sent one per line, reporting lines that aren't JSON"""
+        lines = [json.dumps(self.character_data), '{not json', '', json.dumps(self.character_data)]
+        res = self.test_client.post(self.url_prefix + 'characters/batch',
+                                    data='\n'.join(lines),
+                                    content_type='application/x-ndjson')
+        results = json.loads(res.data.decode('utf-8'))["Results"]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([len(result["ID"] or '') for result in results], [24, 0, 24])
+        self.assertEqual(results[1]["Error"], 'Could not load JSON data')
+
+    def test_post_characters_batch_chunks(self):
+        """It should use one bulk insert for each chunk of characters"""
+        with mock.patch.object(test_app.APIV1, 'SAVE_CHUNK_SIZE', 2), \
+                mock.patch.object(test_app.APIV1.Character, 'save_characters',
+                                  wraps=test_app.APIV1.Character.save_characters) as save:
+            res = self.test_client.post(self.url_prefix + 'characters/batch',
+                                        data=json.dumps([self.character_data] * 5),
+                                        content_type='application/json')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([len(call[0][0]) for call in save.call_args_list], [2, 2, 1])
+
+    def test_post_characters_batch_400(self):
+        """It should return 400 if the body isn't a JSON list"""
+        for data in ('{not json', json.dumps(self.character_data)):
+            with self.subTest(msg='Testing ' + data[:10]):
+                res = self.test_client.post(self.url_prefix + 'characters/batch', data=data,
+                                            content_type='application/json')
+                self.assertEqual(res.status_code, 400)
+
     def test_get_characters(self):
         """It should return 200 when asked to generate a character"""
         class_name = 'Federal Agent'
@@ -114,10 +196,9 @@ class TestV1Endpoints(unittest.TestCase):
                                         if class_obj['_id'] == class_name]
         self.random_mock.choice_list.extend([package for package in self.packages
                                              if package['_id'] == package_name])
-        self.random_mock.choice_list.extend(self.bonds[-3:])
-        self.random_mock.range_list = [5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1, 5, 5, 5, 1,
-                                       5, 5, 5, 1, 1]
-        self.random_mock.sample_list = [[skill_choice]]
+        self.random_mock.range_list = sample_range_list(
+            list(self.random_mock.choice_list[0]['Choices']['Skills']), [skill_choice])
+        self.random_mock.range_list += stat_range_list([15] * 6) + [2, 3, 1, 1]
 
         expected_stats = {
             'Strength': 15,
@@ -193,6 +274,76 @@ class TestV1Endpoints(unittest.TestCase):
             }
             self.assertEqual(character, expected)
 
+    def test_get_characters_pool(self):
+        """It should give a ready-made character from the pool when there is one"""
+        body = json.dumps({"Character": self.character_data}).encode('utf-8')
+        pool = CharacterPool(lambda: body, 2, 0)
+        with mock.patch.object(test_app.APIV1, 'pool', pool):
+            pool.get()
+            for _ in range(100):
+                if len(pool) == 2:
+                    break
+                time.sleep(0.01)
+            res = self.test_client.get(self.url_prefix + 'characters')
+        pool.stop()
+
+        with self.subTest(msg='Testing that the endpoint returns 200'):
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.mimetype, 'application/json')
+
+        with self.subTest(msg='Testing that the character came from the pool'):
+            self.assertEqual(json.loads(res.data.decode('utf-8'))["Character"],
+                             self.character_data)
+            self.assertEqual(pool.hits, 1)
+
+    def test_generate_bodies(self):
+        """Characters generated as a batch should be the same shape as those made one at a time"""
+        bodies = test_app.APIV1._generate_bodies(3)
+
+        self.assertEqual(len(bodies), 3)
+        for body in bodies:
+            character = json.loads(body.decode('utf-8'))["Character"]
+            self.assertEqual(set(character.keys()), set(self.character_data.keys()))
+
+    def test_get_characters_count(self):
+        """It should stream a JSON list of characters when given a count"""
+        with mock.patch.object(test_app.APIV1.Generator.Character, 'random', random.Random(1)):
+            res = self.test_client.get(self.url_prefix + 'characters?count=3')
+            characters = json.loads(res.data.decode('utf-8'))["Characters"]
+
+        with self.subTest(msg='Testing that the endpoint returns 200'):
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.mimetype, 'application/json')
+
+        with self.subTest(msg='Testing that the right number of characters is returned'):
+            self.assertEqual(len(characters), 3)
+            for character in characters:
+                self.assertEqual(set(character.keys()), set(self.character_data.keys()))
+
+    def test_get_characters_ndjson(self):
+        """It should stream one character per line when asked for NDJSON"""
+        with mock.patch.object(test_app.APIV1.Generator.Character, 'random', random.Random(2)):
+            res = self.test_client.get(self.url_prefix + 'characters?count=2&format=ndjson')
+            lines = res.data.decode('utf-8').splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertIn('Skills', json.loads(line))
+
+    def test_get_characters_400_count(self):
+        """It should return 400 if the count isn't a number from 1 up to the maximum"""
+        for count in ('0', '-1', 'many', str(MAX_BATCH_COUNT + 1)):
+            with self.subTest(msg='Testing a count of ' + count):
+                res = self.test_client.get(self.url_prefix + 'characters?count=' + count)
+                self.assertEqual(res.status_code, 400)
+
+    def test_get_characters_400_format(self):
+        """It should return 400 if the format isn't one it knows"""
+        res = self.test_client.get(self.url_prefix + 'characters?count=2&format=xml')
+        self.assertEqual(res.status_code, 400)
+
     def test_load_character_400_invalid_id(self):
         """Tests that 400 is returned if the provided ID cannot be converted to an ObjectID"""
         res = self.test_client.get(self.url_prefix + 'characters/1')
@@ -214,3 +365,155 @@ class TestV1Endpoints(unittest.TestCase):
 
         with self.subTest(msg='Testing that the return object is correct'):
             self.assertEqual(character, self.character_data)
+
+    def test_load_character_odd_stats(self):
+        """Tests that a character saved with stats that wouldn't be accepted now still loads, with
+            its stats as they were saved"""
+        stats = dict(self.character_data['Stats'], Power=10 ** 6, Luck=9)
+        character_id = self.mongo.insert(dict(self.character_data, Stats=stats), SAVE_LOCATION)
+        res = self.test_client.get(self.url_prefix + 'characters/' + str(character_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode('utf-8'))["Character"]["Stats"], stats)
+
+    def test_load_characters(self):
+        """Tests that many characters can be loaded at once, in order, with per-item errors"""
+        missing = 'a' * 24
+        ids = [str(self.character_id), missing, '1', str(self.character_id)]
+        res = self.test_client.get(self.url_prefix + 'characters?ids=' + ','.join(ids))
+        results = json.loads(res.data.decode('utf-8'))["Characters"]
+
+        with self.subTest(msg='Testing that the endpoint returns 200'):
+            self.assertEqual(res.status_code, 200)
+
+        with self.subTest(msg='Testing that the results are in order'):
+            self.assertEqual([result["ID"] for result in results], ids)
+
+        with self.subTest(msg='Testing the characters that were found'):
+            self.assertEqual(results[0]["Character"], self.character_data)
+            self.assertEqual(results[3]["Character"], self.character_data)
+            self.assertIsNone(results[0]["Error"])
+
+        with self.subTest(msg='Testing the IDs that were missing or malformed'):
+            self.assertEqual([results[1]["Character"], results[2]["Character"]], [None, None])
+            self.assertIn(missing, results[1]["Error"])
+            self.assertIn('not a valid', results[2]["Error"])
+
+    def test_load_characters_post(self):
+        """Tests that the IDs can also be sent in the body of a request"""
+        res = self.test_client.post(self.url_prefix + 'characters/lookup',
+                                    data=json.dumps({"IDs": [str(self.character_id)]}),
+                                    content_type='application/json')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode('utf-8'))["Characters"][0]["Character"],
+                         self.character_data)
+
+    def test_load_characters_single_query(self):
+        """Tests that every character is found with a single query"""
+        ids = [str(self.character_id)] * 3
+        with mock.patch.object(self.mongo, 'find_by_ids', wraps=self.mongo.find_by_ids) as find:
+            self.test_client.get(self.url_prefix + 'characters?ids=' + ','.join(ids))
+
+        self.assertEqual(find.call_count, 1)
+
+    def test_load_characters_400(self):
+        """Tests that 400 is returned if there are no IDs, too many IDs or the body is invalid"""
+        requests = [
+            ('get', 'characters?ids=', None),
+            ('get', 'characters?ids=' + ','.join(['a' * 24] * (MAX_BATCH_COUNT + 1)), None),
+            ('post', 'characters/lookup', '{not json'),
+            ('post', 'characters/lookup', json.dumps({"IDs": "a" * 24})),
+            ('post', 'characters/lookup', json.dumps(["a" * 24]))
+        ]
+        for method, url, data in requests:
+            with self.subTest(msg='Testing {} {}'.format(method, url[:20])):
+                res = getattr(self.test_client, method)(self.url_prefix + url, data=data,
+                                                        content_type='application/json')
+                self.assertEqual(res.status_code, 400)
+
+    def test_load_character_fields(self):
+        """Tests that only the properties asked for are returned"""
+        url = self.url_prefix + 'characters/' + str(self.character_id)
+        res = self.test_client.get(url + '?fields=Stats,Attributes')
+        character = json.loads(res.data.decode('utf-8'))["Character"]
+
+        with self.subTest(msg='Testing that the endpoint returns 200'):
+            self.assertEqual(res.status_code, 200)
+
+        with self.subTest(msg='Testing that only the fields asked for are returned'):
+            self.assertEqual(character, {'Stats': self.character_data['Stats'],
+                                         'Attributes': self.character_data['Attributes']})
+
+        with self.subTest(msg='Testing that bonds keep their strength'):
+            res = self.test_client.get(url + '?fields=Bonds')
+            self.assertEqual(json.loads(res.data.decode('utf-8'))["Character"],
+                             {'Bonds': self.character_data['Bonds']})
+
+    def test_load_character_400_unknown_field(self):
+        """Tests that 400 is returned if a property characters don't have is asked for"""
+        url = self.url_prefix + 'characters/' + str(self.character_id) + '?fields=Stats,Wisdom'
+        self.assertEqual(self.test_client.get(url).status_code, 400)
+
+    def test_load_character_cache_headers(self):
+        """Tests that saved characters can be cached forever, with an ETag for each set of fields"""
+        url = self.url_prefix + 'characters/' + str(self.character_id)
+        res = self.test_client.get(url)
+
+        with self.subTest(msg='Testing the headers'):
+            self.assertEqual(res.headers['ETag'], '"{}"'.format(self.character_id))
+            self.assertIn('immutable', res.headers['Cache-Control'])
+
+        with self.subTest(msg='Testing that the fields change the ETag, but not their order'):
+            stats = self.test_client.get(url + '?fields=Stats,Attributes').headers['ETag']
+            self.assertNotEqual(stats, res.headers['ETag'])
+            self.assertEqual(self.test_client.get(url + '?fields=Attributes,Stats').headers['ETag'],
+                             stats)
+
+        with self.subTest(msg='Testing that the same fields give the same body and ETag'):
+            first = self.test_client.get(url + '?fields=Stats,Attributes')
+            second = self.test_client.get(url + '?fields=Attributes,Stats,Stats')
+            self.assertEqual(second.data, first.data)
+            self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+            self.assertEqual(list(json.loads(second.data.decode('utf-8'))["Character"]),
+                             ['Attributes', 'Stats'])
+
+        with self.subTest(msg='Testing that every field is the same as the whole character'):
+            every = ','.join(reversed(CHARACTER_FIELDS))
+            full = self.test_client.get(url + '?fields=' + every)
+            self.assertEqual(full.headers['ETag'], res.headers['ETag'])
+            self.assertEqual(full.data, res.data)
+
+        with self.subTest(msg='Testing that errors are not cached'):
+            res = self.test_client.get(self.url_prefix + 'characters/' + 'a' * 24)
+            self.assertNotIn('Cache-Control', res.headers)
+
+    def test_load_character_304(self):
+        """Tests that 304 is returned, without reading the character, if the copy is up to date"""
+        url = self.url_prefix + 'characters/' + str(self.character_id) + '?fields=Stats'
+        etag = self.test_client.get(url).headers['ETag']
+        with mock.patch.object(BaseCharacter, 'load_character_from_db') as load:
+            res = self.test_client.get(url, headers={'If-None-Match': etag})
+
+        with self.subTest(msg='Testing that the endpoint returns 304'):
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.headers['ETag'], etag)
+            self.assertEqual(res.data, b'')
+
+        with self.subTest(msg='Testing that the character was not read'):
+            self.assertFalse(load.called)
+
+        with self.subTest(msg='Testing that a different ETag gets the character'):
+            res = self.test_client.get(url, headers={'If-None-Match': '"stale"'})
+            self.assertEqual(res.status_code, 200)
+
+    def test_load_characters_fields(self):
+        """Tests that only the properties asked for are returned when loading many characters"""
+        res = self.test_client.get(self.url_prefix + 'characters?fields=Class&ids=' +
+                                   str(self.character_id))
+        results = json.loads(res.data.decode('utf-8'))["Characters"]
+        self.assertEqual(results[0]["Character"], {'Class': self.character_data['Class']})
+
+        res = self.test_client.get(self.url_prefix + 'characters?fields=Wisdom&ids=' +
+                                   str(self.character_id))
+        self.assertEqual(res.status_code, 400)
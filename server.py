@@ -4,6 +4,7 @@ from flask import Flask
 from API.v1 import V1
 from API.LetsEncrypt import Challenge
 from templates.Views import Views
+from Lib.Utilities.Indexes import ensure_indexes
 
 from LetsEncryptConfig import ROOT
 
@@ -25,5 +26,7 @@ if argv and len(argv) > 1 and argv[1] == 'server':
     port = 443
 
 if __name__ == "__main__":
+    ensure_indexes()
+
     context = ('cert.pem', 'key.pem')
     app.run(host, port=port, debug=False, ssl_context=context)
@@ -1,23 +1,53 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, make_response, render_template, request
+
+from hashlib import sha1
+
+from ExternalServices import VIEW_MAX_AGE
 
 Views = Blueprint('views', __name__)
 
+# The pages are the same for every request (the character is loaded by the page itself), so each
+# is only rendered once
+_pages = {}
+
+
+def _render(template):
+    """
+    Gives a rendered page, with an ETag of its content and a Cache-Control header, so browsers,
+    proxies and CDNs can reuse it and revalidate it cheaply. A request whose If-None-Match header
+    matches the ETag gets an empty 304 response.
+
+    :param str template: The name of the template to render
+    :return: The response
+    """
+    page = _pages.get(template)
+    if page is None:
+        html = render_template(template)
+        page = _pages[template] = (html, sha1(html.encode('utf-8')).hexdigest())
+    html, etag = page
+
+    response = make_response(html)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = VIEW_MAX_AGE
+    return response.make_conditional(request)
+
 
 @Views.route('/')
 def landing():
-    return render_template('landing.pug')
+    return _render('landing.pug')
 
 
 @Views.route('/character')
 def character():
-    return render_template('character.pug')
+    return _render('character.pug')
 
 
 @Views.route('/character/')
 def character_alt():
-    return render_template('character.pug')
+    return _render('character.pug')
 
 
 @Views.route('/character/<char>')
 def character_load(char=None):
-    return render_template('character.pug')
+    return _render('character.pug')
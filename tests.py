@@ -15,11 +15,25 @@ if __name__ == '__main__':
         path = os.path.join('Tests', 'TestData', missing_file)
         shutil.copy(path, missing_file)
 
+from Tests.test_Batch import *
+from Tests.test_Bonds import *
 from Tests.test_Character import *
+from Tests.test_Coalescer import *
 from Tests.test_Exceptions import *
 from Tests.test_Generator import *
+from Tests.test_Plans import *
+from Tests.test_Pool import *
+from Tests.test_RuleSet import *
+from Tests.test_Sampling import *
+from Tests.test_SavedIDs import *
 from Tests.test_SeedDB import *
+from Tests.test_Skills import *
+from Tests.test_Utilities_Cache import *
+from Tests.test_Utilities_Connections import *
+from Tests.test_Utilities_Indexes import *
 from Tests.test_Utilities_Mongo import *
+from Tests.test_Utilities_Serialize import *
+from Tests.test_Utilities_Storage import *
 from Tests.test_Utilities_Workspace import *
 from Tests.test_v1 import *
 